@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Qiita同期処理ベンチマーク
+
+合成したQiitaDocs/publicとGitファイルの記事（ヘッダ付き、実際の記事に近いサイズ）を
+大量に生成し、smart_update_qiita.pyの各ステージ（変更検出、バックアップ、書き換え、publish）と
+update_qiita_articles.pyの全件更新のスループット（ファイル/秒）とピークメモリを計測します。
+変更検出は、逐次実行（detection_serial）、スレッドプール（detection_thread_N）、
+プロセスプール（detection_process_N）のそれぞれについても計測し、ワーカー数によるスケールを確認できます。
+あわせて、smart_update_qiita.pyを別プロセスで起動して同期が終わるまでの時間を、
+設定のキャッシュがない場合（startup_cold）とある場合（startup_warm）について計測します。
+結果はJSONで保存でき、以前の結果と比較して性能の低下を検出できます。
+
+使用例:
+    python3 benchmark_qiita_sync.py --files 2000 --changed 0.1 --output bench_result.json
+    python3 benchmark_qiita_sync.py --files 2000 --compare bench_result.json
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import subprocess
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import contextlib
+import logging
+from datetime import datetime
+from pathlib import Path
+
+import yaml
+
+from smart_update_qiita import SmartQiitaUpdater
+from qiita_config import ConfigCache
+import update_qiita_articles
+
+# 結果ファイルの形式
+RESULT_VERSION = 1
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+# 生成する記事の構成要素
+WORDS = [
+    'AXI', 'パイプライン', 'レディ', 'バリッド', 'ハンドシェイク', 'バースト', 'アドレス', 'データ',
+    'レイテンシ', 'スループット', 'FIFO', 'ステート', 'クロック', 'リセット', 'テストベンチ', '信号'
+]
+
+STUB_PUBLISH_SCRIPT = """#!/bin/bash
+# ベンチマーク用のpublishスタブ（qiita-cliを呼ばずに成功を返す）
+LATENCY="${BENCH_PUBLISH_LATENCY:-0}"
+if [[ "$1" == "--batch" ]]; then
+    shift
+    if [[ $# -eq 0 ]]; then
+        mapfile -t files
+    else
+        files=("$@")
+    fi
+    for file in "${files[@]}"; do
+        [[ -n "$file" ]] && printf 'PUBLISH_RESULT\\tOK\\t%s\\n' "$(basename "$file")"
+    done
+    sleep "$LATENCY"
+else
+    echo "stub publish $1"
+    sleep "$LATENCY"
+fi
+"""
+
+def generate_body(rng, target_bytes):
+    """見出し・段落・コードブロック・表を含む本文を生成"""
+    parts = []
+    size = 0
+    section = 0
+    while size < target_bytes:
+        section += 1
+        block = [f"## {section}. {rng.choice(WORDS)}の{rng.choice(WORDS)}", ""]
+        for _ in range(rng.randint(2, 4)):
+            sentence = ''.join(rng.choice(WORDS) for _ in range(rng.randint(8, 20)))
+            block.append(f"{sentence}について説明します。  ")
+        block.append("")
+        if section % 2 == 0:
+            block.append("```verilog")
+            for i in range(rng.randint(5, 15)):
+                block.append(f"    assign s{i}_ready = s{i}_valid & ~stall_{i};")
+            block.append("```")
+            block.append("")
+        if section % 3 == 0:
+            block.append("| 信号 | 方向 | 説明 |")
+            block.append("|------|------|------|")
+            for i in range(rng.randint(3, 8)):
+                block.append(f"| sig{i} | {rng.choice(['in', 'out'])} | {rng.choice(WORDS)} |")
+            block.append("")
+        text = '\n'.join(block) + '\n'
+        parts.append(text)
+        size += len(text.encode('utf-8'))
+    return ''.join(parts)
+
+def qiita_header(title, index):
+    """Qiitaヘッダ（front matter）を生成"""
+    return (
+        "---\n"
+        f"title: {title}\n"
+        "tags:\n"
+        "  - Verilog\n"
+        "  - FPGA\n"
+        "private: false\n"
+        "updated_at: '2025-01-01T00:00:00+09:00'\n"
+        f"id: {index:020x}\n"
+        "organization_url_name: null\n"
+        "slide: false\n"
+        "ignorePublish: false\n"
+        "---\n"
+    )
+
+def generate_corpus(root, files, size_kb, changed_fraction, seed):
+    """合成コーパス（Gitファイル、Qiitaファイル、publishスタブ）を生成"""
+    rng = random.Random(seed)
+    git_dir = root / 'git'
+    qiita_dir = root / 'QiitaDocs' / 'public'
+    git_dir.mkdir(parents=True)
+    qiita_dir.mkdir(parents=True)
+
+    # 生成直後のファイルはマニフェストに登録されないため、mtimeを過去にずらす
+    past = time.time() - 3600
+    changed = set(rng.sample(range(files), int(files * changed_fraction)))
+    total_bytes = 0
+
+    for i in range(files):
+        name = f"part{i:05d}_benchmark_article.md"
+        title = f"AXIバスの設計 第{i}回 {rng.choice(WORDS)}"
+        target = int(size_kb * 1024 * rng.uniform(0.5, 1.5))
+        body = generate_body(rng, target)
+
+        qiita_text = qiita_header(title, i) + body
+        git_text = f"# {title}\n\n" + body
+        if i in changed:
+            git_text += f"\n## 追記\n\n{rng.choice(WORDS)}を追記しました。\n"
+
+        for path, text in ((qiita_dir / name, qiita_text), (git_dir / name, git_text)):
+            path.write_text(text, encoding='utf-8')
+            os.utime(path, (past, past))
+            total_bytes += len(text.encode('utf-8'))
+
+    stub = root / 'stub_publish.sh'
+    stub.write_text(STUB_PUBLISH_SCRIPT, encoding='utf-8')
+    stub.chmod(0o755)
+
+    return git_dir, qiita_dir, len(changed), total_bytes
+
+def write_config(root, git_dir, qiita_dir, publish_backend, detection_workers):
+    """ベンチマーク用の設定ファイルを作成"""
+    config = {
+        'directories': {'qiita_dir': str(qiita_dir), 'git_dir': str(git_dir)},
+        'comparison': {'detection_workers': detection_workers, 'use_git_changes': False},
+        'update': {'backup_enabled': True, 'backup_dir': str(root / 'QiitaDocs' / 'backup')},
+        'publish': {
+            'auto_publish': True,
+            'backend': publish_backend,
+            'script_path': str(root / 'stub_publish.sh'),
+            'rate_limit': 0,
+            'max_retries': 0
+        },
+        'metrics': {'enabled': False},
+        'cache': {
+            'manifest_enabled': True,
+            'manifest_file': str(root / 'QiitaDocs' / '.manifest.json'),
+            'publish_cache_file': str(root / 'QiitaDocs' / '.published.json'),
+            'outbox_file': str(root / 'QiitaDocs' / '.outbox.json'),
+            'rewrite_journal_file': str(root / 'QiitaDocs' / '.rewrite.json')
+        },
+        'logging': {
+            'level': 'ERROR',
+            'file': None,
+            'console_output': False,
+            'publish_output_dir': str(root / 'publish_output')
+        }
+    }
+    config_file = root / 'bench_config.yaml'
+    with open(config_file, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    # 作成直後の設定ファイルはキャッシュされないため、mtimeを過去にずらす
+    past = time.time() - 3600
+    os.utime(config_file, (past, past))
+    return config_file
+
+class StageTimer:
+    """ステージごとの所要時間とピークメモリを計測"""
+
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def measure(self, name, files):
+        """1ステージを計測（tracemalloc有効時はステージ内のピークを記録）"""
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+        started = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - started
+        result = {
+            'seconds': round(seconds, 6),
+            'files': files,
+            'files_per_sec': round(files / seconds, 2) if seconds > 0 else None
+        }
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            result['peak_bytes'] = peak - baseline
+        self.stages[name] = result
+
+def run_command(config_file):
+    """smart_update_qiita.pyを別プロセスで実行（起動から同期完了まで）"""
+    completed = subprocess.run(
+        [sys.executable, str(SCRIPT_DIR / 'smart_update_qiita.py'), str(config_file)],
+        cwd=config_file.parent, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"smart_update_qiita.pyが失敗しました（終了コード {completed.returncode}）:\n"
+                           f"{completed.stdout}")
+
+def run_stages(config_file, git_dir, trace_memory):
+    """各ステージを順に実行して計測"""
+    timer = StageTimer(trace_memory)
+    updater = SmartQiitaUpdater(str(config_file))
+    target_files = updater.find_target_files()
+
+    # 並列化の方法ごとの変更検出（マニフェストを使わず、すべてのファイルを読んでハッシュ値を計算する）
+    comparison = updater.config['comparison']
+    workers = comparison.get('detection_workers', 4)
+    manifest = updater.manifest
+    updater.manifest = None
+    for name, executor, stage_workers in (('detection_serial', 'thread', 1),
+                                          (f'detection_thread_{workers}', 'thread', workers),
+                                          (f'detection_process_{workers}', 'process', workers)):
+        if stage_workers > 1 and workers <= 1:
+            continue
+        comparison.update(detection_executor=executor, detection_workers=stage_workers)
+        updater.sources.clear()
+        updater.section_trees = {}
+        with timer.measure(name, len(target_files)):
+            updater.detect_changed_files(target_files)
+    comparison.update(detection_executor='thread', detection_workers=workers)
+    updater.sources.clear()
+    updater.section_trees = {}
+    updater.manifest = manifest
+
+    with timer.measure('detection_cold', len(target_files)):
+        changed_files = updater.detect_changed_files(target_files)
+
+    # マニフェストのstatが一致するため読み込みが省略される
+    with timer.measure('detection_warm', len(target_files)):
+        updater.detect_changed_files(target_files)
+
+    with timer.measure('backup', len(changed_files)):
+        for qiita_file, _ in changed_files:
+            updater.backup_qiita_file(qiita_file)
+
+    # バックアップは計測済みのため書き換えのみを計測
+    updater.config['update']['backup_enabled'] = False
+    with timer.measure('update', len(changed_files)):
+        updated_files = updater.update_qiita_files(changed_files)
+
+    with timer.measure('publish', len(updated_files)):
+        updater.publish_files(updated_files)
+    updater.save_manifest()
+
+    # 同期済みのコーパスに対してコマンドを起動（設定のキャッシュなし→あり）
+    ConfigCache(str(config_file)).clear()
+    for name in ('startup_cold', 'startup_warm'):
+        with timer.measure(name, len(target_files)):
+            run_command(config_file)
+
+    # update_qiita_articles.pyによる全件更新（メッセージ出力は計測対象外）
+    with contextlib.redirect_stdout(io.StringIO()):
+        with timer.measure('full_update', len(target_files)):
+            for qiita_file in target_files:
+                update_qiita_articles.update_qiita_article(qiita_file, git_dir / qiita_file.name)
+
+    return timer.stages, len(changed_files)
+
+def run_benchmark(args):
+    """コーパスを生成してベンチマークを実行"""
+    stages = {}
+    corpus = {}
+    # 時間計測とメモリ計測は別々のコーパスで行う（tracemallocの負荷を時間に含めない）
+    # 時間はrepeat回計測し、ステージごとに最も速い結果を採用する
+    passes = [False] * args.repeat + ([True] if args.memory else [])
+
+    for trace_memory in passes:
+        root = Path(tempfile.mkdtemp(prefix='qiita_bench_', dir=args.workdir))
+        try:
+            git_dir, qiita_dir, changed, total_bytes = generate_corpus(
+                root, args.files, args.size_kb, args.changed, args.seed)
+            corpus = {'files': args.files, 'changed': changed, 'bytes': total_bytes}
+            config_file = write_config(root, git_dir, qiita_dir, args.publish_backend, args.workers)
+
+            if trace_memory:
+                tracemalloc.start()
+            try:
+                pass_stages, _ = run_stages(config_file, git_dir, trace_memory)
+            finally:
+                if trace_memory:
+                    tracemalloc.stop()
+
+            for name, result in pass_stages.items():
+                if trace_memory:
+                    stages[name]['peak_bytes'] = result['peak_bytes']
+                elif name not in stages or result['seconds'] < stages[name]['seconds']:
+                    stages[name] = result
+        finally:
+            if args.keep:
+                print(f"コーパスを保存しました: {root}")
+            else:
+                shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        'version': RESULT_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {
+            'files': args.files,
+            'size_kb': args.size_kb,
+            'changed': args.changed,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'workers': args.workers,
+            'publish_backend': args.publish_backend,
+            'publish_latency': args.publish_latency
+        },
+        'corpus': corpus,
+        'stages': stages
+    }
+
+def print_results(result):
+    """結果を表形式で出力"""
+    corpus = result['corpus']
+    print(f"コーパス: {corpus['files']}ファイル（変更 {corpus['changed']}個, {corpus['bytes'] / 1024 / 1024:.1f}MB）")
+    print(f"{'ステージ':<20}{'ファイル数':>10}{'秒':>12}{'ファイル/秒':>14}{'ピークメモリ':>16}")
+    for name, stage in result['stages'].items():
+        rate = f"{stage['files_per_sec']:.1f}" if stage['files_per_sec'] is not None else '-'
+        peak = f"{stage['peak_bytes'] / 1024 / 1024:.2f}MB" if 'peak_bytes' in stage else '-'
+        print(f"{name:<20}{stage['files']:>10}{stage['seconds']:>12.3f}{rate:>14}{peak:>16}")
+
+def compare_results(result, baseline, threshold):
+    """以前の結果と比較し、スループットがthreshold以上低下したステージを返す"""
+    if baseline.get('params') != result['params']:
+        print("警告: 比較元と実行条件が異なります")
+        print(f"  比較元: {baseline.get('params')}")
+        print(f"  今回  : {result['params']}")
+
+    regressions = []
+    print(f"\n比較元: {baseline.get('created_at')}")
+    print(f"{'ステージ':<20}{'比較元':>14}{'今回':>14}{'変化':>10}")
+    for name, stage in result['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if not base or not base.get('files_per_sec') or stage['files_per_sec'] is None:
+            continue
+        ratio = stage['files_per_sec'] / base['files_per_sec']
+        mark = ''
+        if ratio < 1.0 - threshold:
+            regressions.append(name)
+            mark = '  ← 低下'
+        print(f"{name:<20}{base['files_per_sec']:>14.1f}{stage['files_per_sec']:>14.1f}{(ratio - 1) * 100:>+9.1f}%{mark}")
+    return regressions
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='Qiita同期処理のベンチマーク')
+    parser.add_argument('--files', type=int, default=2000, help='生成する記事数（デフォルト: 2000）')
+    parser.add_argument('--size-kb', type=float, default=20.0, help='記事の平均サイズ（KB、デフォルト: 20）')
+    parser.add_argument('--changed', type=float, default=0.1, help='変更する記事の割合（デフォルト: 0.1）')
+    parser.add_argument('--seed', type=int, default=1, help='乱数シード（デフォルト: 1）')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='時間計測の繰り返し回数（ステージごとに最速値を採用、デフォルト: 3）')
+    parser.add_argument('--workers', type=int, default=4, help='変更検出の並列ワーカー数（デフォルト: 4）')
+    parser.add_argument('--publish-backend', choices=['batch', 'script'], default='batch',
+                        help='publishバックエンド（スタブスクリプトを使用、デフォルト: batch）')
+    parser.add_argument('--publish-latency', type=float, default=0.0,
+                        help='スタブpublish 1回あたりの待ち時間（秒）')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='tracemallocによるピークメモリの計測を省略する')
+    parser.add_argument('--workdir', help='コーパスを生成するディレクトリ（デフォルト: 一時ディレクトリ）')
+    parser.add_argument('--keep', action='store_true', help='生成したコーパスを削除しない')
+    parser.add_argument('--output', help='結果を書き出すJSONファイル')
+    parser.add_argument('--compare', help='比較元の結果JSONファイル')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='性能低下とみなすスループットの低下率（デフォルト: 0.2）')
+    args = parser.parse_args()
+
+    if not 0 <= args.changed <= 1:
+        parser.error('--changed は0から1の範囲で指定してください')
+    if args.repeat < 1:
+        parser.error('--repeat は1以上を指定してください')
+
+    os.environ['BENCH_PUBLISH_LATENCY'] = str(args.publish_latency)
+    # SmartQiitaUpdaterが追加するハンドラがなくても警告を出さない
+    logging.getLogger().setLevel(logging.ERROR)
+
+    result = run_benchmark(args)
+    print_results(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=1)
+        print(f"\n結果を保存しました: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(result, baseline, args.threshold)
+        if regressions:
+            print(f"\n性能低下を検出しました: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n性能低下はありません")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+pytestの共通設定
+part09とpart11のように同じスクリプトを置いたディレクトリは、どちらも同じモジュール名でimportされます。
+テストモジュールを収集する前に、そのディレクトリのスクリプトと同じ名前で
+別のディレクトリから読み込まれたモジュールを取り除き、ディレクトリごとに自分のスクリプトをテストします。
+"""
+
+import os
+import sys
+
+import pytest
+
+def pytest_collectstart(collector):
+    if not isinstance(collector, pytest.Module):
+        return
+    directory = os.path.dirname(str(collector.path))
+    names = {os.path.splitext(name)[0] for name in os.listdir(directory) if name.endswith('.py')}
+    for name in names:
+        module = sys.modules.get(name)
+        module_file = getattr(module, '__file__', None)
+        if module_file and os.path.dirname(os.path.abspath(module_file)) != directory:
+            del sys.modules[name]
@@ -6,9 +6,12 @@ AXI Testbench Function Auto-Splitter
 """
 
 import os
-import re
+import sys
 from pathlib import Path
 
+from sv_symbol_index import SymbolIndex
+from sv_function_partition import manifest_from_args
+
 class FunctionAutoSplitter:
     def __init__(self):
         self.source_file = "axi_simple_dual_port_ram_tb.sv"
@@ -79,52 +82,28 @@ class FunctionAutoSplitter:
             "files_created": []
         }
 
-    def extract_function(self, func_name, content):
-        """指定された関数を抽出"""
-        try:
-            # 関数の開始パターンを検索
-            start_pattern = rf"function\s+automatic\s+.*\b{re.escape(func_name)}\b"
-            start_match = re.search(start_pattern, content)
-            
-            if not start_match:
-                return None
-            
-            start_pos = start_match.start()
-            
-            # 関数の終了位置を検索
-            remaining_content = content[start_pos:]
-            end_pos = remaining_content.find("endfunction")
-            
-            if end_pos == -1:
-                return None
-            
-            # endfunctionを含む
-            function_content = remaining_content[:end_pos + len("endfunction")]
-            return function_content.strip()
-            
-        except Exception as e:
-            print(f"Error extracting {func_name}: {e}")
-            return None
+    def apply_manifest(self, manifest):
+        """振り分けのマニフェスト（sv_function_partition.py）の割り当てを使う"""
+        self.function_mapping = manifest['headers']
+        self.common_defs_file = manifest['common_defs']
+
+    def extract_function(self, func_name, indexes):
+        """指定された関数を抽出（元のファイルとincludeされるファイルの索引から関数の範囲を取得）"""
+        for index in indexes:
+            symbol = index.find(func_name, ("function", "task"))
+            if symbol is not None and symbol.depth == 0:
+                # function ... endfunction（ラベルを含む）
+                return index.text_of(symbol).strip()
+        return None
 
-    def extract_common_definitions(self, content):
+    def extract_common_definitions(self, index):
         """共通の定義（パラメータ、typedef、配列）を抽出"""
-        common_defs = []
-        
-        # パラメータ定義を抽出
-        param_pattern = r"localparam\s+.*?;"
-        params = re.findall(param_pattern, content, re.DOTALL)
-        common_defs.extend(params)
-        
-        # typedef定義を抽出
-        typedef_pattern = r"typedef\s+struct\s*\{.*?\}\s+\w+_t\s*;"
-        typedefs = re.findall(typedef_pattern, content, re.DOTALL)
-        common_defs.extend(typedefs)
-        
-        # 配列定義を抽出
-        array_pattern = r"(\w+_t|int|string)\s+\w+\[\]\s*=\s*\{.*?\};"
-        arrays = re.findall(array_pattern, content, re.DOTALL)
-        common_defs.extend(arrays)
-        
+        # モジュール直下の宣言をソースの順に取得
+        common_defs = [
+            index.text_of(symbol)
+            for symbol in index.find_all(("parameter", "localparam", "typedef", "array"))
+            if symbol.depth == 0
+        ]
         return common_defs
 
     def create_header_file(self, filename, functions, common_defs=None):
@@ -144,7 +123,7 @@ class FunctionAutoSplitter:
                 # 共通定義のインクルード
                 if common_defs:
                     f.write("// Include common definitions\n")
-                    f.write('`include "axi_common_defs.svh"\n\n')
+                    f.write(f'`include "{self.common_defs_file}"\n\n')
                 
                 # 関数を追加
                 for func_name in functions:
@@ -192,20 +171,26 @@ class FunctionAutoSplitter:
         """自動分割を実行"""
         print("=== AXI Testbench Function Auto-Splitter ===\n")
         
-        # 元のファイルを読み込み
+        # 元のファイル（と分割済みのヘッダなどincludeされるファイル）を読み込み、1回の走査で宣言の索引を作成
+        # ヘッダファイルは書き直すため、既存の関数は書き込む前にすべて読み込んでおく
         try:
-            with open(self.source_file, 'r', encoding='utf-8') as f:
-                source_content = f.read()
-            print(f"✅ Loaded source file: {self.source_file}")
+            source_indexes = SymbolIndex.from_file_with_includes(self.source_file)
+            source_index = source_indexes[0]
+            print(f"✅ Loaded source file: {self.source_file} ({len(source_index.symbols)} symbols)")
         except Exception as e:
             print(f"❌ Error loading source file: {e}")
             return
         
         # 共通定義を抽出
         print("\n--- Extracting Common Definitions ---")
-        common_defs = self.extract_common_definitions(source_content)
+        common_defs = self.extract_common_definitions(source_index)
         print(f"Found {len(common_defs)} common definitions")
         
+        # 分割済みで共通定義が既にincludeされている場合も、ヘッダから共通定義をincludeする
+        if not common_defs:
+            common_defs = [index.text for index in source_indexes[1:]
+                           if os.path.basename(index.path) == self.common_defs_file]
+        
         # 各関数を抽出
         print("\n--- Extracting Functions ---")
         all_functions = {}
@@ -216,7 +201,7 @@ class FunctionAutoSplitter:
             
             for func_name in func_list:
                 print(f"  Extracting: {func_name}")
-                func_content = self.extract_function(func_name, source_content)
+                func_content = self.extract_function(func_name, source_indexes)
                 
                 if func_content:
                     functions_content[func_name] = func_content
@@ -266,6 +251,13 @@ class FunctionAutoSplitter:
 
 def main():
     splitter = FunctionAutoSplitter()
+    try:
+        manifest = manifest_from_args(sys.argv[1:], splitter.source_file)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error loading manifest: {e}")
+        sys.exit(1)
+    if manifest:
+        splitter.apply_manifest(manifest)
     splitter.auto_split()
 
 if __name__ == "__main__":
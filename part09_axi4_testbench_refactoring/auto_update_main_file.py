@@ -6,14 +6,22 @@ AXI Testbench Main File Auto-Updater
 """
 
 import os
-import re
+import sys
+import json
 from pathlib import Path
 
+from sv_symbol_index import SymbolIndex
+from sv_span_editor import SpanEditor, create_edit_log, write_edit_log, replay_edit_log
+from sv_function_partition import manifest_from_args
+
 class MainFileUpdater:
     def __init__(self):
         self.source_file = "axi_simple_dual_port_ram_tb.sv"
         self.target_file = "axi_simple_dual_port_ram_tb_refactored.sv"
         
+        # 編集ログ（削除・挿入した範囲の記録、--verifyで出力を検証）
+        self.edit_log_file = "axi_simple_dual_port_ram_tb_refactored_edits.json"
+        
         # 削除対象の関数リスト（自動分割で移動済み）
         self.functions_to_remove = [
             # テスト刺激生成系
@@ -124,83 +132,98 @@ class MainFileUpdater:
             '`include "axi_random_generation.svh"',
             '`include "axi_monitoring_functions.svh"'
         ]
-
-    def remove_function(self, content, func_name):
-        """指定された関数を削除"""
-        # 関数の開始パターンを検索
-        start_pattern = rf"function\s+automatic\s+.*\b{re.escape(func_name)}\b"
-        start_match = re.search(start_pattern, content)
-        
-        if not start_match:
-            return content, False
         
-        start_pos = start_match.start()
-        
-        # 関数の終了位置を検索
-        remaining_content = content[start_pos:]
-        end_pos = remaining_content.find("endfunction")
-        
-        if end_pos == -1:
-            return content, False
+        # 実際に追加したinclude文の数（元のファイルにあるものは追加しない）
+        self.added_includes = 0
+
+    def apply_manifest(self, manifest):
+        """振り分けのマニフェスト（sv_function_partition.py）の関数・定義・include文を使う"""
+        self.functions_to_remove = [
+            func_name for func_names in manifest['headers'].values() for func_name in func_names
+        ]
+        self.definitions_to_remove = list(manifest['definitions'])
+        self.includes_to_add = [f'`include "{header}"' for header in manifest['includes']]
+
+    def remove_function(self, index, editor, func_name):
+        """指定された関数の削除を登録"""
+        symbol = index.find(func_name, ("function", "task"))
         
-        # endfunctionを含む
-        end_pos = start_pos + end_pos + len("endfunction")
+        if symbol is None:
+            return False
         
-        # 関数を削除
-        new_content = content[:start_pos] + content[end_pos:]
-        return new_content, True
+        # function ... endfunction（ラベルを含む）を削除
+        editor.delete(symbol.start, symbol.end, "function", func_name)
+        return True
 
-    def remove_definition(self, content, definition_pattern):
-        """指定された定義を削除"""
-        # パラメータ定義を検索
-        if definition_pattern.startswith("localparam"):
-            pattern = rf"{re.escape(definition_pattern)}.*?;"
-        elif definition_pattern.startswith("typedef struct"):
-            pattern = r"typedef\s+struct\s*\{.*?\}\s+\w+_t\s*;"
-        else:
-            pattern = rf"{re.escape(definition_pattern)}.*?;"
-        
-        matches = re.findall(pattern, content, re.DOTALL)
-        if matches:
-            for match in matches:
-                content = content.replace(match, "")
-            return content, True
+    def find_definitions(self, index, definition_pattern):
+        """定義のパターン（"parameter NAME"、"typedef struct [NAME]"、"TYPE NAME"）に一致する宣言を返す"""
+        words = definition_pattern.split()
+        if words[0] in ("parameter", "localparam"):
+            # parameterとlocalparamは区別しない
+            return [symbol for symbol in index.find_all(("parameter", "localparam"))
+                    if symbol.depth == 0 and words[-1] in symbol.names]
+        if words[0] == "typedef":
+            # "typedef struct" はすべての構造体のtypedef、"typedef struct NAME" はその型だけ
+            return [symbol for symbol in index.find_all("typedef")
+                    if symbol.depth == 0 and symbol.type_name == words[1]
+                    and (len(words) < 3 or words[2] in symbol.names)]
+        return [symbol for symbol in index.find_all(("variable", "array"))
+                if symbol.depth == 0 and symbol.type_name == words[0] and words[-1] in symbol.names]
+
+    def remove_definition(self, index, editor, definition_pattern):
+        """指定された定義の削除を登録（同じ文字列の別の箇所は削除しない）"""
+        symbols = self.find_definitions(index, definition_pattern)
+        if not symbols:
+            return False
         
-        return content, False
+        for symbol in symbols:
+            editor.delete(symbol.start, symbol.end, "definition", definition_pattern)
+        return True
+
+    def missing_includes(self, index):
+        """追加するinclude文のうち、元のファイルでまだincludeされていないもの"""
+        included = {os.path.basename(name) for name in index.includes()}
+        return [line for line in self.includes_to_add
+                if os.path.basename(line.split('"')[1]) not in included]
 
-    def add_includes(self, content):
-        """include文を追加"""
-        # モジュール宣言の直後に追加
-        module_pattern = r"(module\s+\w+.*?;)"
-        module_match = re.search(module_pattern, content, re.DOTALL)
+    def add_includes(self, index, editor):
+        """include文の挿入を登録"""
+        # モジュール宣言（ポートリストを含む）の直後に追加
+        modules = index.find_all("module")
         
-        if module_match:
-            module_end = module_match.end()
-            include_text = "\n\n// Include split function files\n" + "\n".join(self.includes_to_add) + "\n"
-            content = content[:module_end] + include_text + content[module_end:]
+        if modules:
+            includes = self.missing_includes(index)
+            self.added_includes = len(includes)
+            if includes:
+                header_end = index.find_at_depth(modules[0].first_token + 2, (";",))
+                module_end = index.tokens[header_end].end
+                include_text = "\n\n// Include split function files\n" + "\n".join(includes) + "\n"
+                editor.insert(module_end, include_text, "include")
+            return True
         
-        return content
+        return False
 
     def update_main_file(self):
         """メインファイルを更新"""
         print("=== AXI Testbench Main File Auto-Updater ===\n")
         
-        # 元のファイルを読み込み
+        # 元のファイルを読み込み、1回の走査で宣言の索引を作成
         try:
-            with open(self.source_file, 'r', encoding='utf-8') as f:
-                source_content = f.read()
+            source_index = SymbolIndex.from_file(self.source_file)
             print(f"✅ Loaded source file: {self.source_file}")
         except Exception as e:
             print(f"❌ Error loading source file: {e}")
             return
         
+        # 削除と挿入は元のファイル上の範囲として集め、最後に1回で適用する
+        editor = SpanEditor(source_index.text)
+        
         # 関数を削除
         print("\n--- Removing Functions ---")
         removed_functions = 0
         for func_name in self.functions_to_remove:
             print(f"  Removing: {func_name}")
-            source_content, removed = self.remove_function(source_content, func_name)
-            if removed:
+            if self.remove_function(source_index, editor, func_name):
                 removed_functions += 1
                 print(f"    ✅ Removed")
             else:
@@ -211,8 +234,7 @@ class MainFileUpdater:
         removed_definitions = 0
         for definition in self.definitions_to_remove:
             print(f"  Removing: {definition}")
-            source_content, removed = self.remove_definition(source_content, definition)
-            if removed:
+            if self.remove_definition(source_index, editor, definition):
                 removed_definitions += 1
                 print(f"    ✅ Removed")
             else:
@@ -220,14 +242,25 @@ class MainFileUpdater:
         
         # include文を追加
         print("\n--- Adding Include Statements ---")
-        source_content = self.add_includes(source_content)
-        print(f"  ✅ Added {len(self.includes_to_add)} include statements")
+        if self.add_includes(source_index, editor):
+            print(f"  ✅ Added {self.added_includes} include statements")
+        else:
+            print(f"  ⚠️  Module declaration not found")
         
-        # 更新されたファイルを保存
+        try:
+            updated_content, entries = editor.apply()
+        except ValueError as e:
+            print(f"❌ Error applying edits: {e}")
+            return
+        
+        # 更新されたファイルと編集ログを保存
         try:
             with open(self.target_file, 'w', encoding='utf-8') as f:
-                f.write(source_content)
+                f.write(updated_content)
             print(f"\n✅ Updated main file: {self.target_file}")
+            write_edit_log(self.edit_log_file, create_edit_log(
+                self.source_file, self.target_file, source_index.text, updated_content, entries))
+            print(f"✅ Wrote edit log: {self.edit_log_file} ({len(entries)} edits)")
         except Exception as e:
             print(f"❌ Error saving updated file: {e}")
             return
@@ -235,12 +268,34 @@ class MainFileUpdater:
         # 結果を表示
         self.print_summary(removed_functions, removed_definitions)
 
+    def verify_edit_log(self):
+        """編集ログを元のファイルに適用し直し、出力ファイルと一致するか確認"""
+        print("=== AXI Testbench Main File Edit Log Verification ===\n")
+        try:
+            with open(self.edit_log_file, 'r', encoding='utf-8') as f:
+                edit_log = json.load(f)
+            with open(edit_log['source'], 'r', encoding='utf-8') as f:
+                source_content = f.read()
+            with open(edit_log['target'], 'r', encoding='utf-8') as f:
+                target_content = f.read()
+            replayed = replay_edit_log(source_content, edit_log)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ Verification failed: {e}")
+            return False
+        
+        if replayed != target_content:
+            print(f"❌ Verification failed: {edit_log['target']} differs from the edit log")
+            return False
+        
+        print(f"✅ {len(edit_log['edits'])} edits verified: {edit_log['source']} -> {edit_log['target']}")
+        return True
+
     def print_summary(self, removed_functions, removed_definitions):
         """結果のサマリーを表示"""
         print("\n=== UPDATE SUMMARY ===")
         print(f"Total functions removed: {removed_functions}")
         print(f"Total definitions removed: {removed_definitions}")
-        print(f"Include statements added: {len(self.includes_to_add)}")
+        print(f"Include statements added: {self.added_includes}")
         print(f"Source file: {self.source_file}")
         print(f"Target file: {self.target_file}")
         
@@ -260,6 +315,15 @@ class MainFileUpdater:
 
 def main():
     updater = MainFileUpdater()
+    if "--verify" in sys.argv[1:]:
+        sys.exit(0 if updater.verify_edit_log() else 1)
+    try:
+        manifest = manifest_from_args(sys.argv[1:], updater.source_file)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error loading manifest: {e}")
+        sys.exit(1)
+    if manifest:
+        updater.apply_manifest(manifest)
     updater.update_main_file()
 
 if __name__ == "__main__":
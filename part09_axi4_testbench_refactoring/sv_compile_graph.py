@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SystemVerilog Compile Graph
+パートのディレクトリ（と --search で指定した他のパートのディレクトリ）のソースから
+`include、モジュールのインスタンス化、パッケージの参照のグラフを作成し、
+テストベンチに必要なファイルだけを依存順に並べたModelSimのバッチスクリプト（.do）を生成します。
+
+- .svh のように他のファイルからincludeされるファイルは、includeするファイルと一緒にコンパイルされるため
+  単独ではコンパイルしません
+- includeの循環、インスタンス化・パッケージ参照の循環を検出した場合はスクリプトを生成しません
+- ファイルごとの解析結果はファイルのハッシュ値をキーにキャッシュします（.sv_compile_graph_cache.json）
+
+使用例:
+  python3 sv_compile_graph.py ../part13_axi4_testbench_byte_access_verification \\
+      --tb axi_simple_dual_port_ram_tb_part13.sv --search ../part07_axi_simple_dual_port_ram
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+
+from sv_symbol_index import tokenize, include_target
+
+GRAPH_CACHE_VERSION = 1
+
+# 既定のキャッシュファイル（パートのディレクトリに作成）
+GRAPH_CACHE_FILE = ".sv_compile_graph_cache.json"
+
+SOURCE_EXTENSIONS = (".sv", ".svh", ".v", ".vh")
+
+# 単独ではコンパイルしないファイル（includeされる前提のヘッダ）
+HEADER_EXTENSIONS = (".svh", ".vh")
+
+DESIGN_UNITS = ("module", "interface", "package", "program")
+
+# インスタンス化の直前に来るトークン（文の区切り）
+STATEMENT_BOUNDARY = {';', ')', 'begin', 'end', 'else', 'generate', 'endgenerate', 'endfunction', 'endtask', ':'}
+
+# インスタンス化と同じ形（名前 名前 (）になる、キーワードとして索引に登録していない構文
+NON_INSTANCE_NAMES = {'assert', 'assume', 'cover', 'restrict', 'property', 'sequence', 'covergroup',
+                      'constraint', 'rand', 'randc', 'expect'}
+
+def file_hash(path):
+    """ファイルの内容のハッシュ値"""
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+def parse_source(text):
+    """ソースからinclude・定義（module/package等）・インスタンス化・パッケージ参照を取り出す"""
+    tokens = tokenize(text)
+    count = len(tokens)
+    info = {'includes': [], 'defines': [], 'instances': [], 'packages': []}
+
+    for i, token in enumerate(tokens):
+        if token.kind == 'directive':
+            name = include_target(token)
+            if name is not None:
+                info['includes'].append(name)
+            continue
+
+        following = tokens[i + 1] if i + 1 < count else None
+        if following is None:
+            continue
+
+        if token.kind == 'keyword' and token.value in DESIGN_UNITS:
+            # module automatic NAME、extern module は定義として扱わない
+            j = i + 1
+            if tokens[j].value in ('automatic', 'static') and j + 1 < count:
+                j += 1
+            if tokens[j].kind == 'ident' and (i == 0 or tokens[i - 1].value != 'extern'):
+                info['defines'].append([token.value, tokens[j].value])
+            continue
+
+        if token.kind != 'ident':
+            continue
+
+        # NAME:: はパッケージ（またはクラス）のスコープ
+        if following.value == '::':
+            if token.value not in info['packages']:
+                info['packages'].append(token.value)
+            continue
+
+        # NAME #(...) INST (...) または NAME INST (...)
+        previous = tokens[i - 1].value if i > 0 else ';'
+        if previous not in STATEMENT_BOUNDARY or token.value in NON_INSTANCE_NAMES:
+            continue
+        if following.value == '#' or (following.kind == 'ident' and i + 2 < count and tokens[i + 2].value == '('):
+            if token.value not in info['instances']:
+                info['instances'].append(token.value)
+
+    return info
+
+class GraphCache:
+    """ファイルごとの解析結果のキャッシュ（ハッシュ値 -> 解析結果、パス -> mtime・サイズ・ハッシュ値）"""
+
+    def __init__(self, cache_file):
+        """初期化（キャッシュが読めない場合は空のキャッシュ）"""
+        self.cache_file = cache_file
+        self.entries = {}
+        self.stats = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == GRAPH_CACHE_VERSION:
+                self.entries = data.get('entries', {})
+                self.stats = data.get('stats', {})
+        except (OSError, ValueError):
+            pass
+
+    def lookup(self, path):
+        """ファイルの (ハッシュ値, 解析結果) を返す（mtime・サイズが同じ場合はファイルを読まない）"""
+        stat_result = os.stat(path)
+        stat_key = [stat_result.st_mtime_ns, stat_result.st_size]
+        known = self.stats.get(path)
+        if known and known[:2] == stat_key and known[2] in self.entries:
+            self.hits += 1
+            return known[2], self.entries[known[2]]
+
+        digest = file_hash(path)
+        if digest in self.entries:
+            self.hits += 1
+        else:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                self.entries[digest] = parse_source(f.read())
+            self.misses += 1
+        self.stats[path] = stat_key + [digest]
+        self.dirty = True
+        return digest, self.entries[digest]
+
+    def save(self):
+        """変更があればキャッシュを書き込む（一時ファイルに書いてから置き換える）"""
+        if not self.dirty:
+            return
+        # 存在しなくなったファイルの解析結果は保存しない
+        self.stats = {path: stat for path, stat in self.stats.items() if os.path.exists(path)}
+        used = {stat[2] for stat in self.stats.values()}
+        self.entries = {digest: entry for digest, entry in self.entries.items() if digest in used}
+
+        temp_file = self.cache_file + ".tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': GRAPH_CACHE_VERSION, 'stats': self.stats, 'entries': self.entries}, f)
+            os.replace(temp_file, self.cache_file)
+            self.dirty = False
+        except OSError:
+            # キャッシュを書き込めなくても結果には影響しない
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+class CompileGraph:
+    """include・インスタンス化・パッケージ参照のグラフ"""
+
+    def __init__(self, base_dir, search_dirs=(), incdirs=(), cache_file=None):
+        """初期化（base_dir: スクリプトを実行するパートのディレクトリ）"""
+        self.base_dir = os.path.abspath(base_dir)
+        self.search_dirs = [os.path.abspath(directory) for directory in search_dirs]
+        self.incdirs = [os.path.abspath(directory) for directory in incdirs]
+        self.cache = GraphCache(cache_file) if cache_file else None
+
+        self.files = {}         # パス -> 解析結果
+        self.hashes = {}        # パス -> ハッシュ値
+        self.includes = {}      # パス -> [(includeの名前, 解決したパス, 必要な+incdir)]
+        self.definitions = {}   # 名前 -> [(種類, パス)]（base_dir、search_dirsの順）
+        self.included = set()   # 他のファイルからincludeされるファイル
+        self.warnings = []
+
+    def load(self, path):
+        """ファイルを解析（キャッシュがあれば使う）"""
+        if self.cache:
+            digest, info = self.cache.lookup(path)
+        else:
+            digest = file_hash(path)
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                info = parse_source(f.read())
+        self.hashes[path] = digest
+        self.files[path] = info
+
+    def source_files(self, directory):
+        """ディレクトリ直下のソースファイル"""
+        return [
+            os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.endswith(SOURCE_EXTENSIONS) and os.path.isfile(os.path.join(directory, name))
+        ]
+
+    def resolve_include(self, path, name):
+        """includeの名前を (パス, 必要な+incdir) に解決（ModelSimと同じく実行ディレクトリから探す）"""
+        if os.path.isabs(name):
+            return (name, None) if os.path.isfile(name) else (None, None)
+
+        source_dir = os.path.dirname(path)
+        candidates = [(self.base_dir, None)]
+        if source_dir != self.base_dir:
+            candidates.append((source_dir, source_dir))
+        candidates += [(directory, directory) for directory in self.incdirs]
+
+        for directory, incdir in candidates:
+            candidate = os.path.normpath(os.path.join(directory, name))
+            if os.path.isfile(candidate):
+                return candidate, incdir
+        return None, None
+
+    def scan(self):
+        """ディレクトリのソースとincludeされるファイルを解析してグラフを作成"""
+        for directory in [self.base_dir] + self.search_dirs:
+            for path in self.source_files(directory):
+                self.load(path)
+
+        # includeを解決（ディレクトリの外のファイルもたどる）
+        pending = list(self.files)
+        while pending:
+            path = pending.pop()
+            resolved = []
+            for name in self.files[path]['includes']:
+                target, incdir = self.resolve_include(path, name)
+                if target is None:
+                    self.warnings.append(f"{self.relative(path)}: include not found: {name}")
+                    continue
+                resolved.append((name, target, incdir))
+                self.included.add(target)
+                if target not in self.files:
+                    self.load(target)
+                    pending.append(target)
+            self.includes[path] = resolved
+
+        for directory in [self.base_dir] + self.search_dirs:
+            for path in self.source_files(directory):
+                for kind, name in self.files[path]['defines']:
+                    self.definitions.setdefault(name, []).append((kind, path))
+
+        if self.cache:
+            self.cache.save()
+
+    def relative(self, path):
+        """base_dirからの相対パス（スクリプトに書く形式）"""
+        return os.path.relpath(path, self.base_dir).replace(os.sep, '/')
+
+    def is_unit(self, path):
+        """単独でコンパイルするファイルか"""
+        return not path.endswith(HEADER_EXTENSIONS) and path not in self.included
+
+    def include_closure(self, path):
+        """ファイルと、そのファイルから（間接的に）includeされるファイル（include順）"""
+        closure = []
+        pending = [path]
+        while pending:
+            current = pending.pop()
+            if current in closure:
+                continue
+            closure.append(current)
+            pending.extend(reversed([target for _, target, _ in self.includes.get(current, [])]))
+        return closure
+
+    def include_cycles(self, roots):
+        """rootsからたどれるincludeの循環"""
+        cycles = []
+        state = {}
+
+        def visit(path, chain):
+            state[path] = 'active'
+            for _, target, _ in self.includes.get(path, []):
+                if state.get(target) == 'active':
+                    cycles.append(chain[chain.index(target):] + [target])
+                elif target not in state:
+                    visit(target, chain + [target])
+            state[path] = 'done'
+
+        for root in roots:
+            if root not in state:
+                visit(root, [root])
+        return cycles
+
+    def resolve_definition(self, name, kinds, referrer):
+        """名前を定義しているファイル（参照元と同じディレクトリ、base_dir、search_dirsの順）"""
+        paths = [path for kind, path in self.definitions.get(name, []) if kind in kinds]
+        if not paths:
+            return None
+        same_dir = [path for path in paths if os.path.dirname(path) == os.path.dirname(referrer)]
+        return (same_dir or paths)[0]
+
+    def unit_dependencies(self, path):
+        """コンパイル単位が（includeしたファイルを含めて）参照するパッケージ・モジュールのコンパイル単位"""
+        closure = self.include_closure(path)
+        dependencies = []
+        for source in closure:
+            info = self.files[source]
+            # パッケージは参照するコンパイル単位より先にコンパイルする必要がある
+            targets = [self.resolve_definition(name, ("package",), path) for name in info['packages']]
+            for name in info['instances']:
+                target = self.resolve_definition(name, ("module", "interface", "program"), path)
+                if target is None:
+                    message = f"{self.relative(source)}: module not found: {name}"
+                    if message not in self.warnings:
+                        self.warnings.append(message)
+                targets.append(target)
+            for target in targets:
+                if target and target not in closure and target not in dependencies and self.is_unit(target):
+                    dependencies.append(target)
+        return dependencies
+
+    def package_dependencies(self, path):
+        """コンパイル単位が（includeしたファイルを含めて）importするパッケージのコンパイル単位"""
+        closure = self.include_closure(path)
+        dependencies = []
+        for source in closure:
+            for name in self.files[source]['packages']:
+                target = self.resolve_definition(name, ("package",), path)
+                if target and target not in closure and target not in dependencies and self.is_unit(target):
+                    dependencies.append(target)
+        return dependencies
+
+    def compile_order(self, roots):
+        """rootsに必要なコンパイル単位を依存順に並べる（戻り値: (コンパイル順, 循環のリスト)）"""
+        order = []
+        cycles = self.include_cycles(roots)
+        state = {}
+
+        def visit(path, chain):
+            state[path] = 'active'
+            for dependency in self.unit_dependencies(path):
+                if state.get(dependency) == 'active':
+                    cycles.append(chain[chain.index(dependency):] + [dependency])
+                elif dependency not in state:
+                    visit(dependency, chain + [dependency])
+            state[path] = 'done'
+            order.append(path)
+
+        for root in roots:
+            if root not in state:
+                visit(root, [root])
+        return order, cycles
+
+    def unit_incdirs(self, path):
+        """コンパイル単位のincludeに必要な+incdir（base_dirからの相対パス）"""
+        incdirs = []
+        for source in self.include_closure(path):
+            for _, _, incdir in self.includes.get(source, []):
+                if incdir and self.relative(incdir) not in incdirs:
+                    incdirs.append(self.relative(incdir))
+        return incdirs
+
+    def testbench_candidates(self):
+        """base_dirのコンパイル単位のうち、他のファイルからインスタンス化されないモジュールを定義するもの"""
+        instantiated = {name for info in self.files.values() for name in info['instances']}
+        candidates = []
+        for path in self.source_files(self.base_dir):
+            modules = [name for kind, name in self.files[path]['defines'] if kind == "module"]
+            if self.is_unit(path) and modules and not any(name in instantiated for name in modules):
+                candidates.append(path)
+        return candidates
+
+    def select_testbench(self, testbench=None):
+        """テストベンチのパス（指定がなければ候補が1つの場合にそのファイル、それ以外はValueError）"""
+        if testbench:
+            path = os.path.abspath(os.path.join(self.base_dir, testbench))
+            if path not in self.files:
+                raise ValueError(f"Testbench not found: {testbench}")
+            return path
+        candidates = self.testbench_candidates()
+        if len(candidates) != 1:
+            names = "".join(f"\n  - {self.relative(path)}" for path in candidates)
+            raise ValueError(f"Specify the testbench with --tb. Candidates:{names}")
+        return candidates[0]
+
+    def top_module(self, path):
+        """ファイルで最初に定義されているモジュール"""
+        for kind, name in self.files[path]['defines']:
+            if kind == "module":
+                return name
+        return None
+
+    def batch_script(self, order, testbench, top, run_time):
+        """ModelSimのバッチスクリプトを作成"""
+        lines = [
+            f"# ModelSim Batch Script for {os.path.basename(testbench)}",
+            "# Generated by sv_compile_graph.py from the include/instantiation graph",
+            "# Only the compilation units needed by the testbench are compiled, in dependency order",
+            "",
+            "# Create work library if it doesn't exist",
+            "if {[file exists work] == 0} {",
+            "    vlib work",
+            "}",
+            "",
+            f'echo "=== Compiling {os.path.basename(testbench)} ==="',
+            ""
+        ]
+
+        for number, path in enumerate(order, 1):
+            name = os.path.basename(path)
+            headers = [os.path.basename(source) for source in self.include_closure(path)[1:]]
+            dependencies = [os.path.basename(dependency) for dependency in self.unit_dependencies(path)]
+            lines.append(f"# {number}. {name}")
+            if headers:
+                lines.append(f"#    includes: {', '.join(headers)}")
+            if dependencies:
+                lines.append(f"#    depends on: {', '.join(dependencies)}")
+            options = "".join(f"+incdir+{incdir} " for incdir in self.unit_incdirs(path))
+            lines.append(f"vlog -work work {options}{self.relative(path)}")
+            lines.append(f'echo "{name} compilation completed"')
+            lines.append("")
+
+        lines += [
+            'echo "=== Compilation completed successfully ==="',
+            "",
+            "# Start simulation with the testbench module",
+            f"vsim -c -t ps -voptargs=+acc work.{top}",
+            "",
+            'echo "=== Starting simulation ==="',
+            "",
+            "# Run simulation with a timeout to avoid infinite loop",
+            f"set MAX_SIM_TIME {run_time}",
+            "run $MAX_SIM_TIME",
+            "",
+            'echo "=== Simulation completed ==="',
+            'echo "Simulation time: $now"',
+            "",
+            "# Exit simulation",
+            "quit -f",
+            ""
+        ]
+        return "\n".join(lines)
+
+def main():
+    """コマンドライン処理"""
+    parser = argparse.ArgumentParser(description='Generate a dependency-ordered ModelSim batch script')
+    parser.add_argument('part_dir', nargs='?', default='.', help='directory the script runs in (default: .)')
+    parser.add_argument('--tb', help='testbench file (default: the only top-level module file in part_dir)')
+    parser.add_argument('--top', help='top module name (default: the first module in the testbench)')
+    parser.add_argument('--search', action='append', default=[],
+                        help='other directory with modules/packages (e.g. ../part07_axi_simple_dual_port_ram)')
+    parser.add_argument('--incdir', action='append', default=[], help='additional include directory')
+    parser.add_argument('-o', '--output', help='batch script (default: <testbench>_graph_batch.do in part_dir)')
+    parser.add_argument('--run-time', default='10ms', help='simulation time limit (default: 10ms)')
+    parser.add_argument('--no-cache', action='store_true', help=f'do not use {GRAPH_CACHE_FILE}')
+    args = parser.parse_args()
+
+    print("=== SystemVerilog Compile Graph ===\n")
+    cache_file = None if args.no_cache else os.path.join(args.part_dir, GRAPH_CACHE_FILE)
+    try:
+        graph = CompileGraph(args.part_dir, args.search, args.incdir, cache_file)
+        graph.scan()
+    except OSError as e:
+        print(f"❌ Error scanning sources: {e}")
+        sys.exit(1)
+
+    print(f"✅ Scanned {len(graph.files)} files", end="")
+    if graph.cache:
+        print(f" (cache: {graph.cache.hits} hits, {graph.cache.misses} parsed)")
+    else:
+        print()
+
+    try:
+        testbench = graph.select_testbench(args.tb)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    top = args.top or graph.top_module(testbench)
+    order, cycles = graph.compile_order([testbench])
+
+    for warning in graph.warnings:
+        print(f"⚠️  {warning}")
+    if cycles:
+        print("❌ Dependency cycles found:")
+        for cycle in cycles:
+            print("  " + " -> ".join(graph.relative(path) for path in cycle))
+        sys.exit(1)
+
+    print(f"\nCompile order ({len(order)} units):")
+    for path in order:
+        print(f"  - {graph.relative(path)}")
+
+    output = args.output or os.path.join(
+        args.part_dir, os.path.splitext(os.path.basename(testbench))[0] + "_graph_batch.do")
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(graph.batch_script(order, testbench, top, args.run_time))
+    print(f"\n✅ Wrote batch script: {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SystemVerilog Span Editor
+元のテキスト上の範囲（開始・終了位置）で削除と挿入を集めてから、1回の走査で出力を作成します。
+編集ごとに、元のテキスト上の位置・行番号・出力上の位置・削除した内容のハッシュを
+編集ログ（JSON）に記録するため、ログを元のテキストに適用し直して出力を検証できます。
+"""
+
+import re
+import json
+import bisect
+import hashlib
+
+EDIT_LOG_VERSION = 1
+
+def text_hash(text):
+    """テキストのハッシュ値"""
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+class SpanEditor:
+    """元のテキストに対する削除・挿入を集めて一括で適用する"""
+
+    def __init__(self, text):
+        """初期化"""
+        self.text = text
+        self.edits = []
+        self.deleted_spans = set()
+        self.line_starts = None
+
+    def line_of(self, position):
+        """位置の行番号（1始まり）"""
+        if self.line_starts is None:
+            self.line_starts = [0] + [m.end() for m in re.finditer('\n', self.text)]
+        return bisect.bisect_right(self.line_starts, position)
+
+    def delete(self, start, end, reason, name=None):
+        """[start, end) の削除を登録（同じ範囲の削除は1回だけ）"""
+        if not 0 <= start <= end <= len(self.text):
+            raise ValueError(f"範囲がテキストの外です: {start}-{end}")
+        if (start, end) in self.deleted_spans:
+            return False
+        self.deleted_spans.add((start, end))
+        self.edits.append({'op': 'delete', 'start': start, 'end': end, 'reason': reason, 'name': name})
+        return True
+
+    def insert(self, position, text, reason, name=None):
+        """positionへの挿入を登録"""
+        if not 0 <= position <= len(self.text):
+            raise ValueError(f"位置がテキストの外です: {position}")
+        self.edits.append({'op': 'insert', 'start': position, 'end': position, 'reason': reason,
+                           'name': name, 'text': text})
+        return True
+
+    def sorted_edits(self):
+        """適用順（位置順、同じ位置では挿入が先、登録順）に並べ、重なる削除を検出する"""
+        order = sorted(range(len(self.edits)),
+                       key=lambda i: (self.edits[i]['start'], self.edits[i]['op'] != 'insert',
+                                      -self.edits[i]['end'], i))
+        edits = []
+        covered_end = 0
+        for i in order:
+            edit = self.edits[i]
+            if edit['op'] == 'delete':
+                if edit['start'] < covered_end:
+                    if edit['end'] <= covered_end:
+                        # 他の削除の範囲に含まれる
+                        continue
+                    raise ValueError(f"削除の範囲が重なっています: {edit['name']} ({edit['start']}-{edit['end']})")
+                covered_end = edit['end']
+            elif edit['start'] < covered_end:
+                raise ValueError(f"削除する範囲の中には挿入できません: {edit['name']} ({edit['start']})")
+            edits.append(edit)
+        return edits
+
+    def apply(self):
+        """すべての編集を1回の走査で適用し、(出力テキスト, 編集ログのエントリ) を返す"""
+        chunks = []
+        log = []
+        position = 0
+        output_length = 0
+
+        for edit in self.sorted_edits():
+            # 前の編集から今回の編集までは元のテキストをそのまま出力
+            unchanged = self.text[position:edit['start']]
+            chunks.append(unchanged)
+            output_length += len(unchanged)
+
+            entry = {
+                'op': edit['op'],
+                'reason': edit['reason'],
+                'name': edit['name'],
+                'start': edit['start'],
+                'end': edit['end'],
+                'line': self.line_of(edit['start']),
+                'end_line': self.line_of(max(edit['start'], edit['end'] - 1)),
+                'output_offset': output_length
+            }
+            if edit['op'] == 'insert':
+                chunks.append(edit['text'])
+                output_length += len(edit['text'])
+                entry['text'] = edit['text']
+            else:
+                entry['removed_md5'] = text_hash(self.text[edit['start']:edit['end']])
+            log.append(entry)
+            position = edit['end']
+
+        chunks.append(self.text[position:])
+        return ''.join(chunks), log
+
+def create_edit_log(source_file, target_file, source_text, output_text, entries):
+    """編集ログのデータを作成"""
+    return {
+        'version': EDIT_LOG_VERSION,
+        'source': source_file,
+        'target': target_file,
+        'source_md5': text_hash(source_text),
+        'target_md5': text_hash(output_text),
+        'edits': entries
+    }
+
+def write_edit_log(path, edit_log):
+    """編集ログを書き込む"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(edit_log, f, ensure_ascii=False, indent=1)
+        f.write('\n')
+
+def replay_edit_log(source_text, edit_log):
+    """編集ログを元のテキストに適用し直した出力を返す（ログと一致しない場合はValueError）"""
+    if edit_log.get('version') != EDIT_LOG_VERSION:
+        raise ValueError(f"未対応の編集ログ形式です: {edit_log.get('version')}")
+    if text_hash(source_text) != edit_log['source_md5']:
+        raise ValueError("元のファイルが編集ログの作成時から変更されています")
+
+    chunks = []
+    position = 0
+    output_length = 0
+    for entry in edit_log['edits']:
+        if entry['start'] < position:
+            raise ValueError(f"編集の順序が正しくありません: {entry['name']}")
+        unchanged = source_text[position:entry['start']]
+        chunks.append(unchanged)
+        output_length += len(unchanged)
+        if output_length != entry['output_offset']:
+            raise ValueError(f"出力上の位置が一致しません: {entry['name']}")
+
+        if entry['op'] == 'insert':
+            chunks.append(entry['text'])
+            output_length += len(entry['text'])
+        elif text_hash(source_text[entry['start']:entry['end']]) != entry['removed_md5']:
+            raise ValueError(f"削除した内容が一致しません: {entry['name']}")
+        position = entry['end']
+
+    chunks.append(source_text[position:])
+    output_text = ''.join(chunks)
+    if text_hash(output_text) != edit_log['target_md5']:
+        raise ValueError("編集ログを適用した結果が出力ファイルのハッシュ値と一致しません")
+    return output_text
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SystemVerilog Symbol Index
+SystemVerilogのソースを1回の走査でトークンに分割し、関数・タスク・typedef・パラメータ・
+変数/配列の宣言の位置（ソース文字列上の開始・終了位置）を索引にします。
+コメントと文字列の中は無視するため、コメント中の"endfunction"や名前の前方一致で誤検出しません。
+"""
+
+import os
+import re
+import sys
+import bisect
+from collections import namedtuple
+
+# トークン（kind: ident, keyword, number, string, directive, macro, system, op）
+Token = namedtuple('Token', 'kind value start end')
+
+TOKEN_PATTERN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:\\.|[^"\\\n])*")
+  | (?P<directive>`[A-Za-z_]\w*)
+  | (?P<number>(?:\d[\d_]*)?'[sS]?[bBoOdDhH]\s*[0-9a-fA-FxXzZ?_]+
+              |\d[\d_]*(?:\.\d[\d_]*)?(?:[eE][+-]?\d+)?(?:fs|ps|ns|us|ms|s)?
+              |'[01xXzZ])
+  | (?P<ident>[A-Za-z_][\w$]*|\\\S+)
+  | (?P<system>\$[A-Za-z_][\w$]*)
+  | (?P<op>'\{|::|\+\+|--|<=|>=|==|!=|&&|\|\||<<|>>|\*\*|->|.)
+""", re.VERBOSE | re.DOTALL)
+
+# 行全体を引数とするコンパイラディレクティブ（それ以外の`NAMEはマクロの参照）
+LINE_DIRECTIVES = {
+    'define', 'undef', 'undefineall', 'include', 'ifdef', 'ifndef', 'elsif', 'else', 'endif',
+    'timescale', 'default_nettype', 'resetall', 'celldefine', 'endcelldefine', 'line', 'pragma'
+}
+
+KEYWORDS = {
+    'module', 'endmodule', 'interface', 'endinterface', 'package', 'endpackage', 'program', 'endprogram',
+    'class', 'endclass', 'function', 'endfunction', 'task', 'endtask', 'begin', 'end', 'fork', 'join',
+    'join_any', 'join_none', 'case', 'casex', 'casez', 'randcase', 'endcase', 'generate', 'endgenerate',
+    'typedef', 'struct', 'union', 'enum', 'packed', 'parameter', 'localparam', 'automatic', 'static',
+    'input', 'output', 'inout', 'ref', 'const', 'var', 'signed', 'unsigned', 'void', 'return',
+    'if', 'else', 'for', 'foreach', 'while', 'do', 'repeat', 'forever', 'initial', 'final', 'always',
+    'always_ff', 'always_comb', 'always_latch', 'assign', 'import', 'export', 'extern', 'virtual',
+    'pure', 'posedge', 'negedge', 'or', 'and', 'not', 'wait', 'disable', 'default', 'type', 'new'
+}
+
+# 宣言の先頭になるデータ型・ネット型のキーワード
+DATA_TYPES = {
+    'logic', 'reg', 'wire', 'bit', 'byte', 'shortint', 'int', 'longint', 'integer', 'time',
+    'real', 'shortreal', 'realtime', 'string', 'event', 'chandle', 'tri', 'wand', 'wor', 'uwire'
+}
+
+# ブロックの開始・終了（この中の宣言はモジュールレベルの宣言として扱わない）
+BLOCK_OPEN = {'begin', 'fork', 'case', 'casex', 'casez', 'randcase', 'generate', 'class'}
+BLOCK_CLOSE = {'end', 'join', 'join_any', 'join_none', 'endcase', 'endgenerate', 'endclass'}
+
+# スコープ（モジュールなど）の開始と終了
+SCOPE_OPEN = {'module': 'endmodule', 'interface': 'endinterface', 'package': 'endpackage',
+              'program': 'endprogram'}
+
+# 本体を持つ宣言と終了キーワード
+BODY_END = {'function': 'endfunction', 'task': 'endtask'}
+
+BRACKETS = {'(': ')', '[': ']', '{': '}', "'{": '}'}
+
+def tokenize(text):
+    """テキストをトークンに分割（空白とコメントは除く）"""
+    tokens = []
+    append = tokens.append
+    position = 0
+    length = len(text)
+    match = TOKEN_PATTERN.match
+
+    while position < length:
+        m = match(text, position)
+        kind = m.lastgroup
+        end = m.end()
+
+        if kind == 'directive':
+            name = m.group()[1:]
+            if name in LINE_DIRECTIVES:
+                # 行末（バックスラッシュによる継続行を含む）までをディレクティブとする
+                end = directive_end(text, end)
+                append(Token('directive', text[m.start():end].rstrip(), m.start(), end))
+            else:
+                append(Token('macro', name, m.start(), end))
+        elif kind == 'ident':
+            value = m.group()
+            append(Token('keyword' if value in KEYWORDS else 'ident', value, m.start(), end))
+        elif kind not in ('space', 'comment'):
+            append(Token(kind, m.group(), m.start(), end))
+
+        position = end
+
+    return tokens
+
+def directive_end(text, position):
+    """ディレクティブの終了位置（行末の//コメントは含めない）"""
+    while True:
+        newline = text.find('\n', position)
+        line_end = len(text) if newline == -1 else newline
+        line = text[position:line_end]
+
+        # 文字列の外にあるコメントの手前で終わる
+        in_string = False
+        for i, char in enumerate(line):
+            if char == '"' and (i == 0 or line[i - 1] != '\\'):
+                in_string = not in_string
+            elif not in_string and line.startswith(('//', '/*'), i):
+                return position + i
+
+        if line.endswith('\\') and newline != -1:
+            position = newline + 1
+            continue
+        return line_end
+
+def include_target(token):
+    """`include ディレクティブのトークンからファイル名を取り出す（includeでなければNone）"""
+    if token.kind != 'directive' or not token.value.startswith('`include'):
+        return None
+    name = token.value[len('`include'):].strip()
+    if len(name) >= 2 and name[0] in '"<' and name[-1] in '">':
+        return name[1:-1]
+    return None
+
+class SvSymbol:
+    """索引の1エントリ（startとendはソース文字列上の位置、endは含まない）"""
+
+    __slots__ = ('kind', 'name', 'names', 'start', 'end', 'scope', 'depth', 'type_name', 'first_token',
+                 'last_token')
+
+    def __init__(self, kind, name, start, end, scope=None, depth=0, names=None, type_name=None,
+                 first_token=None, last_token=None):
+        self.kind = kind
+        self.name = name
+        self.names = names or [name]
+        self.start = start
+        self.end = end
+        self.scope = scope
+        self.depth = depth
+        self.type_name = type_name
+        self.first_token = first_token
+        self.last_token = last_token
+
+    def __repr__(self):
+        return f"SvSymbol({self.kind}, {self.name}, {self.start}-{self.end})"
+
+class SymbolIndex:
+    """関数・タスク・typedef・パラメータ・変数/配列の宣言の索引"""
+
+    def __init__(self, text, path=None):
+        """テキストを1回走査して索引を作成"""
+        self.text = text
+        self.path = path
+        self.tokens = tokenize(text)
+        self.symbols = []
+        self.by_name = {}
+        self.typedef_names = set()
+        self.line_starts = None
+        self.build()
+
+    @classmethod
+    def from_file(cls, path):
+        """ファイルを読み込んで索引を作成"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(f.read(), path)
+
+    @classmethod
+    def from_file_with_includes(cls, path):
+        """ファイルと、そのファイルから（間接的に）includeされるファイルの索引のリスト（先頭がpath）
+
+        includeはincludeするファイルのディレクトリ、カレントディレクトリの順に探し、
+        見つからないファイルと2回目以降のincludeは無視する。
+        """
+        indexes = []
+        seen = set()
+        pending = [path]
+        while pending:
+            current = pending.pop(0)
+            if os.path.realpath(current) in seen:
+                continue
+            seen.add(os.path.realpath(current))
+            index = cls.from_file(current)
+            indexes.append(index)
+            for name in index.includes():
+                for directory in (os.path.dirname(current), os.curdir):
+                    candidate = os.path.normpath(os.path.join(directory, name))
+                    if os.path.isfile(candidate):
+                        pending.append(candidate)
+                        break
+        return indexes
+
+    # --- 索引の作成 ---
+
+    def add(self, symbol):
+        """シンボルを登録"""
+        self.symbols.append(symbol)
+        for name in symbol.names:
+            self.by_name.setdefault(name, []).append(symbol)
+
+    def skip_group(self, i):
+        """括弧の組の終わりの次のトークン位置を返す（tokens[i]は開き括弧）"""
+        tokens = self.tokens
+        stack = []
+        while i < len(tokens):
+            value = tokens[i].value if tokens[i].kind == 'op' else None
+            if value in BRACKETS:
+                stack.append(BRACKETS[value])
+            elif stack and value == stack[-1]:
+                stack.pop()
+                if not stack:
+                    return i + 1
+            i += 1
+        return i
+
+    def find_at_depth(self, i, stops):
+        """括弧の外で最初にstopsのいずれかになるトークン位置（見つからなければトークン数）"""
+        tokens = self.tokens
+        while i < len(tokens):
+            token = tokens[i]
+            if token.kind == 'op':
+                if token.value in stops:
+                    return i
+                if token.value in BRACKETS:
+                    i = self.skip_group(i)
+                    continue
+            i += 1
+        return i
+
+    def declared_names(self, first, last):
+        """first..lastの括弧の外で '=' の直前にある名前（パラメータのリスト）"""
+        names = []
+        i = first
+        while i < last:
+            token = self.tokens[i]
+            if token.kind == 'op' and token.value in BRACKETS:
+                i = self.skip_group(i)
+                continue
+            if token.kind == 'ident' and i + 1 < last and self.tokens[i + 1].value == '=':
+                names.append(token.value)
+            i += 1
+        return names
+
+    def parse_body(self, i, scope, depth):
+        """function/taskを登録し、終了キーワード（とラベル）の次のトークン位置を返す"""
+        tokens = self.tokens
+        keyword = tokens[i].value
+        header_end = self.find_at_depth(i + 1, ('(', ';'))
+
+        # 括弧の外にある最後の識別子が名前（戻り値の型のビット幅や class:: を除く）
+        name = None
+        j = i + 1
+        while j < header_end:
+            if tokens[j].kind == 'op' and tokens[j].value in BRACKETS:
+                j = self.skip_group(j)
+                continue
+            if tokens[j].kind in ('ident', 'keyword') and tokens[j].value not in ('automatic', 'static', 'void'):
+                name = tokens[j].value
+            j += 1
+
+        # extern / pure virtual / DPIのimport（import "DPI-C" [context] function ...）はプロトタイプのみ
+        previous = tokens[i - 1] if i > 0 else None
+        if previous is not None and (previous.value in ('extern', 'virtual', 'pure', 'context')
+                                     or previous.kind == 'string'):
+            end_index = self.find_at_depth(header_end, (';',))
+        else:
+            end_keyword = BODY_END[keyword]
+            end_index = header_end
+            while end_index < len(tokens) and tokens[end_index].value != end_keyword:
+                end_index += 1
+            # endfunction : name
+            if end_index + 2 < len(tokens) and tokens[end_index + 1].value == ':':
+                end_index += 2
+
+        end_index = min(end_index, len(tokens) - 1)
+        if name is not None:
+            self.add(SvSymbol(keyword, name, tokens[i].start, tokens[end_index].end, scope, depth,
+                              first_token=i, last_token=end_index))
+        return end_index + 1
+
+    def parse_typedef(self, i, scope, depth):
+        """typedefを登録し、';'の次のトークン位置を返す"""
+        tokens = self.tokens
+        end_index = min(self.find_at_depth(i + 1, (';',)), len(tokens) - 1)
+
+        # 括弧の外にある最後の識別子が型名（typedef struct {...} name_t;）
+        name = None
+        j = i + 1
+        while j < end_index:
+            if tokens[j].kind == 'op' and tokens[j].value in BRACKETS:
+                j = self.skip_group(j)
+                continue
+            if tokens[j].kind == 'ident':
+                name = tokens[j].value
+            j += 1
+
+        if name is not None:
+            self.typedef_names.add(name)
+            self.add(SvSymbol('typedef', name, tokens[i].start, tokens[end_index].end, scope, depth,
+                              type_name=tokens[i + 1].value if i + 1 < end_index else None,
+                              first_token=i, last_token=end_index))
+        return end_index + 1
+
+    def parse_parameter(self, i, scope, depth, in_header):
+        """parameter/localparamを登録し、宣言の終わりの次のトークン位置を返す"""
+        tokens = self.tokens
+        if in_header:
+            # モジュールヘッダの #(parameter A = 1, parameter B = 2) は1つずつ
+            end_index = self.find_at_depth(i + 1, (',', ')'))
+            last = end_index - 1
+        else:
+            end_index = self.find_at_depth(i + 1, (';',))
+            last = end_index
+        last = min(last, len(tokens) - 1)
+
+        names = self.declared_names(i + 1, last + 1)
+        if names:
+            self.add(SvSymbol(tokens[i].value, names[0], tokens[i].start, tokens[last].end, scope, depth,
+                              names=names, first_token=i, last_token=last))
+        return end_index if in_header else end_index + 1
+
+    def is_declaration(self, i):
+        """tokens[i]から変数・配列の宣言が始まるか"""
+        tokens = self.tokens
+        token = tokens[i]
+        if token.kind == 'keyword':
+            return token.value in ('var', 'const', 'static', 'automatic')
+        if token.kind != 'ident':
+            return False
+        if token.value not in DATA_TYPES and token.value not in self.typedef_names and not token.value.endswith('_t'):
+            return False
+
+        # 型名 [パックド次元] 変数名
+        j = i + 1
+        while j < len(tokens) and tokens[j].kind in ('ident', 'keyword') and tokens[j].value in ('signed', 'unsigned'):
+            j += 1
+        while j < len(tokens) and tokens[j].value == '[':
+            j = self.skip_group(j)
+        return j < len(tokens) and tokens[j].kind == 'ident'
+
+    def parse_declaration(self, i, scope, depth):
+        """変数・配列の宣言を登録し、';'の次のトークン位置を返す"""
+        tokens = self.tokens
+        end_index = min(self.find_at_depth(i + 1, (';',)), len(tokens) - 1)
+
+        # 型名とパックド次元の後の識別子が変数名（カンマ区切りの場合はすべて）
+        j = i
+        while j < end_index and tokens[j].kind == 'keyword':
+            j += 1
+        type_name = tokens[j].value
+        j += 1
+        names = []
+        kind = 'variable'
+        expect_name = True
+        while j < end_index:
+            token = tokens[j]
+            if token.kind == 'op' and token.value in BRACKETS:
+                if not expect_name and names and token.value == '[':
+                    # 変数名の後ろの次元（アンパックド配列、連想配列、動的配列）
+                    kind = 'array'
+                j = self.skip_group(j)
+                continue
+            if expect_name and token.kind == 'ident':
+                names.append(token.value)
+                expect_name = False
+            elif token.value == '=':
+                # 初期値の中は読み飛ばす
+                j = self.find_at_depth(j + 1, (',', ';'))
+                continue
+            elif token.value == ',':
+                expect_name = True
+            j += 1
+
+        if names:
+            self.add(SvSymbol(kind, names[0], tokens[i].start, tokens[end_index].end, scope, depth,
+                              names=names, type_name=type_name, first_token=i, last_token=end_index))
+        return end_index + 1
+
+    def build(self):
+        """トークン列を先頭から1回走査して宣言を登録"""
+        tokens = self.tokens
+        scopes = []          # (終了キーワード, シンボル)
+        depth = 0            # begin/end などのブロックの深さ
+        paren_depth = 0      # モジュールヘッダの括弧の深さ
+        statement_start = True
+        i = 0
+
+        while i < len(tokens):
+            token = tokens[i]
+            value = token.value
+            scope = scopes[-1][1].name if scopes else None
+
+            if token.kind == 'directive':
+                i += 1
+                continue
+
+            if token.kind == 'keyword':
+                if value in BODY_END:
+                    i = self.parse_body(i, scope, depth)
+                    statement_start = True
+                    continue
+                if value == 'typedef':
+                    i = self.parse_typedef(i, scope, depth)
+                    statement_start = True
+                    continue
+                if value in ('parameter', 'localparam') and (statement_start or paren_depth > 0):
+                    i = self.parse_parameter(i, scope, depth, paren_depth > 0)
+                    statement_start = paren_depth == 0
+                    continue
+                if value in SCOPE_OPEN and i + 1 < len(tokens):
+                    symbol = SvSymbol(value, tokens[i + 1].value, token.start, token.end, scope, depth,
+                                      first_token=i)
+                    self.add(symbol)
+                    scopes.append((SCOPE_OPEN[value], symbol))
+                    i += 2
+                    statement_start = False
+                    continue
+                if scopes and value == scopes[-1][0]:
+                    scopes[-1][1].end = token.end
+                    scopes[-1][1].last_token = i
+                    scopes.pop()
+                    i += 1
+                    statement_start = True
+                    continue
+                if value in BLOCK_OPEN:
+                    depth += 1
+                elif value in BLOCK_CLOSE:
+                    depth = max(0, depth - 1)
+                    i += 1
+                    statement_start = True
+                    continue
+
+            if depth == 0 and paren_depth == 0 and statement_start and self.is_declaration(i):
+                i = self.parse_declaration(i, scope, depth)
+                statement_start = True
+                continue
+
+            if token.kind == 'op':
+                if value == '(':
+                    paren_depth += 1
+                elif value == ')':
+                    paren_depth = max(0, paren_depth - 1)
+            statement_start = value == ';' or value in ('begin', 'fork')
+            i += 1
+
+    # --- 検索 ---
+
+    def includes(self):
+        """`include で指定されたファイル名（ソース順）"""
+        return [name for name in map(include_target, self.tokens) if name is not None]
+
+    def find(self, name, kind=None):
+        """名前（とkind）が一致する最初のシンボル"""
+        kinds = kind if isinstance(kind, tuple) else (kind,)
+        for symbol in self.by_name.get(name, []):
+            if kind is None or symbol.kind in kinds:
+                return symbol
+        return None
+
+    def find_all(self, kind):
+        """kind（文字列またはタプル）が一致するシンボルをソース順に返す"""
+        kinds = kind if isinstance(kind, tuple) else (kind,)
+        return [symbol for symbol in self.symbols if symbol.kind in kinds]
+
+    def text_of(self, symbol):
+        """シンボルのソーステキスト"""
+        return self.text[symbol.start:symbol.end]
+
+    def line_of(self, position):
+        """位置の行番号（1始まり）"""
+        if self.line_starts is None:
+            self.line_starts = [0] + [m.end() for m in re.finditer('\n', self.text)]
+        return bisect.bisect_right(self.line_starts, position)
+
+def main():
+    """索引を一覧表示（python3 sv_symbol_index.py FILE...）"""
+    if len(sys.argv) < 2:
+        print("Usage: python3 sv_symbol_index.py FILE...")
+        sys.exit(1)
+
+    for path in sys.argv[1:]:
+        index = SymbolIndex.from_file(path)
+        print(f"=== {path}: {len(index.symbols)} symbols, {len(index.tokens)} tokens ===")
+        for symbol in index.symbols:
+            names = ', '.join(symbol.names)
+            lines = f"{index.line_of(symbol.start)}-{index.line_of(max(symbol.start, symbol.end - 1))}"
+            print(f"  {symbol.kind:<10} {names:<48} lines {lines:<10} [{symbol.start}:{symbol.end}]")
+
+if __name__ == "__main__":
+    main()
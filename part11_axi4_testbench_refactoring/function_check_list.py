@@ -7,9 +7,13 @@ AXI Testbench Function Accuracy Checker
 
 import os
 import re
+import sys
 import difflib
 from pathlib import Path
 
+from sv_symbol_index import SymbolIndex
+from sv_function_partition import manifest_from_args
+
 class FunctionChecker:
     def __init__(self):
         self.source_file = "axi_simple_dual_port_ram_tb.sv"
@@ -58,6 +62,10 @@ class FunctionChecker:
             "display_all_arrays": "axi_monitoring_functions.svh"
         }
         
+        # ファイルごとの宣言の索引（各ファイルは1回だけ読み込む）
+        self.indexes = {}
+        self.include_trees = {}
+        
         self.results = {
             "exact_match": [],
             "different": [],
@@ -66,32 +74,43 @@ class FunctionChecker:
             "error": []
         }
 
+    def apply_manifest(self, manifest):
+        """振り分けのマニフェスト（sv_function_partition.py）の割り当てを使う"""
+        self.functions_to_check = {
+            func_name: header
+            for header, func_names in manifest['headers'].items()
+            for func_name in func_names
+        }
+
+    def get_index(self, file_path):
+        """ファイルの索引を取得（初回のみ読み込んで作成）"""
+        if file_path not in self.indexes:
+            self.indexes[file_path] = SymbolIndex.from_file(file_path)
+        return self.indexes[file_path]
+
+    def get_source_indexes(self):
+        """元のファイルとincludeされるファイルの索引（分割済みのヘッダにある関数も元の関数として扱う）"""
+        if self.source_file not in self.include_trees:
+            self.include_trees[self.source_file] = SymbolIndex.from_file_with_includes(self.source_file)
+            for index in self.include_trees[self.source_file]:
+                self.indexes.setdefault(index.path, index)
+        return self.include_trees[self.source_file]
+
     def extract_function(self, func_name, file_path):
-        """指定されたファイルから関数を抽出"""
+        """指定されたファイル（元のファイルの場合はincludeされるファイルも）から関数を抽出"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 関数の開始パターンを検索
-            start_pattern = rf"function\s+automatic\s+.*\b{re.escape(func_name)}\b"
-            start_match = re.search(start_pattern, content)
-            
-            if not start_match:
-                return None
-            
-            start_pos = start_match.start()
-            
-            # 関数の終了位置を検索（次の関数またはファイル終端）
-            # 関数の終了は "endfunction" で判断
-            remaining_content = content[start_pos:]
-            end_pos = remaining_content.find("endfunction")
+            if file_path == self.source_file:
+                indexes = self.get_source_indexes()
+            else:
+                indexes = [self.get_index(file_path)]
             
-            if end_pos == -1:
-                return None
+            for index in indexes:
+                symbol = index.find(func_name, ("function", "task"))
+                if symbol is not None:
+                    # function ... endfunction（ラベルを含む）
+                    return index.text_of(symbol).strip()
             
-            # endfunctionを含む
-            function_content = remaining_content[:end_pos + len("endfunction")]
-            return function_content.strip()
+            return None
             
         except Exception as e:
             print(f"Error extracting {func_name} from {file_path}: {e}")
@@ -208,6 +227,13 @@ class FunctionChecker:
 
 def main():
     checker = FunctionChecker()
+    try:
+        manifest = manifest_from_args(sys.argv[1:], checker.source_file)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error loading manifest: {e}")
+        sys.exit(1)
+    if manifest:
+        checker.apply_manifest(manifest)
     checker.check_all_functions()
     checker.print_summary()
 
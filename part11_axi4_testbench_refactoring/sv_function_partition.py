@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AXI Testbench Function Partitioner
+テストベンチの関数とモジュールレベルの宣言の呼び出し・参照グラフを作成し、
+関数をヘッダファイルに自動で振り分けて、分割・更新・検証の3つのスクリプトが共通で使う
+マニフェスト（testbench_partition.json）を出力します。
+
+テストベンチからincludeされるファイル（分割済みのヘッダなど）もたどり、
+ヘッダにある関数はそのヘッダに固定したうえで、呼び出し・参照のグラフに含めます。
+
+振り分けの手順:
+1. includeされるファイルにある関数、既存のマニフェストの割り当て（--seed）、命名規則に一致する関数を固定する
+2. モジュールの変数・配列を参照せず、そのような補助関数だけを呼ぶ関数はユーティリティにする
+3. 残りの関数は、呼び出し・被呼び出しの関係が最も多いヘッダに移す（ヘッダ間の依存が減らなくなるまで繰り返す）
+関数から参照される宣言（と、その宣言が参照する型・パラメータ）のうちテストベンチにあるものは
+すべて共通定義に移します。
+
+3つのスクリプトは、マニフェストのsource_md5がテストベンチの内容と一致しない場合は
+マニフェストを使わず、テストベンチから命名規則とグラフで振り分け直します。
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import hashlib
+
+from sv_symbol_index import SymbolIndex
+
+MANIFEST_VERSION = 1
+
+# 既定のマニフェストファイル（3つのスクリプトは存在する場合に読み込む）
+PARTITION_MANIFEST = "testbench_partition.json"
+
+COMMON_DEFS_FILE = "axi_common_defs.svh"
+UTILITY_FILE = "axi_utility_functions.svh"
+
+# ヘッダファイル（include文の順序）
+HEADER_ORDER = [
+    "axi_stimulus_functions.svh",
+    "axi_verification_functions.svh",
+    "axi_utility_functions.svh",
+    "axi_random_generation.svh",
+    "axi_monitoring_functions.svh"
+]
+
+# 命名規則（上から順に判定）
+NAMING_RULES = [
+    ("axi_monitoring_functions.svh", r"^display_|^write_(debug_)?log$"),
+    ("axi_random_generation.svh", r"weight"),
+    ("axi_verification_functions.svh", r"_expected$|^initialize_"),
+    ("axi_stimulus_functions.svh", r"^generate_\w*payloads")
+]
+
+# モジュールレベルの宣言のうち共通定義に移す候補
+DEFINITION_KINDS = ("parameter", "localparam", "typedef", "array", "variable")
+
+# 振り分けの繰り返し回数の上限
+MAX_PASSES = 10
+
+def load_partition_manifest(path=PARTITION_MANIFEST):
+    """マニフェストを読み込む（存在しない場合はNone）"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"未対応のマニフェスト形式です: {manifest.get('version')}")
+    return manifest
+
+def source_hash(text):
+    """テストベンチの内容のハッシュ値（マニフェストのsource_md5）"""
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+def partition_source(source_file, seeds=None):
+    """テストベンチ（とincludeされるファイル）を振り分けたマニフェストのデータを作成"""
+    partitioner = FunctionPartitioner(SymbolIndex.from_file_with_includes(source_file), seeds)
+    partitioner.partition()
+    return partitioner.manifest(source_file)
+
+def manifest_from_args(argv, source_file):
+    """--manifest FILE で指定されたマニフェスト、指定がなければ既定のマニフェストを読み込む
+
+    マニフェストがない場合はNone。マニフェストがsource_fileとは別の内容から作成されている場合は
+    警告を表示し、source_fileを命名規則とグラフで振り分け直した結果を返す。
+    """
+    path = PARTITION_MANIFEST
+    if "--manifest" in argv:
+        position = argv.index("--manifest") + 1
+        if position >= len(argv):
+            raise ValueError("--manifest にファイルを指定してください")
+        path = argv[position]
+        if not os.path.exists(path):
+            raise ValueError(f"マニフェストが見つかりません: {path}")
+    manifest = load_partition_manifest(path)
+    if manifest is None:
+        return None
+
+    with open(source_file, 'r', encoding='utf-8') as f:
+        current = source_hash(f.read())
+    if manifest.get('source_md5') != current:
+        print(f"⚠️  {path} was created from a different {manifest.get('source')} "
+              f"(md5 {str(manifest.get('source_md5'))[:12]}, current {current[:12]}); "
+              f"re-partitioning {source_file} by naming rules and call graph")
+        return partition_source(source_file)
+    return manifest
+
+def definition_pattern(symbol):
+    """MainFileUpdater.definitions_to_removeと同じ形式の定義パターン"""
+    if symbol.kind in ("parameter", "localparam"):
+        return f"{symbol.kind} {symbol.name}"
+    if symbol.kind == "typedef":
+        return f"typedef {symbol.type_name} {symbol.name}"
+    return f"{symbol.type_name} {symbol.name}"
+
+class FunctionPartitioner:
+    """関数の呼び出し・参照グラフによるヘッダファイルへの振り分け"""
+
+    def __init__(self, indexes, seeds=None):
+        """初期化（indexes: テストベンチとincludeされるファイルの索引、seeds: 関数名 -> ヘッダファイル）"""
+        self.index = indexes[0]
+        self.indexes = indexes
+        self.seeds = seeds or {}
+
+        # シンボル -> シンボルのある索引（同じ名前はテストベンチ、includeの順で最初のもの）
+        self.index_of = {}
+        self.functions = []
+        self.function_names = set()
+        self.globals = {}
+        for index in indexes:
+            for symbol in index.find_all(("function", "task")):
+                if symbol.depth == 0 and symbol.name not in self.function_names:
+                    self.functions.append(symbol)
+                    self.function_names.add(symbol.name)
+                    self.index_of[symbol] = index
+            for symbol in index.find_all(DEFINITION_KINDS):
+                if symbol.depth == 0:
+                    self.index_of[symbol] = index
+                    for name in symbol.names:
+                        self.globals.setdefault(name, symbol)
+        self.calls = {}
+        self.references = {}
+        self.assignments = {}
+        self.reasons = {}
+
+    def referenced_names(self, symbol):
+        """シンボルの範囲内で参照している関数・宣言の名前"""
+        tokens = self.index_of[symbol].tokens
+        names = set()
+        for i in range(symbol.first_token + 1, symbol.last_token + 1):
+            token = tokens[i]
+            if token.kind != 'ident' or token.value in symbol.names:
+                continue
+            # 構造体のメンバー（.name）は除く
+            if tokens[i - 1].value == '.':
+                continue
+            if token.value in self.function_names or token.value in self.globals:
+                names.add(token.value)
+        return names
+
+    def build_graph(self):
+        """関数の呼び出しと宣言の参照のグラフを作成"""
+        for symbol in self.functions:
+            names = self.referenced_names(symbol)
+            self.calls[symbol.name] = sorted(name for name in names if name in self.function_names)
+            self.references[symbol.name] = sorted(name for name in names if name in self.globals)
+
+    def neighbors(self, name):
+        """呼び出し・被呼び出しの関係にある関数"""
+        callers = [caller for caller, callees in self.calls.items() if name in callees]
+        return self.calls[name] + callers
+
+    def helper_functions(self):
+        """補助関数（モジュールの変数・配列を参照せず、補助関数だけを呼ぶ関数）"""
+        candidates = {
+            name for name in self.calls
+            if all(self.globals[ref].kind in ("parameter", "localparam", "typedef") for ref in self.references[name])
+        }
+        # 補助関数以外を呼ぶ関数を除き、変わらなくなるまで繰り返す
+        while True:
+            helpers = {name for name in candidates if all(callee in candidates for callee in self.calls[name])}
+            if helpers == candidates:
+                return helpers
+            candidates = helpers
+
+    def partition(self):
+        """関数をヘッダファイルに振り分ける"""
+        self.build_graph()
+        helpers = self.helper_functions()
+        fixed = set()
+
+        for symbol in self.functions:
+            name = symbol.name
+            index = self.index_of[symbol]
+            if index is not self.index:
+                # includeされるファイルにある関数はそのファイルに固定
+                self.assignments[name] = os.path.basename(index.path)
+                self.reasons[name] = "include"
+                fixed.add(name)
+                continue
+            if name in self.seeds:
+                self.assignments[name] = self.seeds[name]
+                self.reasons[name] = "seed"
+                fixed.add(name)
+                continue
+            for header, pattern in NAMING_RULES:
+                if re.search(pattern, name):
+                    self.assignments[name] = header
+                    self.reasons[name] = "naming"
+                    fixed.add(name)
+                    break
+            else:
+                if name in helpers:
+                    self.assignments[name] = UTILITY_FILE
+                    self.reasons[name] = "helper"
+                    fixed.add(name)
+
+        # 残りの関数は関係の多いヘッダに移す（未割り当ての間はユーティリティ）
+        movable = [symbol.name for symbol in self.functions if symbol.name not in fixed]
+        for name in movable:
+            self.assignments[name] = UTILITY_FILE
+            self.reasons[name] = "graph"
+
+        for _ in range(MAX_PASSES):
+            moved = False
+            for name in movable:
+                counts = {}
+                for neighbor in self.neighbors(name):
+                    header = self.assignments[neighbor]
+                    counts[header] = counts.get(header, 0) + 1
+                if not counts:
+                    continue
+                current = self.assignments[name]
+                best = max(counts, key=lambda header: (counts[header], header == current))
+                if counts[best] > counts.get(current, 0):
+                    self.assignments[name] = best
+                    moved = True
+            if not moved:
+                break
+
+        return self.assignments
+
+    def definitions(self):
+        """共通定義に移す宣言（関数から参照される宣言とその依存、すべてのパラメータ）のうちテストベンチにあるもの"""
+        needed = set()
+        pending = [ref for name in self.references for ref in self.references[name]]
+        pending += [name for name, symbol in self.globals.items()
+                    if symbol.kind in ("parameter", "localparam") and self.index_of[symbol] is self.index]
+        while pending:
+            name = pending.pop()
+            if name in needed:
+                continue
+            needed.add(name)
+            symbol = self.globals[name]
+            pending.extend(self.referenced_names(symbol))
+            if symbol.type_name in self.globals:
+                pending.append(symbol.type_name)
+
+        # 同じ宣言は1回だけ、ソースの順に並べる
+        symbols = []
+        for symbol in self.index.find_all(DEFINITION_KINDS):
+            if symbol.depth == 0 and any(self.globals.get(name) is symbol for name in symbol.names if name in needed):
+                symbols.append(symbol)
+        return symbols
+
+    def header_dependencies(self):
+        """ヘッダ間の依存（呼び出し先の関数があるヘッダ）と、ヘッダをまたぐ呼び出しの数"""
+        dependencies = {}
+        cross_calls = 0
+        for caller, callees in self.calls.items():
+            for callee in callees:
+                source, target = self.assignments[caller], self.assignments[callee]
+                if source != target:
+                    cross_calls += 1
+                    dependencies.setdefault(source, set()).add(target)
+        return {header: sorted(targets) for header, targets in sorted(dependencies.items())}, cross_calls
+
+    def manifest(self, source_file):
+        """マニフェストのデータを作成"""
+        headers = {}
+        for symbol in self.functions:
+            headers.setdefault(self.assignments[symbol.name], []).append(symbol.name)
+        ordered = [header for header in HEADER_ORDER if header in headers]
+        ordered += sorted(header for header in headers if header not in HEADER_ORDER)
+        dependencies, cross_calls = self.header_dependencies()
+
+        return {
+            'version': MANIFEST_VERSION,
+            'source': source_file,
+            'source_md5': source_hash(self.index.text),
+            'common_defs': COMMON_DEFS_FILE,
+            'includes': [COMMON_DEFS_FILE] + ordered,
+            'headers': {header: headers[header] for header in ordered},
+            'definitions': [definition_pattern(symbol) for symbol in self.definitions()],
+            'dependencies': dependencies,
+            'cross_calls': cross_calls,
+            'assignments': {
+                name: {'header': self.assignments[name], 'reason': self.reasons[name],
+                       'calls': self.calls[name]}
+                for name in sorted(self.assignments)
+            }
+        }
+
+def seeds_from_manifest(manifest):
+    """既存のマニフェストの割り当てを固定の割り当てとして使う"""
+    if not manifest:
+        return {}
+    return {name: header for header, names in manifest.get('headers', {}).items() for name in names}
+
+def main():
+    """コマンドライン処理"""
+    parser = argparse.ArgumentParser(description='Partition testbench functions into header files')
+    parser.add_argument('source', nargs='?', default='axi_simple_dual_port_ram_tb.sv',
+                        help='testbench source file (default: axi_simple_dual_port_ram_tb.sv)')
+    parser.add_argument('-o', '--output', default=PARTITION_MANIFEST,
+                        help=f'manifest file (default: {PARTITION_MANIFEST})')
+    parser.add_argument('--seed', help='keep the assignments of an existing manifest')
+    args = parser.parse_args()
+
+    print("=== AXI Testbench Function Partitioner ===\n")
+    try:
+        seeds = seeds_from_manifest(load_partition_manifest(args.seed)) if args.seed else {}
+        manifest = partition_source(args.source, seeds)
+    except Exception as e:
+        print(f"❌ Error loading input: {e}")
+        sys.exit(1)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+        f.write('\n')
+
+    for header, names in manifest['headers'].items():
+        print(f"📁 {header}: {len(names)} functions")
+        for name in names:
+            print(f"  - {name} ({manifest['assignments'][name]['reason']})")
+    print(f"\n📁 {COMMON_DEFS_FILE}: {len(manifest['definitions'])} definitions")
+    print(f"Cross-header calls: {manifest['cross_calls']}")
+    for header, targets in manifest['dependencies'].items():
+        print(f"  {header} -> {', '.join(targets)}")
+    print(f"\n✅ Wrote manifest: {args.output}")
+
+if __name__ == "__main__":
+    main()
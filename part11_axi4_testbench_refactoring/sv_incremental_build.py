@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SystemVerilog Incremental Build
+sv_compile_graph.py のグラフからテストベンチに必要なコンパイル単位を依存順に求め、
+前回のコンパイルから変わったコンパイル単位だけを vlog でコンパイルしてから vsim を実行します。
+
+コンパイル単位ごとに、次の内容からキーを作成してビルドキャッシュ（.sv_build_cache.json）に記録します。
+- コンパイル単位とincludeされるファイル（間接的なものを含む）のパスと内容のハッシュ値
+- vlogのオプション（+incdir）
+- importするパッケージのキー（パッケージが変わったらimportする側もコンパイルし直す）
+インスタンス化するモジュールはvsimのエラボレーションで解決されるため、キーには含めません。
+テストベンチはすべて同じworkライブラリにコンパイルされ、同じ名前のモジュール（top_tbなど）を
+定義することがあるため、設計単位の名前ごとに最後にコンパイルしたファイルも記録し、
+別のファイルで上書きされた設計単位を定義するファイルはコンパイルし直します。
+
+vlib・vlog・vsimのパスは --vlib・--vlog・--vsim（または環境変数 VLIB・VLOG・VSIM）で変更できるため、
+ModelSimがない環境でもスタブのコマンドで動作を確認できます。
+
+使用例:
+  python3 sv_incremental_build.py ../part13_axi4_testbench_byte_access_verification \\
+      --tb axi_simple_dual_port_ram_tb_part13.sv --search ../part07_axi_simple_dual_port_ram
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+
+from sv_compile_graph import CompileGraph, GRAPH_CACHE_FILE
+
+BUILD_CACHE_VERSION = 2
+
+# 既定のビルドキャッシュ（パートのディレクトリに作成）
+BUILD_CACHE_FILE = ".sv_build_cache.json"
+
+WORK_LIBRARY = "work"
+
+class IncrementalBuilder:
+    """変わったコンパイル単位だけをコンパイルしてシミュレーションを実行"""
+
+    def __init__(self, graph, vlib="vlib", vlog="vlog", vsim="vsim", cache_file=None):
+        """初期化（graph: scan済みのCompileGraph）"""
+        self.graph = graph
+        self.vlib = vlib
+        self.vlog = vlog
+        self.vsim = vsim
+        self.cache_file = cache_file or os.path.join(graph.base_dir, BUILD_CACHE_FILE)
+        self.units = {}
+        self.owners = {}    # 設計単位の名前 -> workライブラリの設計単位を最後にコンパイルしたファイル
+        self.keys = {}
+
+    def load_cache(self):
+        """ビルドキャッシュを読み込む（vlogやworkライブラリが変わった場合は空にする）"""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (data.get('version') == BUILD_CACHE_VERSION and data.get('vlog') == self.vlog
+                and os.path.isdir(os.path.join(self.graph.base_dir, WORK_LIBRARY))):
+            self.units = data.get('units', {})
+            self.owners = data.get('owners', {})
+
+    def save_cache(self):
+        """ビルドキャッシュを書き込む（一時ファイルに書いてから置き換える）"""
+        temp_file = self.cache_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': BUILD_CACHE_VERSION, 'vlog': self.vlog, 'units': self.units,
+                       'owners': self.owners}, f, indent=1)
+            f.write('\n')
+        os.replace(temp_file, self.cache_file)
+
+    def vlog_options(self, path):
+        """コンパイル単位のvlogのオプション"""
+        return ["-work", WORK_LIBRARY] + [f"+incdir+{incdir}" for incdir in self.graph.unit_incdirs(path)]
+
+    def unit_key(self, path):
+        """コンパイル単位のキー（includeされるファイルの内容、オプション、importするパッケージのキー）"""
+        if path not in self.keys:
+            digest = hashlib.md5()
+            for source in self.graph.include_closure(path):
+                digest.update(f"{self.graph.relative(source)}:{self.graph.hashes[source]}\n".encode('utf-8'))
+            digest.update(" ".join(self.vlog_options(path)).encode('utf-8'))
+            for package in self.graph.package_dependencies(path):
+                digest.update(f"\n{self.graph.relative(package)}:{self.unit_key(package)}".encode('utf-8'))
+            self.keys[path] = digest.hexdigest()
+        return self.keys[path]
+
+    def design_units(self, path):
+        """コンパイル単位が（includeしたファイルを含めて）定義する設計単位の名前"""
+        return [name for source in self.graph.include_closure(path) for _, name in self.graph.files[source]['defines']]
+
+    def is_current(self, path):
+        """前回のコンパイルから変わっておらず、定義する設計単位が他のファイルで上書きされていないか"""
+        relative = self.graph.relative(path)
+        return (self.units.get(relative) == self.unit_key(path)
+                and all(self.owners.get(name) == relative for name in self.design_units(path)))
+
+    def plan(self, order):
+        """コンパイルが必要なコンパイル単位（依存順）"""
+        return [path for path in order if not self.is_current(path)]
+
+    def run(self, command):
+        """コマンドを実行（base_dirで実行、出力はそのまま表示）"""
+        print(f"  $ {' '.join(command)}")
+        sys.stdout.flush()
+        return subprocess.run(command, cwd=self.graph.base_dir).returncode
+
+    def build(self, order, force=False):
+        """変わったコンパイル単位をコンパイル（戻り値: 成功したか）"""
+        if not force:
+            self.load_cache()
+        # 今回のテストベンチで使わないコンパイル単位の記録は残す（他のテストベンチと共有するworkのため）
+        pending = order if force else self.plan(order)
+        print(f"Compilation units: {len(order)} ({len(pending)} to compile, {len(order) - len(pending)} up to date)")
+
+        if pending and not os.path.isdir(os.path.join(self.graph.base_dir, WORK_LIBRARY)):
+            if self.run([self.vlib, WORK_LIBRARY]) != 0:
+                print(f"❌ {self.vlib} failed")
+                return False
+
+        for path in pending:
+            relative = self.graph.relative(path)
+            start = time.time()
+            # 失敗した場合は記録を消し、次回もコンパイルする（途中まで上書きされた設計単位の記録も消す）
+            self.units.pop(relative, None)
+            for name in self.design_units(path):
+                self.owners.pop(name, None)
+            if self.run([self.vlog] + self.vlog_options(path) + [relative]) != 0:
+                self.save_cache()
+                print(f"❌ Compilation failed: {relative}")
+                return False
+            self.units[relative] = self.unit_key(path)
+            for name in self.design_units(path):
+                self.owners[name] = relative
+            self.save_cache()
+            print(f"✅ {relative} compiled ({time.time() - start:.2f}s)")
+
+        if not pending:
+            print("✅ All compilation units are up to date")
+        return True
+
+    def simulate(self, top, run_time):
+        """vsimでシミュレーションを実行（戻り値: 成功したか）"""
+        command = [self.vsim, "-c", "-t", "ps", "-voptargs=+acc", "-do", f"run {run_time}; quit -f",
+                   f"{WORK_LIBRARY}.{top}"]
+        return self.run(command) == 0
+
+def main():
+    """コマンドライン処理"""
+    parser = argparse.ArgumentParser(description='Compile only changed units, then run the simulation')
+    parser.add_argument('part_dir', nargs='?', default='.', help='directory the tools run in (default: .)')
+    parser.add_argument('--tb', help='testbench file (default: the only top-level module file in part_dir)')
+    parser.add_argument('--top', help='top module name (default: the first module in the testbench)')
+    parser.add_argument('--search', action='append', default=[],
+                        help='other directory with modules/packages (e.g. ../part07_axi_simple_dual_port_ram)')
+    parser.add_argument('--incdir', action='append', default=[], help='additional include directory')
+    parser.add_argument('--run-time', default='10ms', help='simulation time limit (default: 10ms)')
+    parser.add_argument('--vlib', default=os.environ.get('VLIB', 'vlib'), help='vlib command (default: $VLIB or vlib)')
+    parser.add_argument('--vlog', default=os.environ.get('VLOG', 'vlog'), help='vlog command (default: $VLOG or vlog)')
+    parser.add_argument('--vsim', default=os.environ.get('VSIM', 'vsim'), help='vsim command (default: $VSIM or vsim)')
+    parser.add_argument('--force', action='store_true', help='compile all units')
+    parser.add_argument('--dry-run', action='store_true', help='show the units to compile without running tools')
+    parser.add_argument('--no-sim', action='store_true', help='compile only')
+    args = parser.parse_args()
+
+    print("=== SystemVerilog Incremental Build ===\n")
+    try:
+        graph = CompileGraph(args.part_dir, args.search, args.incdir, os.path.join(args.part_dir, GRAPH_CACHE_FILE))
+        graph.scan()
+    except OSError as e:
+        print(f"❌ Error scanning sources: {e}")
+        sys.exit(1)
+
+    try:
+        testbench = graph.select_testbench(args.tb)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    order, cycles = graph.compile_order([testbench])
+    for warning in graph.warnings:
+        print(f"⚠️  {warning}")
+    if cycles:
+        print("❌ Dependency cycles found:")
+        for cycle in cycles:
+            print("  " + " -> ".join(graph.relative(path) for path in cycle))
+        sys.exit(1)
+
+    builder = IncrementalBuilder(graph, args.vlib, args.vlog, args.vsim)
+    if args.dry_run:
+        builder.load_cache()
+        pending = order if args.force else builder.plan(order)
+        print(f"Compilation units: {len(order)} ({len(pending)} to compile)")
+        for path in order:
+            print(f"  {'compile' if path in pending else 'up to date':<10} {graph.relative(path)}")
+        return
+
+    try:
+        if not builder.build(order, args.force):
+            sys.exit(1)
+        if args.no_sim:
+            return
+        print("\n=== Starting simulation ===")
+        if not builder.simulate(args.top or graph.top_module(testbench), args.run_time):
+            print("❌ Simulation failed")
+            sys.exit(1)
+    except OSError as e:
+        # vlog・vsimが見つからない場合など
+        print(f"❌ Error running tools: {e}")
+        sys.exit(1)
+    print("✅ Simulation completed")
+
+if __name__ == "__main__":
+    main()
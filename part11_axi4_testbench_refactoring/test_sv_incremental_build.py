@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+sv_incremental_build.py のテスト
+ModelSimの代わりに、呼び出しを記録するスタブのvlib・vlog・vsimを使います。
+スタブのvlogはファイル中のモジュールごとに work/<モジュール名> にファイル名を書き、
+スタブのvsimはトップモジュールをコンパイルしたファイル名を記録します。
+"""
+
+import os
+import sys
+import json
+
+import pytest
+
+from sv_compile_graph import CompileGraph
+from sv_incremental_build import IncrementalBuilder
+
+STUB_VLIB = """
+import os, sys
+os.makedirs(sys.argv[1], exist_ok=True)
+"""
+
+STUB_VLOG = """
+import os, re, sys, json
+source = sys.argv[-1]
+with open(os.environ['STUB_LOG'], 'a') as f:
+    f.write(json.dumps(['vlog', source]) + '\\n')
+if source == os.environ.get('STUB_FAIL'):
+    sys.exit(2)
+with open(source) as f:
+    for name in re.findall(r'^\\s*(?:module|package)\\s+(\\w+)', f.read(), re.M):
+        with open(os.path.join('work', name), 'w') as out:
+            out.write(source)
+"""
+
+STUB_VSIM = """
+import os, sys, json
+top = sys.argv[-1].split('.', 1)[1]
+with open(os.path.join('work', top)) as f:
+    source = f.read()
+with open(os.environ['STUB_LOG'], 'a') as f:
+    f.write(json.dumps(['vsim', source]) + '\\n')
+"""
+
+SOURCES = {
+    "common_defs.svh": "`ifndef COMMON_DEFS_SVH\n`define COMMON_DEFS_SVH\nparameter WIDTH = 8;\n`endif\n",
+    "logger_pkg.sv": "package logger_pkg;\n  function void log(string s); endfunction\nendpackage\n",
+    "sub.sv": '`include "common_defs.svh"\nmodule sub;\n  import logger_pkg::*;\nendmodule\n',
+    "other.sv": "module other;\nendmodule\n",
+    "tb_dual.sv": "module top_tb;\n  sub u_sub();\n  other u_other();\nendmodule\n",
+    "tb_single.sv": "module top_tb;\n  sub u_sub();\nendmodule\n"
+}
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """スタブのツールとソースを用意したパートのディレクトリ"""
+    tools = tmp_path / "tools"
+    tools.mkdir()
+    for name, body in (("vlib", STUB_VLIB), ("vlog", STUB_VLOG), ("vsim", STUB_VSIM)):
+        path = tools / name
+        path.write_text(f"#!{sys.executable}\n{body}")
+        path.chmod(0o755)
+
+    part = tmp_path / "part"
+    part.mkdir()
+    for name, text in SOURCES.items():
+        (part / name).write_text(text)
+
+    log = tmp_path / "calls.log"
+    monkeypatch.setenv("STUB_LOG", str(log))
+    monkeypatch.delenv("STUB_FAIL", raising=False)
+    return part, tools, log
+
+def run_build(project, testbench, simulate=True):
+    """グラフを作り直してビルドし、(成功したか, 今回のスタブの呼び出し) を返す"""
+    part, tools, log = project
+    if log.exists():
+        log.unlink()
+    graph = CompileGraph(str(part))
+    graph.scan()
+    order, cycles = graph.compile_order([graph.select_testbench(testbench)])
+    assert not cycles
+    builder = IncrementalBuilder(graph, str(tools / "vlib"), str(tools / "vlog"), str(tools / "vsim"))
+    ok = builder.build(order)
+    if ok and simulate:
+        ok = builder.simulate("top_tb", "1us")
+    calls = [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+    return ok, calls
+
+def compiled(calls):
+    """vlogでコンパイルしたファイル"""
+    return [source for tool, source in calls if tool == "vlog"]
+
+def test_unchanged_sources_are_not_recompiled(project):
+    ok, calls = run_build(project, "tb_dual.sv")
+    assert ok
+    assert compiled(calls) == ["logger_pkg.sv", "sub.sv", "other.sv", "tb_dual.sv"]
+
+    ok, calls = run_build(project, "tb_dual.sv")
+    assert ok
+    assert compiled(calls) == []
+    assert calls == [["vsim", "tb_dual.sv"]]
+
+def test_switching_testbenches_recompiles_shared_top_module(project):
+    # 2つのテストベンチはどちらも top_tb を定義し、同じworkライブラリを使う
+    run_build(project, "tb_dual.sv")
+    ok, calls = run_build(project, "tb_single.sv")
+    assert ok
+    assert compiled(calls) == ["tb_single.sv"]
+    assert calls[-1] == ["vsim", "tb_single.sv"]
+
+    ok, calls = run_build(project, "tb_dual.sv")
+    assert ok
+    assert compiled(calls) == ["tb_dual.sv"]
+    assert calls[-1] == ["vsim", "tb_dual.sv"]
+
+def test_header_change_recompiles_only_including_units(project):
+    part, _, _ = project
+    run_build(project, "tb_dual.sv")
+    with open(part / "common_defs.svh", "a") as f:
+        f.write("// changed\n")
+    _, calls = run_build(project, "tb_dual.sv")
+    assert compiled(calls) == ["sub.sv"]
+
+def test_package_change_recompiles_importers(project):
+    part, _, _ = project
+    run_build(project, "tb_dual.sv")
+    with open(part / "logger_pkg.sv", "a") as f:
+        f.write("// changed\n")
+    _, calls = run_build(project, "tb_dual.sv")
+    assert compiled(calls) == ["logger_pkg.sv", "sub.sv"]
+
+def test_failed_unit_is_compiled_again(project, monkeypatch):
+    part, _, _ = project
+    run_build(project, "tb_dual.sv")
+    with open(part / "other.sv", "a") as f:
+        f.write("// changed\n")
+
+    monkeypatch.setenv("STUB_FAIL", "other.sv")
+    ok, calls = run_build(project, "tb_dual.sv")
+    assert not ok
+    assert compiled(calls) == ["other.sv"]
+    assert not any(tool == "vsim" for tool, _ in calls)
+
+    monkeypatch.delenv("STUB_FAIL")
+    ok, calls = run_build(project, "tb_dual.sv")
+    assert ok
+    assert compiled(calls) == ["other.sv"]
+
+def test_missing_work_library_recompiles_everything(project):
+    part, _, _ = project
+    run_build(project, "tb_dual.sv")
+    for name in os.listdir(part / "work"):
+        os.remove(part / "work" / name)
+    os.rmdir(part / "work")
+    _, calls = run_build(project, "tb_dual.sv")
+    assert len(compiled(calls)) == 4
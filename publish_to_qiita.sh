@@ -81,12 +81,85 @@ publish_file() {
     fi
 }
 
+# Function to publish several files with a single qiita-cli invocation
+# Prints one machine-readable line per file:
+#   PUBLISH_RESULT<TAB>OK|FAIL<TAB><filename>
+publish_batch() {
+    local script_dir="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+    local qiita_docs_dir="$script_dir/QiitaDocs"
+    local files=("$@")
+    
+    # Read file paths from stdin when none are given as arguments
+    if [ ${#files[@]} -eq 0 ]; then
+        while IFS= read -r line; do
+            [ -n "$line" ] && files+=("$line")
+        done
+    fi
+    
+    if [ ${#files[@]} -eq 0 ]; then
+        print_error "No files given for batch publish"
+        return 1
+    fi
+    
+    local basenames=()
+    local filenames=()
+    local failed=0
+    for file in "${files[@]}"; do
+        local filename=$(basename "$file")
+        if [ ! -f "$qiita_docs_dir/public/$filename" ]; then
+            print_error "File not found: $qiita_docs_dir/public/$filename"
+            printf 'PUBLISH_RESULT\tFAIL\t%s\n' "$filename"
+            failed=1
+            continue
+        fi
+        filenames+=("$filename")
+        basenames+=("${filename%.md}")
+    done
+    
+    if [ ${#basenames[@]} -eq 0 ]; then
+        return 1
+    fi
+    
+    print_status "Batch publishing ${#basenames[@]} files to Qiita..."
+    
+    # One npx/qiita-cli start-up for all files
+    local output_file=$(mktemp)
+    (cd "$qiita_docs_dir" && npx qiita publish "${basenames[@]}") 2>&1 | tee "$output_file"
+    local status=${PIPESTATUS[0]}
+    
+    # Report per-file results: everything succeeded when qiita-cli exits 0,
+    # otherwise only files reported as Posted/Updated are treated as published
+    for filename in "${filenames[@]}"; do
+        if [ $status -eq 0 ] || grep -Eq "^(Posted|Updated):.*[/ ]${filename%.md}(\.md)?( |$)" "$output_file"; then
+            printf 'PUBLISH_RESULT\tOK\t%s\n' "$filename"
+        else
+            printf 'PUBLISH_RESULT\tFAIL\t%s\n' "$filename"
+            failed=1
+        fi
+    done
+    rm -f "$output_file"
+    
+    if [ $failed -eq 0 ]; then
+        print_success "Batch publish completed"
+    else
+        print_error "Batch publish completed with failures"
+    fi
+    return $failed
+}
+
 # Main execution
 main() {
     # Get the absolute path to QiitaDocs directory
     local script_dir="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
     local qiita_docs_dir="$script_dir/QiitaDocs"
     
+    # Batch mode - publish the given files (or stdin list) in one invocation
+    if [ "$1" = "--batch" ]; then
+        shift
+        publish_batch "$@"
+        exit $?
+    fi
+    
     # Check if a specific file is provided as argument
     if [ $# -eq 1 ]; then
         # Single file mode - publish only the specified file
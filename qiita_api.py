@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Qiita API v2 クライアント
+
+keep-aliveの接続プールを使ってQiita APIにアクセスします。
+複数スレッドから同時にリクエストでき、レスポンスのRate-Limit系ヘッダを見て
+残り回数がなくなった場合はリセット時刻まで新しいリクエストを待機させます。
+記事の作成（POST）は冪等ではないため、サーバに届いていないことが確実な場合（接続・送信の失敗と429）
+だけリトライし、それ以外のエラーは呼び出し元（アウトボックス）に返します。
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+import logging
+import http.client
+from pathlib import Path
+from urllib.parse import urlsplit
+
+class QiitaApiError(Exception):
+    """Qiita APIのエラー"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+class RequestNotSent(Exception):
+    """リクエストをサーバに送信する前（接続時・送信時）に失敗した"""
+
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+def load_access_token(token_env='QIITA_TOKEN'):
+    """アクセストークンを取得（環境変数、qiita-cliの認証情報ファイルの順）"""
+    token = os.environ.get(token_env)
+    if token:
+        return token
+
+    # qiita-cli（npx qiita login）が保存した認証情報を使用
+    credentials_file = Path.home() / '.config' / 'qiita-cli' / 'credentials.json'
+    try:
+        with open(credentials_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        default_name = data.get('default')
+        for credential in data.get('credentials', []):
+            if credential.get('name') == default_name:
+                return credential.get('accessToken')
+    except Exception:
+        pass
+
+    return None
+
+class QiitaApiClient:
+    """接続プールとレート制限に対応したQiita APIクライアント"""
+
+    # リトライ対象のステータスコード
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    # サーバに届いた後に失敗した場合、処理済みの可能性があるためリトライしないメソッド
+    NON_IDEMPOTENT_METHODS = ('POST',)
+
+    # 冪等でないメソッドでもリトライするステータスコード（リクエストは処理されていない）
+    NOT_PROCESSED_STATUSES = (429,)
+
+    def __init__(self, base_url, token=None, pool_size=4, timeout=60, max_retries=2,
+                 retry_backoff=1.0, rate_limit_reserve=0, max_rate_wait=900):
+        """初期化"""
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"不正なbase_url: {base_url}")
+
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.token = token
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.rate_limit_reserve = rate_limit_reserve
+        self.max_rate_wait = max_rate_wait
+
+        # 空きスロットはNone（必要になった時点で接続する）
+        self.pool = queue.LifoQueue()
+        for _ in range(self.pool_size):
+            self.pool.put(None)
+
+        # レート制限の状態（Rate-Remaining / Rate-Reset ヘッダから更新）
+        self.rate_lock = threading.Lock()
+        self.rate_remaining = None
+        self.rate_reset = None
+        self.blocked_until = None    # この時刻まではどのスレッドもリクエストしない
+        self.probe_deadline = None   # 待機後にヘッダを取り直すリクエストの応答期限
+
+    def new_connection(self):
+        """新しいkeep-alive接続を作成"""
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def wait_for_rate_limit(self):
+        """残りリクエスト数がなければリセット時刻まで待機（待機中は他のスレッドも待たせる）"""
+        while True:
+            with self.rate_lock:
+                if self.blocked_until is None:
+                    if self.rate_remaining is None or self.rate_remaining > self.rate_limit_reserve:
+                        if self.rate_remaining is not None:
+                            # 並列リクエスト分を先に消費しておく
+                            self.rate_remaining -= 1
+                        return
+                    # 新しいレスポンスヘッダで更新されるまで、すべてのスレッドがリセット時刻まで待つ
+                    self.blocked_until = (self.rate_reset or 0) + 1
+
+                now = time.time()
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    # リセット時刻を過ぎたら1つのリクエストでヘッダを取り直し、他のスレッドは更新まで待つ
+                    # （応答がないまま期限を過ぎた場合は別のリクエストで取り直す）
+                    if self.probe_deadline is None or now >= self.probe_deadline:
+                        self.probe_deadline = now + self.timeout
+                        return
+                    wait = min(1.0, self.probe_deadline - now)
+                elif wait > self.max_rate_wait:
+                    raise QiitaApiError(f"レート制限の解除まで{int(wait)}秒かかるため中止します", 429)
+
+            if wait > 1:
+                logging.warning(f"Qiita APIのレート制限に達したため{int(wait)}秒待機します")
+            time.sleep(wait)
+
+    def update_rate_limit(self, headers):
+        """レスポンスヘッダからレート制限の状態を更新"""
+        remaining = headers.get('Rate-Remaining')
+        reset = headers.get('Rate-Reset')
+
+        with self.rate_lock:
+            if remaining is None:
+                # ヘッダのない応答でも、取り直しのリクエストが返れば待機を終える
+                if self.probe_deadline is not None:
+                    self.blocked_until = self.probe_deadline = None
+                return
+            try:
+                self.rate_remaining = int(remaining)
+                self.rate_reset = int(reset) if reset is not None else None
+            except ValueError:
+                return
+            # 新しい残り回数で待機が必要か判断し直す
+            self.blocked_until = self.probe_deadline = None
+
+    def retry_delay(self, attempt, headers):
+        """リトライまでの待機時間（Retry-After、Rate-Reset、指数バックオフの順）"""
+        retry_after = headers.get('Retry-After') if headers else None
+        if retry_after and retry_after.isdigit():
+            return min(int(retry_after), self.max_rate_wait)
+
+        reset = headers.get('Rate-Reset') if headers else None
+        if reset and reset.isdigit():
+            return min(max(0, int(reset) - time.time()) + 1, self.max_rate_wait)
+
+        return self.retry_backoff * (2 ** (attempt - 1))
+
+    def send(self, method, path, body, headers):
+        """プールの接続で1回リクエストを送信（切断済みの接続は張り直す）
+
+        接続・送信に失敗した場合はRequestNotSent、レスポンスの受信中に失敗した場合は元の例外を送出する。
+        """
+        idempotent = method not in self.NON_IDEMPOTENT_METHODS
+        connection = self.pool.get()
+        try:
+            if not idempotent and connection is not None:
+                # 再利用の接続がサーバ側で閉じられていると、送信後の切断で処理済みか判断できないため新しく接続する
+                connection.close()
+                connection = None
+            reused = connection is not None
+
+            for reconnect in (False, True):
+                if connection is None or reconnect:
+                    if connection is not None:
+                        connection.close()
+                    connection = self.new_connection()
+                try:
+                    try:
+                        connection.request(method, self.base_path + path, body=body, headers=headers)
+                    except (OSError, http.client.HTTPException) as e:
+                        raise RequestNotSent(e) from e
+                    response = connection.getresponse()
+                    # 接続を再利用するためレスポンスは必ず最後まで読む
+                    data = response.read()
+                    if response.will_close:
+                        connection.close()
+                        connection = None
+                    return response.status, response.headers, data
+                except (RequestNotSent, http.client.RemoteDisconnected, ConnectionResetError):
+                    # keep-alive接続がサーバ側で閉じられていた場合は1回だけ張り直す
+                    if reconnect or not reused:
+                        raise
+        except Exception:
+            if connection is not None:
+                connection.close()
+            connection = None
+            raise
+        finally:
+            self.pool.put(connection)
+
+    def request(self, method, path, payload=None, extra_headers=None):
+        """APIリクエストを送信して (status, headers, JSONデータ) を返す"""
+        headers = {'Accept': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        if extra_headers:
+            headers.update(extra_headers)
+
+        body = None
+        if payload is not None:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+
+        idempotent = method not in self.NON_IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            attempt += 1
+            self.wait_for_rate_limit()
+            try:
+                status, response_headers, data = self.send(method, path, body, headers)
+            except RequestNotSent as e:
+                # サーバに届いていないためどのメソッドでもリトライできる
+                if attempt > self.max_retries:
+                    raise QiitaApiError(f"{method} {path} 接続エラー: {e}")
+                time.sleep(self.retry_delay(attempt, None))
+                continue
+            except (OSError, http.client.HTTPException) as e:
+                # 送信後の失敗（タイムアウトなど）はサーバで処理済みの可能性がある
+                if not idempotent or attempt > self.max_retries:
+                    raise QiitaApiError(f"{method} {path} 接続エラー: {e}")
+                time.sleep(self.retry_delay(attempt, None))
+                continue
+
+            self.update_rate_limit(response_headers)
+
+            retryable = idempotent or status in self.NOT_PROCESSED_STATUSES
+            if status in self.RETRY_STATUSES and retryable and attempt <= self.max_retries:
+                delay = self.retry_delay(attempt, response_headers)
+                logging.warning(f"Qiita API {method} {path}: ステータス {status} - {delay:.0f}秒後にリトライします")
+                time.sleep(delay)
+                continue
+
+            try:
+                decoded = json.loads(data.decode('utf-8')) if data else None
+            except ValueError:
+                decoded = data.decode('utf-8', errors='replace')
+
+            if status >= 400:
+                message = decoded.get('message') if isinstance(decoded, dict) else decoded
+                raise QiitaApiError(f"{method} {path} ステータス {status}: {message}", status)
+
+            return status, response_headers, decoded
+
+    def close(self):
+        """プールの接続をすべて閉じる（空きスロットは戻すため、その後のリクエストでは接続し直す）"""
+        slots = 0
+        while True:
+            try:
+                connection = self.pool.get_nowait()
+            except queue.Empty:
+                break
+            slots += 1
+            if connection is not None:
+                connection.close()
+        for _ in range(slots):
+            self.pool.put(None)
+
+def create_api_client(http_config):
+    """設定（publish.http節）からAPIクライアントを作成"""
+    return QiitaApiClient(
+        http_config.get('base_url', 'https://qiita.com'),
+        token=load_access_token(http_config.get('token_env', 'QIITA_TOKEN')),
+        pool_size=http_config.get('pool_size', 4),
+        timeout=http_config.get('timeout', 60),
+        max_retries=http_config.get('max_retries', 2),
+        retry_backoff=http_config.get('retry_backoff', 1.0),
+        rate_limit_reserve=http_config.get('rate_limit_reserve', 0),
+        max_rate_wait=http_config.get('max_rate_wait', 900)
+    )
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Qiita記事パーサー
+
+QiitaDocs/publicのファイル（---で囲まれたQiitaヘッダ + 本文）と
+Gitのファイル（# タイトル + 本文）を1回の読み込みで解析します。
+ヘッダの範囲、タイトル、タグ、本文の開始位置と、正規化した本文のハッシュ値を
+行を読みながら計算します。smart_update_qiita.pyとupdate_qiita_articles.pyの
+両方から使用します。
+本文を見出しで区切ったセクションごとのハッシュ木（Merkle木）も同じ読み込みで計算でき、
+2つの木を比較して変更されたセクションだけを求められます。
+"""
+
+import os
+import re
+import hashlib
+
+# Qiitaヘッダに設定するタグ
+DEFAULT_TAGS = ['Verilog', 'FPGA', 'AXI', 'テストベンチ', 'ハードウェア設計']
+
+# ファイルの種類
+KIND_QIITA = 'qiita'
+KIND_GIT = 'git'
+
+class BodyHasher:
+    """本文を1行ずつ受け取り、正規化した本文のMD5を計算する
+
+    本文全体に strip() を適用し、改行コードを統一したうえで
+    （ignore_whitespace の場合）各行の行末空白を削除した文字列のハッシュと
+    同じ値になります。前後の空行を判定するため、空白のみの行と
+    最後の非空白行だけを保留します。
+    """
+
+    def __init__(self, ignore_whitespace=True):
+        """初期化"""
+        self.ignore_whitespace = ignore_whitespace
+        self.md5 = hashlib.md5()
+        self.started = False        # 最初の非空白行を出力済みか
+        self.last_line = None       # 保留中の最後の非空白行
+        self.blank_lines = []       # last_line の後に続く空白のみの行
+
+    def emit(self, line):
+        """正規化済みの1行をハッシュに追加"""
+        if self.ignore_whitespace:
+            line = line.rstrip()
+        if self.started:
+            self.md5.update(b'\n')
+        self.md5.update(line.encode('utf-8'))
+        self.started = True
+
+    def feed(self, line):
+        """1行（改行文字を含まない）を追加"""
+        if not line.strip():
+            # 先頭の空白行は strip() で消えるので無視する
+            if self.last_line is not None:
+                self.blank_lines.append(line)
+            return
+
+        if self.last_line is None:
+            # 本文の先頭は strip() で行頭の空白が削除される
+            line = line.lstrip()
+        else:
+            self.emit(self.last_line)
+            for blank in self.blank_lines:
+                self.emit(blank)
+            self.blank_lines = []
+
+        self.last_line = line
+
+    def hexdigest(self):
+        """ハッシュ値を返す（末尾の空白行は strip() と同様に除外）"""
+        if self.last_line is not None:
+            self.emit(self.last_line.rstrip())
+            self.last_line = None
+            self.blank_lines = []
+        return self.md5.hexdigest()
+
+def hash_article_file(file_path, kind, ignore_whitespace=True):
+    """ファイルの本文のハッシュ値を計算し、読み込む前のstatとあわせて返す（読み込めない場合はNone）
+
+    プロセスプールのワーカーから呼ぶためのモジュール関数です。
+    """
+    try:
+        stat_result = os.stat(file_path)
+        body_hash = parse_article(file_path, kind, ignore_whitespace).body_hash
+    except (OSError, UnicodeDecodeError):
+        return None
+    return stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino, body_hash
+
+def hash_body_text(text, ignore_whitespace=True):
+    """文字列の本文から正規化した本文のハッシュ値を計算"""
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    hasher = BodyHasher(ignore_whitespace)
+    for line in text.split('\n'):
+        hasher.feed(line)
+    return hasher.hexdigest()
+
+# ATX形式の見出し（行頭の空白は3文字まで）とコードフェンス
+HEADING_PATTERN = re.compile(r'^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$')
+FENCE_PATTERN = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+
+class SectionNode:
+    """見出しで区切られた1セクション（見出し行から次の見出しの直前まで）"""
+
+    def __init__(self, title, level):
+        self.title = title
+        self.level = level
+        self.lines = []
+        self.children = []
+
+    def content_hash(self):
+        """前後の空白行を除いたセクション本文のハッシュ値"""
+        lines = self.lines
+        start = 0
+        end = len(lines)
+        while start < end and not lines[start].strip():
+            start += 1
+        while end > start and not lines[end - 1].strip():
+            end -= 1
+        return hashlib.md5('\n'.join(lines[start:end]).encode('utf-8')).hexdigest()
+
+    def to_tree(self):
+        """JSONで保存できる木に変換（hashは本文と子セクションのhashから計算）"""
+        content = self.content_hash()
+        children = []
+        keys = {}
+        for child in self.children:
+            tree = child.to_tree()
+            # 同じ見出しが並ぶ場合は出現順の番号で区別する
+            count = keys.get(tree['title'], 0) + 1
+            keys[tree['title']] = count
+            tree['key'] = tree['title'] if count == 1 else f"{tree['title']} ({count})"
+            children.append(tree)
+
+        merkle = hashlib.md5(content.encode('ascii'))
+        for child in children:
+            merkle.update(child['key'].encode('utf-8'))
+            merkle.update(child['hash'].encode('ascii'))
+
+        return {
+            'title': self.title,
+            'level': self.level,
+            'hash': merkle.hexdigest(),
+            'content': content,
+            'children': children
+        }
+
+class SectionHasher:
+    """本文を1行ずつ受け取り、見出しごとのセクションのハッシュ木を作成する
+
+    コードフェンス内の「#」で始まる行は見出しとして扱いません。
+    見出しより前の本文はルート（level 0）のセクションになります。
+    """
+
+    def __init__(self, ignore_whitespace=True):
+        """初期化"""
+        self.ignore_whitespace = ignore_whitespace
+        self.root = SectionNode('', 0)
+        self.stack = [self.root]
+        self.current = self.root.lines
+        self.fence = None           # 開いているコードフェンスの記号
+
+    def feed(self, line):
+        """1行（改行文字を含まない）を追加"""
+        if self.ignore_whitespace:
+            line = line.rstrip()
+
+        # 見出し・フェンスになり得ない行は正規表現を使わずに追加する
+        first = line[:1]
+        if first == ' ':
+            first = line.lstrip(' ')[:1]
+        if first not in ('#', '`', '~') or not first:
+            self.current.append(line)
+            return
+
+        fence = FENCE_PATTERN.match(line)
+        if self.fence is not None:
+            # 開始と同じ記号で、同じ長さ以上のフェンスで閉じる
+            if fence and fence.group(1)[0] == self.fence[0] and len(fence.group(1)) >= len(self.fence) \
+                    and not line.strip()[len(fence.group(1)):].strip():
+                self.fence = None
+        elif fence:
+            self.fence = fence.group(1)
+        else:
+            heading = HEADING_PATTERN.match(line)
+            if heading:
+                level = len(heading.group(1))
+                while self.stack[-1].level >= level:
+                    self.stack.pop()
+                node = SectionNode((heading.group(2) or '').strip(), level)
+                self.stack[-1].children.append(node)
+                self.stack.append(node)
+                self.current = node.lines
+
+        self.current.append(line)
+
+    def tree(self):
+        """セクションのハッシュ木を返す"""
+        return self.root.to_tree()
+
+def diff_section_trees(old_tree, new_tree, path=None):
+    """2つのセクション木を比較し、変更のあったセクションを返す
+
+    hashが一致する部分木はたどらないため、変更されたセクション数に比例する
+    時間で比較できます。戻り値は (種類, 見出しのパス) のリストで、
+    種類は 'changed'（本文の変更）、'added'、'removed' のいずれかです。
+    """
+    path = path or []
+    if old_tree['hash'] == new_tree['hash']:
+        return []
+
+    changes = []
+    if old_tree['content'] != new_tree['content']:
+        changes.append(('changed', path))
+
+    old_children = {child['key']: child for child in old_tree['children']}
+    new_keys = set()
+    for child in new_tree['children']:
+        new_keys.add(child['key'])
+        old_child = old_children.get(child['key'])
+        if old_child is None:
+            changes.append(('added', path + [child['key']]))
+        else:
+            changes.extend(diff_section_trees(old_child, child, path + [child['key']]))
+
+    for child in old_tree['children']:
+        if child['key'] not in new_keys:
+            changes.append(('removed', path + [child['key']]))
+
+    return changes
+
+def summarize_section_changes(changes, limit=5):
+    """セクションの変更を1行の要約にする（例: ~ 3. 設計 > 3.2 タイミング, + 4. 追記）"""
+    if not changes:
+        return "セクションの変更なし（見出し構成・本文とも同一）"
+
+    marks = {'changed': '~', 'added': '+', 'removed': '-'}
+    items = [f"{marks[kind]} {' > '.join(path) if path else '（見出し前の本文）'}" for kind, path in changes]
+    summary = ', '.join(items[:limit])
+    if len(items) > limit:
+        summary += f" ほか{len(items) - limit}件"
+    return summary
+
+class ParsedArticle:
+    """記事ファイルの解析結果"""
+
+    def __init__(self, path, kind):
+        self.path = path
+        self.kind = kind
+        self.header_lines = []      # Qiitaヘッダ（最初の---から2つ目の---まで）
+        self.header_span = None     # Qiitaヘッダの文字オフセット範囲 (開始, 終了)
+        self.title = None
+        self.item_id = None         # Qiitaヘッダのid（未投稿の記事はNone）
+        self.title_line = None      # タイトル行の行番号（Gitファイル）
+        self.tags = []
+        self.body_line = 0          # 本文の開始行
+        self.body_offset = 0        # 本文の開始文字オフセット
+        self.body_hash = None
+        self.sections = None        # sections 指定時のみセクションのハッシュ木を保持
+        self.lines = None           # keep_text 指定時のみ全行を保持
+
+    @property
+    def header(self):
+        """Qiitaヘッダの文字列"""
+        if not self.header_span:
+            return None
+        return '\n'.join(self.header_lines)
+
+    def body_text(self):
+        """本文（ヘッダ・タイトル行より後）を返す（keep_text 指定時のみ）"""
+        return '\n'.join(self.lines[self.body_line:])
+
+    def text_without_title(self):
+        """タイトル行だけを削除した全文を返す（keep_text 指定時のみ）"""
+        if self.title_line is None:
+            return '\n'.join(self.lines)
+        return '\n'.join(self.lines[:self.title_line] + self.lines[self.title_line + 1:])
+
+def parse_header_line(article, line, state):
+    """Qiitaヘッダの1行からtitle、id、tagsを取得"""
+    stripped = line.strip()
+    if stripped.startswith('id:'):
+        item_id = stripped[len('id:'):].strip().strip('\'"')
+        article.item_id = item_id if item_id and item_id not in ('null', '~') else None
+        state['in_tags'] = False
+    elif stripped.startswith('title:'):
+        article.title = stripped[len('title:'):].strip()
+        state['in_tags'] = False
+    elif stripped.startswith('tags:'):
+        state['in_tags'] = True
+    elif state.get('in_tags') and stripped.startswith('- '):
+        article.tags.append(stripped[2:].strip())
+    else:
+        state['in_tags'] = False
+
+class BodyFeeder:
+    """本文の行を本文ハッシュとセクションのハッシュ木の両方に渡す"""
+
+    def __init__(self, hasher, section_hasher):
+        self.hasher = hasher
+        self.section_hasher = section_hasher
+
+    def feed(self, line):
+        self.hasher.feed(line)
+        if self.section_hasher is not None:
+            self.section_hasher.feed(line)
+
+def parse_article(file_path, kind, ignore_whitespace=True, keep_text=False, header_only=False,
+                  sections=False):
+    """記事ファイルを1回の読み込みで解析する
+
+    kind: KIND_QIITA（---で囲まれたヘッダの後が本文）または
+          KIND_GIT（最初の「# 」行がタイトルで、その後が本文）
+    header_only: Qiitaヘッダを読み終えた時点で読み込みを終了する
+    sections: 本文のセクションごとのハッシュ木も計算する
+    """
+    article = ParsedArticle(file_path, kind)
+    body_hasher = BodyHasher(ignore_whitespace)
+    section_hasher = SectionHasher(ignore_whitespace) if sections else None
+    hasher = body_hasher if section_hasher is None else BodyFeeder(body_hasher, section_hasher)
+    lines = [] if keep_text else None
+
+    # 本文の開始位置が確定するまでの行（見つからない場合は全体が本文になる）
+    pending = []
+    in_body = False
+    delimiter_count = 0
+    header_state = {}
+    offset = 0
+    line_no = 0
+    last_line = ''
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for raw_line in f:
+            line = raw_line[:-1] if raw_line.endswith('\n') else raw_line
+            last_line = raw_line
+            if lines is not None:
+                lines.append(line)
+
+            if in_body:
+                hasher.feed(line)
+            elif kind == KIND_QIITA:
+                pending.append(line)
+                if line.strip() == '---':
+                    delimiter_count += 1
+                    if delimiter_count == 1:
+                        article.header_span = (offset, None)
+                    article.header_lines.append(line)
+                    if delimiter_count == 2:
+                        article.header_span = (article.header_span[0], offset + len(line))
+                        article.body_line = line_no + 1
+                        article.body_offset = offset + len(raw_line)
+                        in_body = True
+                        pending = []
+                        if header_only:
+                            break
+                elif delimiter_count == 1:
+                    article.header_lines.append(line)
+                    parse_header_line(article, line, header_state)
+            else:
+                pending.append(line)
+                if line.strip().startswith('# '):
+                    article.title = line.strip()[2:].strip()
+                    article.title_line = line_no
+                    article.body_line = line_no + 1
+                    article.body_offset = offset + len(raw_line)
+                    in_body = True
+                    pending = []
+
+            offset += len(raw_line)
+            line_no += 1
+
+    # split('\n') と同様に、改行で終わるファイルは末尾に空行を1つ持つ
+    if last_line.endswith('\n') or last_line == '':
+        if lines is not None:
+            lines.append('')
+        if in_body:
+            hasher.feed('')
+        else:
+            pending.append('')
+
+    if not in_body:
+        # 本文の開始位置が見つからない場合はファイル全体を本文とする
+        if kind == KIND_QIITA and delimiter_count < 2:
+            article.header_lines = []
+            article.header_span = None
+            article.title = None
+            article.tags = []
+        for line in pending:
+            hasher.feed(line)
+
+    article.lines = lines
+    if not (header_only and in_body):
+        article.body_hash = body_hasher.hexdigest()
+        if section_hasher is not None:
+            article.sections = section_hasher.tree()
+    return article
+
+def rewrite_qiita_header(header_lines, title, tags=None):
+    """Qiitaヘッダのtitleとtagsを更新した文字列を返す"""
+    if tags is None:
+        tags = DEFAULT_TAGS
+    tag_lines = ['tags:'] + [f'  - {tag}' for tag in tags]
+
+    new_lines = []
+    title_updated = False
+    tags_updated = False
+    in_tags_section = False
+
+    for line in header_lines:
+        stripped = line.strip()
+        if stripped == '---':
+            new_lines.append(line)
+        elif stripped.startswith('title:'):
+            new_lines.append(f'title: {title}')
+            title_updated = True
+        elif stripped.startswith('tags:'):
+            # tagsセクションを置き換え
+            new_lines.extend(tag_lines)
+            tags_updated = True
+            in_tags_section = True
+        elif in_tags_section and stripped.startswith('- '):
+            # 既存のタグ行はスキップ
+            continue
+        else:
+            # tagsセクション終了（次のフィールド開始）
+            in_tags_section = False
+            new_lines.append(line)
+
+    # titleがない場合は---の直後に追加
+    if not title_updated:
+        for i, line in enumerate(new_lines):
+            if line.strip() == '---':
+                new_lines.insert(i + 1, f'title: {title}')
+                break
+
+    # tagsがない場合はtitleの後に追加
+    if not tags_updated:
+        for i, line in enumerate(new_lines):
+            if line.strip().startswith('title:'):
+                new_lines[i + 1:i + 1] = tag_lines
+                break
+
+    return '\n'.join(new_lines)
+
+def rewrite_front_matter_title(header_lines, title):
+    """フロントマターのtitleのみを更新した文字列を返す（tagsなど他の項目はそのまま）"""
+    new_lines = list(header_lines)
+    for i, line in enumerate(new_lines):
+        if line.strip().startswith('title:'):
+            new_lines[i] = f'title: {title}'
+            return '\n'.join(new_lines)
+
+    # titleがない場合は---の直後に追加
+    new_lines.insert(1, f'title: {title}')
+    return '\n'.join(new_lines)
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Qiita記事バックアップストア
+
+Qiitaファイルのバックアップを内容のハッシュ値（SHA-256）をキーとして保存します。
+同じ内容は1回だけ書き込み、記事ごとのリビジョン一覧をindex.jsonに記録します。
+保持するリビジョン数や合計サイズの上限に応じて古いリビジョンを削除します。
+
+各記事の最新リビジョンだけを全体（zlib圧縮）で保存し、それより古いリビジョンは
+1つ新しいリビジョンからの逆差分（行単位）として保存します。
+keyframe_interval個ごとのリビジョンは全体のまま残すため、どのリビジョンも
+最大 keyframe_interval - 1 回の差分適用で復元できます。
+
+使用方法:
+    python3 qiita_backup_store.py list [記事ファイル名]
+    python3 qiita_backup_store.py restore 記事ファイル名 [--revision N] [--output パス]
+    python3 qiita_backup_store.py backup ファイル...
+    python3 qiita_backup_store.py count [--since YYYYmmdd_HHMMSS]
+    python3 qiita_backup_store.py gc
+"""
+
+import os
+import sys
+import json
+import zlib
+import difflib
+import hashlib
+import tempfile
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+# オブジェクトの種類
+OBJECT_FULL = 'full'
+OBJECT_DELTA = 'delta'
+
+def make_delta(base_data, target_data):
+    """base_dataからtarget_dataを復元する行単位の差分を作成"""
+    base_lines = base_data.decode('utf-8', errors='surrogateescape').splitlines(keepends=True)
+    target_lines = target_data.decode('utf-8', errors='surrogateescape').splitlines(keepends=True)
+
+    # ['c', 開始, 終了] はベースの行をコピー、['i', [行...]] は行を挿入
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(['c', i1, i2])
+        elif tag in ('replace', 'insert'):
+            ops.append(['i', target_lines[j1:j2]])
+    return ops
+
+def apply_delta(base_data, ops):
+    """差分をベースに適用して内容を復元"""
+    base_lines = base_data.decode('utf-8', errors='surrogateescape').splitlines(keepends=True)
+    parts = []
+    for op in ops:
+        if op[0] == 'c':
+            parts.extend(base_lines[op[1]:op[2]])
+        else:
+            parts.extend(op[1])
+    return ''.join(parts).encode('utf-8', errors='surrogateescape')
+
+class BackupStore:
+    # index.jsonの形式が変わったら番号を上げる
+    VERSION = 2
+
+    def __init__(self, backup_dir, keep_last=0, max_total_bytes=0, keyframe_interval=10):
+        """keep_last: 記事ごとに保持するリビジョン数（0で無制限）
+        max_total_bytes: 保存データの合計サイズの上限（0で無制限）
+        keyframe_interval: 全体で保存するリビジョンの間隔（1で差分を使わない）"""
+        self.backup_dir = Path(backup_dir)
+        self.objects_dir = self.backup_dir / 'objects'
+        self.index_file = self.backup_dir / 'index.json'
+        self.keep_last = keep_last
+        self.max_total_bytes = max_total_bytes
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.index = {'version': self.VERSION, 'articles': {}, 'objects': {}}
+        self.load_index()
+
+    def load_index(self):
+        """index.jsonを読み込む（バージョン1の形式は変換する）"""
+        if not self.index_file.exists():
+            return
+        with open(self.index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+
+        if index.get('version') == 1:
+            # バージョン1は全オブジェクトが無圧縮の全体保存
+            for obj in index.get('objects', {}).values():
+                obj.update({'type': OBJECT_FULL, 'codec': 'raw', 'stored': obj['size']})
+            index['version'] = self.VERSION
+        elif index.get('version') != self.VERSION:
+            raise ValueError(f"未対応のバックアップインデックス形式です: {self.index_file}")
+        self.index = index
+
+    def save_index(self):
+        """index.jsonをアトミックに書き込む"""
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.index_', suffix='.tmp', dir=str(self.backup_dir))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f, ensure_ascii=False, indent=1, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.index_file)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def object_path(self, content_hash):
+        """ハッシュ値に対応するオブジェクトファイルのパス"""
+        return self.objects_dir / content_hash[:2] / content_hash
+
+    def store_object(self, content_hash, payload, entry):
+        """オブジェクトファイルをアトミックに書き込み、インデックスに登録"""
+        path = self.object_path(content_hash)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.obj_', dir=str(path.parent))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        entry['stored'] = len(payload)
+        self.index['objects'][content_hash] = entry
+
+    def write_full(self, content_hash, data):
+        """内容全体をzlib圧縮して保存"""
+        self.store_object(content_hash, zlib.compress(data, 6),
+                          {'type': OBJECT_FULL, 'codec': 'zlib', 'size': len(data)})
+
+    def write_delta(self, content_hash, data, base_hash, base_data):
+        """base_hashからの逆差分として保存"""
+        ops = make_delta(base_data, data)
+        payload = zlib.compress(json.dumps(ops, ensure_ascii=False).encode('utf-8', errors='surrogateescape'), 6)
+        self.store_object(content_hash, payload,
+                          {'type': OBJECT_DELTA, 'codec': 'zlib', 'size': len(data), 'base': base_hash})
+
+    def read_payload(self, content_hash):
+        """オブジェクトファイルを読み込み、圧縮を解除"""
+        with open(self.object_path(content_hash), 'rb') as f:
+            payload = f.read()
+        if self.index['objects'][content_hash].get('codec') == 'zlib':
+            payload = zlib.decompress(payload)
+        return payload
+
+    def read_object(self, content_hash):
+        """オブジェクトの内容を復元（全体保存のオブジェクトまで差分をたどる）"""
+        chain = []
+        current = content_hash
+        while self.index['objects'][current].get('type') == OBJECT_DELTA:
+            chain.append(current)
+            current = self.index['objects'][current]['base']
+            if len(chain) > len(self.index['objects']):
+                raise ValueError(f"差分の参照が循環しています: {content_hash}")
+
+        data = self.read_payload(current)
+        for delta_hash in reversed(chain):
+            ops = json.loads(self.read_payload(delta_hash).decode('utf-8', errors='surrogateescape'))
+            data = apply_delta(data, ops)
+        return data
+
+    def revisions(self, article):
+        """記事のリビジョン一覧（古い順）"""
+        return self.index['articles'].get(article, [])
+
+    def add(self, file_path):
+        """ファイルをバックアップしてリビジョンを返す（直前と同じ内容なら追加しない）"""
+        file_path = Path(file_path)
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        content_hash = hashlib.sha256(data).hexdigest()
+
+        revisions = self.index['articles'].setdefault(file_path.name, [])
+        if revisions and revisions[-1]['hash'] == content_hash:
+            return revisions[-1], False
+
+        # 最新リビジョンは常に全体で保存する（差分として保存済みの内容に戻った場合も書き直す）
+        existing = self.index['objects'].get(content_hash)
+        created = existing is None or not self.object_path(content_hash).exists()
+        if created or existing.get('type') != OBJECT_FULL:
+            self.write_full(content_hash, data)
+
+        # 直前の最新リビジョンを新しい内容からの逆差分に置き換える
+        if revisions:
+            self.demote_to_delta(revisions, content_hash, data)
+
+        revision = {
+            'hash': content_hash,
+            'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S'),
+            'size': len(data)
+        }
+        revisions.append(revision)
+
+        self.evict()
+        self.save_index()
+        return revision, created
+
+    def demote_to_delta(self, revisions, base_hash, base_data):
+        """直前の最新リビジョンを逆差分にする（キーフレームにあたる場合は全体のまま残す）"""
+        previous_hash = revisions[-1]['hash']
+        previous = self.index['objects'].get(previous_hash)
+        if previous is None or previous.get('type') != OBJECT_FULL:
+            return
+
+        # 直前のリビジョンより古い側に差分が続いている数を数える
+        chain = 0
+        for revision in reversed(revisions[:-1]):
+            entry = self.index['objects'].get(revision['hash'])
+            if entry is None or entry.get('type') != OBJECT_DELTA:
+                break
+            chain += 1
+
+        # キーフレーム（全体のまま残すリビジョン）はオブジェクトの種類で判断するため、リビジョンには記録しない
+        if chain + 1 >= self.keyframe_interval:
+            return
+
+        # 他の記事の最新リビジョンとして参照されている内容は全体のまま残す
+        for article_revisions in self.index['articles'].values():
+            if article_revisions is not revisions and article_revisions and article_revisions[-1]['hash'] == previous_hash:
+                return
+
+        previous_data = self.read_object(previous_hash)
+        self.write_delta(previous_hash, previous_data, base_hash, base_data)
+
+    def restore(self, article, revision=-1, output=None):
+        """リビジョンの内容をファイルに書き戻す（revisionは負数で新しい方から）"""
+        revisions = self.revisions(article)
+        if not revisions:
+            raise KeyError(f"バックアップがありません: {article}")
+
+        entry = revisions[revision]
+        data = self.read_object(entry['hash'])
+        if hashlib.sha256(data).hexdigest() != entry['hash']:
+            raise ValueError(f"バックアップが破損しています: {entry['hash']}")
+
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'wb') as f:
+            f.write(data)
+        return entry
+
+    def total_bytes(self):
+        """保存データ（ディスク上のオブジェクト）の合計サイズ"""
+        return sum(obj['stored'] for obj in self.index['objects'].values())
+
+    def revision_count(self, since=None):
+        """全記事のリビジョン数（sinceを指定するとその時刻以降のリビジョンのみ）"""
+        return sum(
+            1
+            for revisions in self.index['articles'].values()
+            for revision in revisions
+            if since is None or revision['timestamp'] >= since
+        )
+
+    def evict(self):
+        """保持ポリシーに従って古いリビジョンを削除
+
+        逆差分は新しいリビジョンを参照するため、古い方から削除しても
+        残りのリビジョンは復元できます。"""
+        removed = 0
+
+        # 記事ごとに新しいkeep_last個のリビジョンを残す
+        if self.keep_last > 0:
+            for revisions in self.index['articles'].values():
+                excess = len(revisions) - self.keep_last
+                if excess > 0:
+                    del revisions[:excess]
+                    removed += excess
+
+        # 合計サイズが上限を超える間、全体で最も古いリビジョンから削除
+        # （各記事の最新リビジョンは削除しない）
+        if self.max_total_bytes > 0:
+            self.collect_garbage()
+            while self.total_bytes() > self.max_total_bytes:
+                candidates = [
+                    (revisions[0]['timestamp'], article)
+                    for article, revisions in self.index['articles'].items()
+                    if len(revisions) > 1
+                ]
+                if not candidates:
+                    break
+                _, article = min(candidates)
+                del self.index['articles'][article][0]
+                removed += 1
+                self.collect_garbage()
+
+        if removed:
+            self.collect_garbage()
+        return removed
+
+    def collect_garbage(self):
+        """どのリビジョンからも（差分のベースとしても）参照されていないオブジェクトを削除"""
+        referenced = set()
+        for revisions in self.index['articles'].values():
+            for revision in revisions:
+                content_hash = revision['hash']
+                while content_hash is not None and content_hash not in referenced:
+                    referenced.add(content_hash)
+                    content_hash = self.index['objects'].get(content_hash, {}).get('base')
+
+        removed = 0
+        for content_hash in list(self.index['objects']):
+            if content_hash not in referenced:
+                path = self.object_path(content_hash)
+                if path.exists():
+                    path.unlink()
+                del self.index['objects'][content_hash]
+                removed += 1
+        return removed
+
+def load_update_config(config_file):
+    """設定ファイルのupdate節を読み込む"""
+    if not os.path.exists(config_file):
+        return {}
+    import yaml
+    with open(config_file, 'r', encoding='utf-8') as f:
+        return (yaml.safe_load(f) or {}).get('update', {}) or {}
+
+def create_backup_store(update_config, backup_dir=None):
+    """設定（update節）からバックアップストアを作成"""
+    max_total_mb = update_config.get('backup_max_total_mb', 0)
+    return BackupStore(
+        backup_dir or update_config.get('backup_dir', 'QiitaDocs/backup'),
+        keep_last=update_config.get('backup_keep_last', 0),
+        max_total_bytes=int(max_total_mb * 1024 * 1024),
+        keyframe_interval=update_config.get('backup_keyframe_interval', 10)
+    )
+
+def main():
+    """コマンドライン処理"""
+    parser = argparse.ArgumentParser(description='Qiita記事バックアップストア')
+    parser.add_argument('--config', default='qiita_update_config.yaml', help='設定ファイル（update節の保持ポリシーを使用）')
+    parser.add_argument('--backup-dir', help='バックアップディレクトリ（デフォルト: 設定ファイルのupdate.backup_dir）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help='リビジョン一覧を表示')
+    list_parser.add_argument('article', nargs='?', help='記事ファイル名（例: part01_pipeline_principles.md）')
+
+    restore_parser = subparsers.add_parser('restore', help='リビジョンを復元')
+    restore_parser.add_argument('article', help='記事ファイル名')
+    restore_parser.add_argument('--revision', type=int, default=-1, help='リビジョン番号（負数は新しい方から、デフォルト: -1 = 最新）')
+    restore_parser.add_argument('--output', help='出力先（デフォルト: QiitaDocs/public/記事ファイル名）')
+
+    backup_parser = subparsers.add_parser('backup', help='ファイルをバックアップ')
+    backup_parser.add_argument('files', nargs='+', help='バックアップするファイル')
+
+    count_parser = subparsers.add_parser('count', help='リビジョン数を表示')
+    count_parser.add_argument('--since', help='この時刻（YYYYmmdd_HHMMSS）以降に作成されたリビジョンのみ数える')
+    subparsers.add_parser('gc', help='参照されていないオブジェクトを削除')
+
+    args = parser.parse_args()
+    store = create_backup_store(load_update_config(args.config), args.backup_dir)
+
+    if args.command == 'list':
+        articles = [args.article] if args.article else sorted(store.index['articles'])
+        for article in articles:
+            print(article)
+            for number, revision in enumerate(store.revisions(article)):
+                entry = store.index['objects'].get(revision['hash'], {})
+                stored = f"{entry.get('type', '?')} {entry.get('stored', 0)} bytes"
+                print(f"  [{number}] {revision['timestamp']}  {revision['size']:>8} bytes  {revision['hash'][:12]}  ({stored})")
+        print(f"合計: {store.revision_count()}リビジョン, {store.total_bytes()} bytes")
+
+    elif args.command == 'restore':
+        output = args.output or str(Path('QiitaDocs/public') / args.article)
+        try:
+            entry = store.restore(args.article, args.revision, output)
+        except (KeyError, IndexError, ValueError, OSError) as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
+        print(f"復元完了: {args.article} ({entry['timestamp']}) -> {output}")
+
+    elif args.command == 'backup':
+        for file_path in args.files:
+            if not os.path.isfile(file_path):
+                continue
+            revision, created = store.add(file_path)
+            status = "新規" if created else "既存の内容を参照"
+            print(f"バックアップ作成: {Path(file_path).name} ({revision['timestamp']}, {status})")
+
+    elif args.command == 'count':
+        print(store.revision_count(args.since))
+
+    elif args.command == 'gc':
+        removed = store.collect_garbage()
+        store.save_index()
+        print(f"{removed}個のオブジェクトを削除しました")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Smart Qiita Update 設定ファイルのキャッシュ
+
+YAMLの設定ファイルをデフォルト設定とマージした結果を、設定ファイルと同じディレクトリの
+JSONファイル（.<設定ファイル名>.cache.json）に保存します。設定ファイルのmtime・サイズと
+デフォルト設定が前回と同じ場合はYAMLを読まずに（PyYAMLをimportせずに）キャッシュを使います。
+必要なパッケージの確認も、別のプロセスを起動せずにここで行います。
+"""
+
+import os
+import json
+import time
+import hashlib
+import importlib.util
+
+# 起動時に確認するパッケージ（モジュール名: パッケージ名）
+REQUIRED_MODULES = {'yaml': 'PyYAML'}
+
+def missing_dependencies():
+    """インストールされていないパッケージ名のリスト（importはしない）"""
+    return [package for module, package in REQUIRED_MODULES.items()
+            if importlib.util.find_spec(module) is None]
+
+def config_digest(config):
+    """デフォルト設定のハッシュ値（デフォルト設定が変わったらキャッシュを無効にする）"""
+    return hashlib.md5(json.dumps(config, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+class ConfigCache:
+    """マージ済みの設定のキャッシュ"""
+
+    VERSION = 1
+
+    # 直近に更新された設定ファイルはmtimeの分解能の問題で変更を見逃す可能性があるため
+    # キャッシュに保存しない（秒）
+    RACY_WINDOW = 2.0
+
+    def __init__(self, config_file):
+        """初期化"""
+        self.config_file = config_file
+        directory, name = os.path.split(os.path.abspath(config_file))
+        self.cache_file = os.path.join(directory, f".{name}.cache.json")
+
+    def lookup(self, defaults_key):
+        """設定ファイルとデフォルト設定が変わっていなければマージ済みの設定を返す"""
+        try:
+            stat_result = os.stat(self.config_file)
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if (data.get('version') != self.VERSION
+                or data.get('defaults') != defaults_key
+                or data.get('mtime_ns') != stat_result.st_mtime_ns
+                or data.get('size') != stat_result.st_size):
+            return None
+        return data.get('config')
+
+    def store(self, defaults_key, config):
+        """マージ済みの設定を保存（書き込めない場合は何もしない）"""
+        try:
+            stat_result = os.stat(self.config_file)
+            if time.time() - stat_result.st_mtime < self.RACY_WINDOW:
+                return False
+
+            # 循環importを避けるためここでimportする
+            from qiita_sync_manifest import write_json_atomic
+            write_json_atomic(self.cache_file, {
+                'version': self.VERSION,
+                'defaults': defaults_key,
+                'mtime_ns': stat_result.st_mtime_ns,
+                'size': stat_result.st_size,
+                'config': config
+            }, '.config_')
+        except (OSError, TypeError, ValueError):
+            # 設定ファイルのディレクトリに書き込めない場合や、JSONにできない値がある場合
+            return False
+        return True
+
+    def clear(self):
+        """キャッシュファイルを削除"""
+        if os.path.exists(self.cache_file):
+            os.remove(self.cache_file)
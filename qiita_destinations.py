@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Smart Qiita Update 出力先（destinations）
+
+同じGitファイル（part*.md、rule*.md）を複数の出力先（Qiita、ローカルの静的ドキュメントサイトなど）に
+同期するための設定の展開と、出力先の間で共有するソース記事のキャッシュです。
+各出力先は共通設定に出力先ごとの設定を重ねた設定で動作し、マニフェストやpublish記録などの
+状態ファイルは出力先ごとに分かれます。Gitファイルの解析・正規化・ハッシュ計算は
+1回の実行につき1回だけ行い、その結果をすべての出力先で使います。
+"""
+
+import os
+import copy
+import threading
+
+# 出力先のヘッダの形式
+HEADER_QIITA = 'qiita'                  # Qiitaのフロントマター（titleとtagsを更新）
+HEADER_FRONT_MATTER = 'front_matter'    # 一般的なフロントマター（titleのみ更新、なければ作成）
+HEADER_NONE = 'none'                    # ヘッダなし（Gitファイルをタイトル行を含めてそのまま出力）
+HEADER_STYLES = (HEADER_QIITA, HEADER_FRONT_MATTER, HEADER_NONE)
+
+# 出力先ごとに分ける状態ファイル（設定の節, キー）
+STATE_FILES = (
+    ('cache', 'manifest_file'),
+    ('cache', 'publish_cache_file'),
+    ('cache', 'outbox_file'),
+    ('cache', 'remote_mirror_file'),
+    ('cache', 'rewrite_journal_file'),
+    ('metrics', 'file')
+)
+
+# 出力先ごとに分けるディレクトリ（設定の節, キー）
+STATE_DIRS = (
+    ('update', 'backup_dir'),
+)
+
+def merge_config(default, user):
+    """設定をマージする（userの値で上書き）"""
+    for key, value in user.items():
+        if key in default and isinstance(default[key], dict) and isinstance(value, dict):
+            merge_config(default[key], value)
+        else:
+            default[key] = value
+
+def suffixed_path(path, name):
+    """状態ファイルのパスに出力先名を付ける（.smart_qiita_manifest.json -> .smart_qiita_manifest.NAME.json）"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{name}{ext}"
+
+def destination_configs(config):
+    """destinationsの各出力先の設定（共通設定に出力先の設定を重ねたもの）を返す
+
+    出力先の設定のうち name、dir、header 以外は共通設定と同じ形式で上書きできる。
+    状態ファイルとバックアップディレクトリは、出力先で明示的に指定しない限り出力先名を付けて分ける。
+    """
+    base = {key: value for key, value in config.items() if key != 'destinations'}
+    names = set()
+    configs = []
+
+    for index, destination in enumerate(config.get('destinations') or []):
+        name = str(destination.get('name') or f"dest{index + 1}")
+        if name in names:
+            raise ValueError(f"出力先の名前が重複しています: {name}")
+        names.add(name)
+
+        header = destination.get('header', HEADER_QIITA)
+        if header not in HEADER_STYLES:
+            raise ValueError(f"不明なヘッダ形式です（{name}）: {header}")
+
+        overrides = {key: value for key, value in destination.items() if key not in ('name', 'dir', 'header')}
+        dest_config = copy.deepcopy(base)
+        merge_config(dest_config, copy.deepcopy(overrides))
+        if destination.get('dir'):
+            dest_config.setdefault('directories', {})['qiita_dir'] = destination['dir']
+        dest_config.setdefault('update', {})['header'] = header
+        dest_config['name'] = name
+
+        for section, key in STATE_FILES:
+            value = dest_config.get(section, {}).get(key)
+            if value and key not in (overrides.get(section) or {}):
+                dest_config[section][key] = suffixed_path(value, name)
+
+        for section, key in STATE_DIRS:
+            value = dest_config.get(section, {}).get(key)
+            if value and key not in (overrides.get(section) or {}):
+                dest_config[section][key] = os.path.join(value, name)
+
+        configs.append(dest_config)
+
+    return configs
+
+class SourceCache:
+    """1回の実行の間、Gitファイルの解析結果を出力先の間で共有する"""
+
+    def __init__(self):
+        """初期化"""
+        self.values = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """次の実行のためにキャッシュを空にする"""
+        with self.lock:
+            self.values = {}
+            self.hits = 0
+            self.misses = 0
+
+    def contains(self, kind, path):
+        """kindとパスの値が保存済みか（統計には数えない）"""
+        with self.lock:
+            return (kind, os.fspath(path)) in self.values
+
+    def get(self, kind, path, compute):
+        """kind（hash、article、sectionsなど）とパスごとに1回だけcomputeを呼ぶ（Noneは保存しない）"""
+        key = (kind, os.fspath(path))
+        with self.lock:
+            if key in self.values:
+                self.hits += 1
+                return self.values[key]
+            self.misses += 1
+
+        value = compute()
+        if value is not None:
+            with self.lock:
+                self.values[key] = value
+        return value
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Smart Qiita Update Git変更検出
+
+前回同期したコミットからHEADまでの差分と、ワーキングツリーの状態（git status）から
+変更された可能性のあるファイルを求めます。Gitが使えない場合や履歴を
+たどれない場合はNoneを返し、呼び出し側で全ファイルの比較に切り替えます。
+"""
+
+import os
+import logging
+import subprocess
+from pathlib import Path
+
+class GitChangeDetector:
+    """Gitの履歴とワーキングツリーから変更ファイルを求める"""
+
+    def __init__(self, repo_dir='.', timeout=30):
+        """初期化"""
+        self.repo_dir = Path(repo_dir)
+        self.timeout = timeout
+        self.toplevel = None
+
+    def git(self, *args):
+        """gitコマンドを実行して標準出力を返す（失敗時はNone）"""
+        try:
+            result = subprocess.run(
+                ['git', *args],
+                cwd=self.repo_dir,
+                capture_output=True,
+                timeout=self.timeout
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.debug(f"gitコマンドの実行に失敗しました: {e}")
+            return None
+
+        if result.returncode != 0:
+            stderr = result.stderr.decode('utf-8', errors='replace').strip()
+            logging.debug(f"git {' '.join(args)} が失敗しました: {stderr}")
+            return None
+
+        return result.stdout
+
+    def head_commit(self):
+        """HEADのコミットIDを返す（Gitリポジトリでない場合はNone）"""
+        output = self.git('rev-parse', '--show-toplevel', 'HEAD')
+        if output is None:
+            return None
+
+        lines = output.decode('utf-8', errors='replace').splitlines()
+        if len(lines) != 2:
+            return None
+
+        self.toplevel = Path(lines[0])
+        return lines[1]
+
+    def pathspecs(self, directories):
+        """ディレクトリをリポジトリルートからのパス指定に変換"""
+        specs = []
+        for directory in directories:
+            try:
+                relative = Path(directory).resolve().relative_to(self.toplevel.resolve())
+            except ValueError:
+                # リポジトリ外のディレクトリはGitで追跡できない
+                return None
+            specs.append(str(relative) if str(relative) != '.' else ':/')
+        return specs
+
+    def changed_paths(self, since_commit, directories):
+        """since_commit以降に変更されたファイルの絶対パスの集合を返す
+
+        コミット間の差分、ステージ済み・未ステージの変更、未追跡ファイルを含みます。
+        履歴をたどれない場合（コミットが存在しない、リポジトリ外など）はNoneを返します。
+        """
+        if self.toplevel is None and self.head_commit() is None:
+            return None
+
+        specs = self.pathspecs(directories)
+        if specs is None:
+            return None
+
+        diff = self.git('diff', '--name-only', '-z', '--no-renames', since_commit, 'HEAD', '--', *specs)
+        if diff is None:
+            return None
+
+        status = self.git('status', '--porcelain', '-z', '--untracked-files=all', '--', *specs)
+        if status is None:
+            return None
+
+        names = [name for name in diff.split(b'\0') if name]
+
+        # statusの各エントリは「XY パス」、リネーム・コピーは直後に元のパスが続く
+        entries = status.split(b'\0')
+        i = 0
+        while i < len(entries):
+            entry = entries[i]
+            i += 1
+            if len(entry) < 4:
+                continue
+            names.append(entry[3:])
+            if entry[0:1] in (b'R', b'C') and i < len(entries):
+                names.append(entries[i])
+                i += 1
+
+        return {self.toplevel / os.fsdecode(name) for name in names}
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Smart Qiita Update ログ設定
+
+ログの出力先（サイズでローテーションするログファイルとコンソール）を設定します。
+use_queue が有効な場合、ロガーはQueueHandlerでレコードをキューに入れるだけにして、
+ファイルとコンソールへの書き込みはQueueListenerのスレッドで行います。
+format: json の場合、ログファイルには1行1レコードのJSON（ファイル、ステージ、
+所要時間、結果のフィールドを含む）を出力します。
+publishスクリプトの出力は、ジョブごとのファイルに分けて保存できます。
+"""
+
+import os
+import re
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+from datetime import datetime
+
+# 構造化ログのフィールド（logging.info(..., extra=log_fields(...)) で指定する）
+LOG_FIELDS = ('file', 'stage', 'duration', 'outcome')
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+def log_fields(file=None, stage=None, duration=None, outcome=None):
+    """構造化ログのフィールドをextraに渡す辞書にする"""
+    fields = {
+        'file': os.path.basename(os.fspath(file)) if file is not None else None,
+        'stage': stage,
+        'duration': round(duration, 6) if duration is not None else None,
+        'outcome': outcome
+    }
+    return {name: value for name, value in fields.items() if value is not None}
+
+class JsonLinesFormatter(logging.Formatter):
+    """1レコードを1行のJSONに変換する"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'message': record.getMessage()
+        }
+        for name in LOG_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+def create_handlers(log_config):
+    """ログファイルとコンソールのハンドラーを作成"""
+    handlers = []
+    text_formatter = logging.Formatter(TEXT_FORMAT)
+
+    if log_config.get('file'):
+        max_bytes = log_config.get('max_bytes', 10 * 1024 * 1024)
+        if max_bytes:
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_config['file'],
+                maxBytes=max_bytes,
+                backupCount=log_config.get('backup_count', 5),
+                encoding='utf-8'
+            )
+        else:
+            file_handler = logging.FileHandler(log_config['file'], encoding='utf-8')
+        if log_config.get('format', 'text') == 'json':
+            file_handler.setFormatter(JsonLinesFormatter())
+        else:
+            file_handler.setFormatter(text_formatter)
+        handlers.append(file_handler)
+
+    if log_config.get('console_output', True):
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(text_formatter)
+        handlers.append(console_handler)
+
+    return handlers
+
+def setup_logging(log_config):
+    """ルートロガーにハンドラーを設定し、QueueListener（use_queue無効時はNone）を返す"""
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, log_config.get('level', 'INFO').upper()))
+    handlers = create_handlers(log_config)
+
+    if not handlers or not log_config.get('use_queue', True):
+        for handler in handlers:
+            root.addHandler(handler)
+        return None
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # 終了時にキューに残ったレコードを書き出す
+    atexit.register(listener.stop)
+    return listener
+
+class PublishOutputLog:
+    """publishスクリプトの出力をジョブごとのファイルに保存する"""
+
+    def __init__(self, output_dir, keep=100):
+        """初期化（keep: 保持するファイル数、0で無制限）"""
+        self.output_dir = output_dir
+        self.keep = keep
+
+    def write(self, label, stdout, stderr):
+        """出力を1つのファイルに書き込み、そのパスを返す"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = re.sub(r'[^\w.-]+', '_', os.path.basename(os.fspath(label)))
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        path = os.path.join(self.output_dir, f"{timestamp}_{name}.log")
+        with open(path, 'w', encoding='utf-8') as f:
+            if stdout:
+                f.write("=== stdout ===\n")
+                f.write(stdout)
+                if not stdout.endswith('\n'):
+                    f.write('\n')
+            if stderr:
+                f.write("=== stderr ===\n")
+                f.write(stderr)
+                if not stderr.endswith('\n'):
+                    f.write('\n')
+        self.prune()
+        return path
+
+    def prune(self):
+        """古い出力ファイルを削除"""
+        if not self.keep:
+            return
+        files = sorted(name for name in os.listdir(self.output_dir) if name.endswith('.log'))
+        for name in files[:-self.keep]:
+            try:
+                os.remove(os.path.join(self.output_dir, name))
+            except OSError:
+                pass
+
+def create_publish_output_log(log_config):
+    """設定からpublish出力の保存先を作成（未設定時はNone）"""
+    output_dir = log_config.get('publish_output_dir')
+    if not output_dir:
+        return None
+    return PublishOutputLog(output_dir, keep=log_config.get('publish_output_keep', 100))
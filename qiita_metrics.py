@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Smart Qiita Update 計測
+
+同期処理のステージ（検索、変更検出、バックアップ、書き換え、publish）ごとの所要時間と
+ファイルごとの所要時間、処理件数、読み書きしたバイト数を集計し、
+実行の最後にJSONのメトリクスファイルとして書き出します。
+--profile 指定時はcProfileとtracemallocの結果もあわせて保存します。
+"""
+
+import os
+import io
+import time
+import threading
+import logging
+from datetime import datetime
+from contextlib import contextmanager
+
+from qiita_sync_manifest import write_json_atomic
+
+# メトリクスに出力するカウンタ
+COUNTERS = (
+    'files_scanned',
+    'files_compared',
+    'files_changed',
+    'files_updated',
+    'files_published',
+    'publish_skipped',
+    'publish_failed',
+    'bytes_read',
+    'bytes_written'
+)
+
+class SyncMetrics:
+    """1回の同期処理の計測結果"""
+
+    VERSION = 1
+
+    def __init__(self):
+        """初期化"""
+        self.lock = threading.Lock()
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.files = {}
+        self.counters = {name: 0 for name in COUNTERS}
+        self.changes = {}
+        self.profile = None
+
+    @contextmanager
+    def stage(self, name, file_path=None):
+        """ステージの所要時間を計測（同じステージは合計、file_path指定時はファイル別にも記録）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            self.record_stage(name, duration)
+            if file_path is not None:
+                self.record_file(name, file_path, duration)
+
+    @contextmanager
+    def timer(self, name, file_path):
+        """ファイル別の所要時間のみを計測（並列処理中のファイル単位の計測用）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_file(name, file_path, time.perf_counter() - started)
+
+    def record_stage(self, name, duration):
+        """ステージの所要時間を登録"""
+        with self.lock:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            stage['seconds'] += duration
+            stage['calls'] += 1
+
+    def record_file(self, name, file_path, duration):
+        """ファイル別の所要時間を登録"""
+        with self.lock:
+            timings = self.files.setdefault(os.path.basename(file_path), {})
+            timings[name] = timings.get(name, 0.0) + duration
+
+    def file_duration(self, name, file_path):
+        """ファイル別の所要時間（未計測の場合はNone）"""
+        with self.lock:
+            return self.files.get(os.path.basename(file_path), {}).get(name)
+
+    def record_changes(self, file_path, changes, summary):
+        """変更されたセクションと要約を登録"""
+        with self.lock:
+            self.changes[os.path.basename(file_path)] = {
+                'summary': summary,
+                'sections': [{'change': kind, 'path': path} for kind, path in changes]
+            }
+
+    def count(self, name, value=1):
+        """カウンタを加算"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        """JSONに出力する内容を作成"""
+        with self.lock:
+            data = {
+                'version': self.VERSION,
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'total_seconds': round(time.perf_counter() - self.started, 6),
+                'counters': dict(self.counters),
+                'stages': {
+                    name: {'seconds': round(stage['seconds'], 6), 'calls': stage['calls']}
+                    for name, stage in self.stages.items()
+                },
+                'files': {
+                    name: {stage: round(seconds, 6) for stage, seconds in timings.items()}
+                    for name, timings in sorted(self.files.items())
+                },
+                'changes': dict(sorted(self.changes.items()))
+            }
+        if self.profile is not None:
+            data['profile'] = self.profile
+        return data
+
+    def write(self, metrics_file):
+        """メトリクスをJSONファイルにアトミックに書き込む"""
+        try:
+            # ステージは実行順のまま出力する
+            write_json_atomic(metrics_file, self.to_dict(), '.metrics_', sort_keys=False)
+        except Exception as e:
+            logging.error(f"メトリクス書き込みエラー: {e}")
+            return False
+        return True
+
+    def summary(self):
+        """ログ出力用のステージ別所要時間"""
+        with self.lock:
+            return ', '.join(f"{name} {stage['seconds']:.3f}秒" for name, stage in self.stages.items())
+
+class Profiler:
+    """cProfileとtracemallocによるプロファイル取得"""
+
+    def __init__(self, output_dir, top=20):
+        """初期化"""
+        self.output_dir = output_dir
+        self.top = top
+        # --profile 指定時以外は読み込まないよう、ここでimportする
+        import cProfile
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        """プロファイルを開始"""
+        import tracemalloc
+        tracemalloc.start()
+        self.profiler.enable()
+
+    def stop(self):
+        """プロファイルを終了し、結果の概要を返す"""
+        import pstats
+        import tracemalloc
+        self.profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        profile_file = os.path.join(self.output_dir, f"smart_qiita_{timestamp}.prof")
+        # snakevizやpython -m pstatsで詳細を確認できる
+        self.profiler.dump_stats(profile_file)
+
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(self.top)
+
+        allocations = [
+            {'location': str(stat.traceback), 'bytes': stat.size, 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:self.top]
+        ]
+
+        return {
+            'profile_file': profile_file,
+            'memory_current_bytes': current,
+            'memory_peak_bytes': peak,
+            'top_functions': stream.getvalue().splitlines(),
+            'top_allocations': allocations
+        }
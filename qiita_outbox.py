@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Smart Qiita Update publish送信待ちキュー（アウトボックス）
+
+Qiitaファイルを書き換える前にpublish待ちのジョブをディスクに記録し、
+publishに成功した時点で削除します。publishが失敗・タイムアウトした場合や
+処理が中断した場合もジョブが残るため、次回の実行（または--watchモード）で
+指数バックオフを挟んで再実行されます。
+statusコマンドで、記事を走査せずに滞留しているジョブを確認できます。
+
+使用例:
+    python3 qiita_outbox.py status
+    python3 qiita_outbox.py retry part01_pipeline_principles.md
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import logging
+from datetime import datetime
+
+from qiita_sync_manifest import write_json_atomic
+
+class PublishOutbox:
+    """publish待ちジョブの永続キュー"""
+
+    VERSION = 1
+
+    def __init__(self, outbox_file, backoff=60.0, backoff_max=3600.0):
+        """初期化"""
+        self.outbox_file = outbox_file
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.jobs = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        """アウトボックスファイルを読み込む"""
+        if not os.path.exists(self.outbox_file):
+            return
+        try:
+            with open(self.outbox_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            # ジョブを失わないよう、読めないファイルは上書きせずに残す
+            logging.error(f"アウトボックス読み込みエラー: {e}")
+            raise
+
+        if data.get('version') != self.VERSION:
+            raise ValueError(f"未対応のアウトボックス形式です: {data.get('version')}")
+
+        self.jobs = data.get('jobs', {})
+
+    def save(self):
+        """アウトボックスをアトミックに書き込む"""
+        if not self.dirty:
+            return True
+
+        with self.lock:
+            data = {'version': self.VERSION, 'jobs': dict(self.jobs)}
+        try:
+            write_json_atomic(self.outbox_file, data, '.outbox_')
+        except Exception as e:
+            logging.error(f"アウトボックス書き込みエラー: {e}")
+            return False
+
+        self.dirty = False
+        return True
+
+    def enqueue(self, article, path):
+        """publish待ちのジョブを追加（既存のジョブは新しい内容として即時実行に戻す）"""
+        now = time.time()
+        with self.lock:
+            job = self.jobs.get(article)
+            self.jobs[article] = {
+                'path': os.fspath(path),
+                'enqueued_at': job['enqueued_at'] if job else now,
+                'attempts': job['attempts'] if job else 0,
+                'last_error': job.get('last_error') if job else None,
+                'last_attempt_at': job.get('last_attempt_at') if job else None,
+                'next_attempt_at': now
+            }
+            self.dirty = True
+
+    def complete(self, article):
+        """publishに成功したジョブを削除"""
+        with self.lock:
+            if self.jobs.pop(article, None) is not None:
+                self.dirty = True
+
+    def fail(self, article, error):
+        """publishに失敗したジョブにエラーと次回の実行時刻を記録"""
+        now = time.time()
+        with self.lock:
+            job = self.jobs.get(article)
+            if job is None:
+                return
+            job['attempts'] += 1
+            job['last_error'] = error
+            job['last_attempt_at'] = now
+            delay = min(self.backoff * (2 ** (job['attempts'] - 1)), self.backoff_max)
+            job['next_attempt_at'] = now + delay
+            self.dirty = True
+
+    def retry_now(self, article):
+        """バックオフを解除して次回すぐに実行する"""
+        with self.lock:
+            job = self.jobs.get(article)
+            if job is None:
+                return False
+            job['next_attempt_at'] = time.time()
+            self.dirty = True
+            return True
+
+    def due_jobs(self, now=None):
+        """実行時刻を過ぎたジョブを (記事名, ジョブ) のリストで返す"""
+        now = time.time() if now is None else now
+        with self.lock:
+            return sorted(
+                (article, dict(job)) for article, job in self.jobs.items()
+                if job['next_attempt_at'] <= now
+            )
+
+    def seconds_until_due(self, now=None):
+        """次のジョブの実行時刻までの秒数（ジョブがなければNone）"""
+        now = time.time() if now is None else now
+        with self.lock:
+            if not self.jobs:
+                return None
+            return max(0.0, min(job['next_attempt_at'] for job in self.jobs.values()) - now)
+
+def load_outbox_config(config_file):
+    """設定ファイルからアウトボックスの設定を読み込む"""
+    config = {}
+    if os.path.exists(config_file):
+        import yaml
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+    publish_config = config.get('publish', {}) or {}
+    cache_config = config.get('cache', {}) or {}
+    return {
+        'outbox_file': cache_config.get('outbox_file', 'QiitaDocs/.smart_qiita_outbox.json'),
+        'backoff': publish_config.get('outbox_backoff', 60.0),
+        'backoff_max': publish_config.get('outbox_backoff_max', 3600.0),
+        'stuck_attempts': publish_config.get('outbox_stuck_attempts', 3)
+    }
+
+def create_outbox(outbox_config):
+    """設定からアウトボックスを作成して読み込む"""
+    outbox = PublishOutbox(
+        outbox_config['outbox_file'],
+        backoff=outbox_config['backoff'],
+        backoff_max=outbox_config['backoff_max']
+    )
+    outbox.load()
+    return outbox
+
+def format_time(timestamp):
+    """表示用の時刻"""
+    if not timestamp:
+        return '-'
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+def main():
+    """コマンドライン処理"""
+    parser = argparse.ArgumentParser(description='publish送信待ちキュー（アウトボックス）')
+    parser.add_argument('--config', default='qiita_update_config.yaml', help='設定ファイル')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    status_parser = subparsers.add_parser('status', help='publish待ちのジョブを表示')
+    status_parser.add_argument('--stuck', action='store_true', help='滞留しているジョブのみ表示')
+
+    retry_parser = subparsers.add_parser('retry', help='バックオフを解除して次回すぐに再実行する')
+    retry_parser.add_argument('articles', nargs='*', help='記事ファイル名（省略時は全ジョブ）')
+
+    drop_parser = subparsers.add_parser('drop', help='ジョブを削除（publishしない）')
+    drop_parser.add_argument('articles', nargs='+', help='記事ファイル名')
+
+    args = parser.parse_args()
+    outbox_config = load_outbox_config(args.config)
+    try:
+        outbox = create_outbox(outbox_config)
+    except (OSError, ValueError) as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+
+    if args.command == 'status':
+        stuck_attempts = outbox_config['stuck_attempts']
+        stuck_count = 0
+        for article, job in sorted(outbox.jobs.items()):
+            stuck = job['attempts'] >= stuck_attempts
+            stuck_count += stuck
+            if args.stuck and not stuck:
+                continue
+            mark = '滞留' if stuck else '待機'
+            print(f"[{mark}] {article}  試行 {job['attempts']}回  "
+                  f"登録 {format_time(job['enqueued_at'])}  次回 {format_time(job['next_attempt_at'])}")
+            if job.get('last_error'):
+                print(f"       最後のエラー: {job['last_error']}")
+        print(f"合計: {len(outbox.jobs)}件（滞留 {stuck_count}件、{stuck_attempts}回以上失敗したジョブ）")
+        if stuck_count:
+            sys.exit(2)
+
+    elif args.command == 'retry':
+        articles = args.articles or sorted(outbox.jobs)
+        for article in articles:
+            if outbox.retry_now(article):
+                print(f"再実行を予約しました: {article}")
+            else:
+                print(f"ジョブがありません: {article}")
+        outbox.save()
+
+    elif args.command == 'drop':
+        for article in args.articles:
+            if article in outbox.jobs:
+                outbox.complete(article)
+                print(f"ジョブを削除しました: {article}")
+            else:
+                print(f"ジョブがありません: {article}")
+        outbox.save()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Smart Qiita Update Publishステージ
+
+publishスクリプト（publish_to_qiita.sh）をasyncioのサブプロセスとして
+並列に実行します。同時実行数の上限、トークンバケットによるレート制限、
+ファイルごとの指数バックオフ付きリトライに対応しています。
+バッチモードでは、全ファイルを1回のスクリプト呼び出し（--batch）でpublishします。
+HTTPモードでは、スクリプトを使わずQiita APIに直接リクエストします。
+"""
+
+import re
+import time
+import asyncio
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from qiita_api import QiitaApiError, create_api_client
+from qiita_article_parser import KIND_QIITA, parse_article
+from qiita_logging import log_fields
+
+class TokenBucket:
+    """トークンバケット方式のレート制限"""
+
+    def __init__(self, rate, burst=1):
+        """rate: 1秒あたりに補充されるトークン数（0以下で無制限）"""
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = None
+
+    def refill(self):
+        """経過時間分のトークンを補充"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """トークンを1つ取得（不足している場合は補充されるまで待機）"""
+        if self.rate <= 0:
+            return
+
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+
+        # ロックを保持したまま待機し、取得順序を保証する
+        async with self.lock:
+            self.refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= 1
+
+class PublishResult:
+    """1ファイル分のpublish結果"""
+
+    def __init__(self, qiita_file, success, attempts, stdout='', stderr='', error=None, duration=0.0):
+        self.qiita_file = qiita_file
+        self.success = success
+        self.attempts = attempts
+        self.stdout = stdout
+        self.stderr = stderr
+        self.error = error
+        self.duration = duration    # リトライ待ちを含む処理時間（秒）
+
+def log_script_output(output_log, label, stdout, stderr):
+    """publishスクリプトの出力をログに記録（output_log指定時はジョブごとのファイルに保存）"""
+    if not stdout and not stderr:
+        return
+
+    if output_log is not None:
+        try:
+            path = output_log.write(label, stdout, stderr)
+            logging.info(f"Publish実行出力: {path}", extra=log_fields(stage='publish'))
+            return
+        except OSError as e:
+            logging.warning(f"publish出力の保存に失敗しました: {e}")
+
+    if stdout:
+        logging.info(f"Publish実行出力: {stdout.strip()}")
+    if stderr:
+        logging.warning(f"Publish実行警告: {stderr.strip()}")
+
+class AsyncPublishStage:
+    """publishスクリプトを並列実行するステージ"""
+
+    def __init__(self, script_path, cwd=None, concurrency=4, rate_limit=0, rate_burst=1,
+                 max_retries=2, retry_backoff=2.0, retry_backoff_max=60.0, timeout=300, output_log=None):
+        """初期化（output_log: スクリプトの出力を保存するPublishOutputLog）"""
+        self.script_path = Path(script_path)
+        self.cwd = str(cwd) if cwd is not None else str(self.script_path.parent)
+        self.concurrency = max(1, concurrency)
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.timeout = timeout
+        self.output_log = output_log
+
+    def backoff_delay(self, attempt):
+        """attempt回目の失敗後の待機時間（指数バックオフ）"""
+        return min(self.retry_backoff_max, self.retry_backoff * (2 ** (attempt - 1)))
+
+    async def run_script(self, qiita_file):
+        """publishスクリプトを1回実行"""
+        process = await asyncio.create_subprocess_exec(
+            str(self.script_path), str(qiita_file),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=self.cwd
+        )
+
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+
+        return (process.returncode,
+                stdout.decode('utf-8', errors='replace'),
+                stderr.decode('utf-8', errors='replace'))
+
+    async def publish_one(self, qiita_file, semaphore, bucket):
+        """1ファイルをpublish（失敗時はバックオフしてリトライ）"""
+        attempt = 0
+        stdout = stderr = ''
+        error = None
+        started = time.monotonic()
+
+        while attempt <= self.max_retries:
+            attempt += 1
+            await bucket.acquire()
+
+            async with semaphore:
+                try:
+                    returncode, stdout, stderr = await self.run_script(qiita_file)
+                    error = None if returncode == 0 else f"終了コード {returncode}"
+                except asyncio.TimeoutError:
+                    error = f"タイムアウト（{self.timeout}秒）"
+                except Exception as e:
+                    error = str(e)
+
+            # 実行結果のログ出力
+            log_script_output(self.output_log, qiita_file, stdout, stderr)
+
+            if error is None:
+                duration = time.monotonic() - started
+                logging.info(f"Publish成功: {qiita_file}", extra=log_fields(qiita_file, 'publish', duration, 'success'))
+                return PublishResult(qiita_file, True, attempt, stdout, stderr, duration=duration)
+
+            if attempt <= self.max_retries:
+                delay = self.backoff_delay(attempt)
+                logging.warning(f"Publish失敗（{attempt}回目）: {qiita_file}, {error} - {delay}秒後にリトライします")
+                await asyncio.sleep(delay)
+
+        duration = time.monotonic() - started
+        # 出力をファイルに保存している場合はエラー出力をログに含めない
+        detail = stderr.strip() if self.output_log is None else ''
+        logging.error(f"Publish失敗: {qiita_file}, エラー: {error} {detail}".rstrip(),
+                      extra=log_fields(qiita_file, 'publish', duration, 'failure'))
+        return PublishResult(qiita_file, False, attempt, stdout, stderr, error, duration=duration)
+
+    async def publish_all(self, qiita_files):
+        """全ファイルを並列にpublish"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        bucket = TokenBucket(self.rate_limit, self.rate_burst)
+
+        tasks = [self.publish_one(qiita_file, semaphore, bucket) for qiita_file in qiita_files]
+        return await asyncio.gather(*tasks)
+
+    def run(self, qiita_files):
+        """publishを実行して、入力と同じ順序で結果を返す"""
+        if not qiita_files:
+            return []
+
+        if not self.script_path.exists():
+            logging.warning(f"publishスクリプトが見つかりません: {self.script_path}")
+            return [PublishResult(qiita_file, False, 0, error='script not found') for qiita_file in qiita_files]
+
+        return asyncio.run(self.publish_all(qiita_files))
+
+class BatchPublishStage:
+    """全ファイルを1回のpublishスクリプト呼び出しでpublishするステージ"""
+
+    # publishスクリプトが出力するファイルごとの結果行の接頭辞
+    RESULT_PREFIX = 'PUBLISH_RESULT'
+
+    def __init__(self, script_path, cwd=None, timeout=900, fallback_stage=None, output_log=None):
+        """fallback_stage: バッチで失敗したファイルを個別に再publishするステージ"""
+        self.script_path = Path(script_path)
+        self.cwd = str(cwd) if cwd is not None else str(self.script_path.parent)
+        self.timeout = timeout
+        self.fallback_stage = fallback_stage
+        self.output_log = output_log
+
+    async def run_batch(self, qiita_files):
+        """publishスクリプトを--batchで1回実行（ファイル一覧は標準入力で渡す）"""
+        process = await asyncio.create_subprocess_exec(
+            str(self.script_path), '--batch',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=self.cwd
+        )
+
+        file_list = ''.join(f"{qiita_file}\n" for qiita_file in qiita_files)
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(file_list.encode('utf-8')), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+
+        return (process.returncode,
+                stdout.decode('utf-8', errors='replace'),
+                stderr.decode('utf-8', errors='replace'))
+
+    def parse_results(self, stdout):
+        """結果行をファイル名ごとの成否に変換"""
+        results = {}
+        for line in stdout.splitlines():
+            fields = line.rstrip('\r').split('\t')
+            if len(fields) == 3 and fields[0] == self.RESULT_PREFIX:
+                results[fields[2]] = fields[1] == 'OK'
+        return results
+
+    def run(self, qiita_files):
+        """バッチpublishを実行して、入力と同じ順序で結果を返す"""
+        if not qiita_files:
+            return []
+
+        if not self.script_path.exists():
+            logging.warning(f"publishスクリプトが見つかりません: {self.script_path}")
+            return [PublishResult(qiita_file, False, 0, error='script not found') for qiita_file in qiita_files]
+
+        logging.info(f"バッチPublish開始: {len(qiita_files)}個のファイル")
+        stdout = stderr = ''
+        error = None
+        started = time.monotonic()
+        try:
+            returncode, stdout, stderr = asyncio.run(self.run_batch(qiita_files))
+            if returncode != 0:
+                error = f"終了コード {returncode}"
+        except asyncio.TimeoutError:
+            error = f"タイムアウト（{self.timeout}秒）"
+        except Exception as e:
+            error = str(e)
+
+        # 実行結果のログ出力
+        log_script_output(self.output_log, 'batch', stdout, stderr)
+
+        # 1回の呼び出しにかかった時間を各ファイルに均等に割り当てる
+        share = (time.monotonic() - started) / len(qiita_files)
+
+        status = self.parse_results(stdout)
+        results = []
+        failed_files = []
+        for qiita_file in qiita_files:
+            if status.get(Path(qiita_file).name, False):
+                logging.info(f"Publish成功: {qiita_file}", extra=log_fields(qiita_file, 'publish', share, 'success'))
+                results.append(PublishResult(qiita_file, True, 1, stdout, stderr, duration=share))
+            else:
+                file_error = error or '結果が報告されませんでした'
+                results.append(PublishResult(qiita_file, False, 1, stdout, stderr, file_error, share))
+                failed_files.append(qiita_file)
+
+        if not failed_files:
+            return results
+
+        if self.fallback_stage is None:
+            for qiita_file in failed_files:
+                logging.error(f"Publish失敗: {qiita_file}, エラー: {error or '結果が報告されませんでした'}",
+                              extra=log_fields(qiita_file, 'publish', share, 'failure'))
+            return results
+
+        # 失敗したファイルのみ個別publishでリトライ
+        logging.warning(f"バッチPublishで失敗した{len(failed_files)}個のファイルを個別にリトライします")
+        retried = {result.qiita_file: result for result in self.fallback_stage.run(failed_files)}
+        for i, result in enumerate(results):
+            if result.qiita_file in retried:
+                retry_result = retried[result.qiita_file]
+                retry_result.attempts += 1
+                retry_result.duration += result.duration
+                results[i] = retry_result
+
+        return results
+
+class HttpPublishStage:
+    """Qiita API（items）に直接PATCH/POSTするステージ"""
+
+    def __init__(self, client, workers=None):
+        """client: QiitaApiClient（接続プールのサイズ分だけ同時にリクエストする）"""
+        self.client = client
+        self.workers = workers or client.pool_size
+
+    def read_article(self, qiita_file):
+        """Qiitaファイルからフロントマターと本文を読み込む"""
+        article = parse_article(qiita_file, KIND_QIITA, keep_text=True)
+        if article.header is None:
+            raise ValueError("Qiitaヘッダが見つかりません")
+
+        front_matter = yaml.safe_load('\n'.join(article.header_lines[1:-1])) or {}
+        return front_matter, article.body_text()
+
+    def build_payload(self, front_matter, body):
+        """APIに送信するアイテムのJSONを作成"""
+        payload = {
+            'title': front_matter.get('title') or '',
+            'body': body,
+            'tags': [{'name': str(tag), 'versions': []} for tag in front_matter.get('tags') or []],
+            'private': bool(front_matter.get('private', False))
+        }
+        if front_matter.get('organization_url_name'):
+            payload['organization_url_name'] = front_matter['organization_url_name']
+        if front_matter.get('slide') is not None:
+            payload['slide'] = bool(front_matter['slide'])
+        return payload
+
+    def write_back(self, qiita_file, item):
+        """APIが返したidとupdated_atをフロントマターに書き戻す（qiita-cliと同じ動作）"""
+        with open(qiita_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        header_end = content.find('\n---', content.find('---') + 3)
+        if header_end == -1:
+            return
+
+        header = content[:header_end]
+        for key in ('id', 'updated_at'):
+            if item.get(key):
+                value = item[key] if key == 'id' else f"'{item[key]}'"
+                header, count = re.subn(rf'^{key}:.*$', f'{key}: {value}', header, count=1, flags=re.MULTILINE)
+                if count == 0:
+                    header += f'\n{key}: {value}'
+
+        with open(qiita_file, 'w', encoding='utf-8') as f:
+            f.write(header + content[header_end:])
+
+    def publish_file(self, qiita_file):
+        """1ファイルをpublish"""
+        started = time.monotonic()
+        try:
+            front_matter, body = self.read_article(qiita_file)
+            if front_matter.get('ignorePublish'):
+                logging.info(f"ignorePublishのためスキップ: {qiita_file}")
+                return PublishResult(qiita_file, True, 0, duration=time.monotonic() - started)
+
+            payload = self.build_payload(front_matter, body)
+            item_id = front_matter.get('id')
+            if item_id:
+                _, _, item = self.client.request('PATCH', f'/api/v2/items/{item_id}', payload)
+            else:
+                _, _, item = self.client.request('POST', '/api/v2/items', payload)
+                logging.info(f"新規記事を作成しました: {qiita_file} -> {item.get('id')}")
+
+            self.write_back(qiita_file, item or {})
+            duration = time.monotonic() - started
+            logging.info(f"Publish成功: {qiita_file}", extra=log_fields(qiita_file, 'publish', duration, 'success'))
+            return PublishResult(qiita_file, True, 1, duration=duration)
+
+        except (QiitaApiError, OSError, ValueError, yaml.YAMLError) as e:
+            duration = time.monotonic() - started
+            logging.error(f"Publish失敗: {qiita_file}, エラー: {e}", extra=log_fields(qiita_file, 'publish', duration, 'failure'))
+            return PublishResult(qiita_file, False, 1, error=str(e), duration=duration)
+
+    def run(self, qiita_files):
+        """HTTP publishを実行して、入力と同じ順序で結果を返す"""
+        if not qiita_files:
+            return []
+
+        if not self.client.token:
+            logging.error("Qiitaのアクセストークンが見つかりません")
+            return [PublishResult(qiita_file, False, 0, error='no access token') for qiita_file in qiita_files]
+
+        # プールの接続数だけリクエストを同時に送信する
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(qiita_files))) as executor:
+                return list(executor.map(self.publish_file, qiita_files))
+        finally:
+            self.client.close()
+
+def create_http_publish_stage(http_config):
+    """設定からHTTP publishステージを作成"""
+    return HttpPublishStage(create_api_client(http_config))
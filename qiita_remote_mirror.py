@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Smart Qiita Update リモート状態ミラー
+
+Qiitaに実際に公開されている記事の情報（タイトル、updated_at、正規化した本文のハッシュ値）を
+認証ユーザーの記事一覧（GET /api/v2/authenticated_user/items）のページ単位の取得でまとめて集め、
+ローカルのJSONファイルにキャッシュします。ページごとにETagを保存して条件付きリクエストを送り、
+変更のないページ（304）は前回の内容を再利用します。取得した記事もupdated_atが前回と同じなら
+本文のハッシュ計算を省略します。
+
+使用例:
+    python3 qiita_remote_mirror.py refresh
+    python3 qiita_remote_mirror.py list
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+from qiita_api import QiitaApiError, create_api_client
+from qiita_article_parser import hash_body_text
+from qiita_sync_manifest import write_json_atomic
+
+class RemoteMirror:
+    """Qiitaの記事一覧のローカルミラー"""
+
+    VERSION = 1
+
+    # Qiita APIのper_pageの上限とページ数の上限
+    MAX_PER_PAGE = 100
+    MAX_PAGES = 100
+
+    def __init__(self, mirror_file, client=None, per_page=100, ignore_whitespace=True):
+        """初期化"""
+        self.mirror_file = mirror_file
+        self.client = client
+        self.per_page = max(1, min(per_page, self.MAX_PER_PAGE))
+        self.ignore_whitespace = ignore_whitespace
+        self.items = {}
+        self.pages = {}
+        self.fetched_at = None
+        self.dirty = False
+
+    def settings_key(self):
+        """本文のハッシュ値に影響する設定"""
+        return json.dumps({'ignore_whitespace': self.ignore_whitespace, 'per_page': self.per_page},
+                          sort_keys=True)
+
+    def load(self):
+        """ミラーファイルを読み込む"""
+        if not os.path.exists(self.mirror_file):
+            return
+        try:
+            with open(self.mirror_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logging.warning(f"リモートミラー読み込みエラー（再取得します）: {e}")
+            return
+
+        if data.get('version') != self.VERSION or data.get('settings') != self.settings_key():
+            self.dirty = True
+            return
+
+        self.items = data.get('items', {})
+        self.pages = data.get('pages', {})
+        self.fetched_at = data.get('fetched_at')
+
+    def save(self):
+        """ミラーをアトミックに書き込む"""
+        if not self.dirty:
+            return True
+
+        data = {
+            'version': self.VERSION,
+            'settings': self.settings_key(),
+            'fetched_at': self.fetched_at,
+            'pages': self.pages,
+            'items': self.items
+        }
+        try:
+            write_json_atomic(self.mirror_file, data, '.remote_')
+        except Exception as e:
+            logging.error(f"リモートミラー書き込みエラー: {e}")
+            return False
+
+        self.dirty = False
+        return True
+
+    def mirror_item(self, item):
+        """APIの記事データをミラーのエントリに変換（updated_atが同じなら前回の値を再利用）"""
+        previous = self.items.get(item['id'])
+        if previous is not None and previous.get('updated_at') == item.get('updated_at'):
+            return previous, False
+
+        return {
+            'title': item.get('title'),
+            'updated_at': item.get('updated_at'),
+            'private': item.get('private', False),
+            'tags': [tag.get('name') for tag in item.get('tags', [])],
+            'body_hash': hash_body_text(item.get('body') or '', self.ignore_whitespace)
+        }, True
+
+    def refresh(self):
+        """記事一覧をページ単位で取得してミラーを更新し、(取得ページ数, 304ページ数, 更新記事数) を返す"""
+        if self.client is None:
+            raise QiitaApiError("APIクライアントが設定されていません")
+
+        pages = {}
+        items = {}
+        fetched = not_modified = updated = 0
+
+        for page in range(1, self.MAX_PAGES + 1):
+            previous_page = self.pages.get(str(page))
+            headers = {}
+            if previous_page and previous_page.get('etag'):
+                headers['If-None-Match'] = previous_page['etag']
+
+            status, response_headers, data = self.client.request(
+                'GET', f'/api/v2/authenticated_user/items?page={page}&per_page={self.per_page}',
+                extra_headers=headers
+            )
+
+            if status == 304 and previous_page:
+                # 前回と同じページ（記事のupdated_atも変わっていない）
+                not_modified += 1
+                ids = previous_page['ids']
+                for item_id in ids:
+                    if item_id in self.items:
+                        items[item_id] = self.items[item_id]
+            else:
+                fetched += 1
+                ids = []
+                for item in data or []:
+                    entry, changed = self.mirror_item(item)
+                    items[item['id']] = entry
+                    ids.append(item['id'])
+                    updated += changed
+
+            pages[str(page)] = {'etag': response_headers.get('ETag'), 'ids': ids}
+            if status == 304 and response_headers.get('ETag') is None:
+                pages[str(page)]['etag'] = previous_page['etag']
+
+            # 最終ページ（件数がper_page未満、またはTotal-Countに達した）で終了
+            total_count = response_headers.get('Total-Count')
+            if len(ids) < self.per_page:
+                break
+            if total_count is not None and total_count.isdigit() and page * self.per_page >= int(total_count):
+                break
+
+        removed = len(set(self.items) - set(items))
+        if removed:
+            logging.info(f"リモートで削除された記事: {removed}件")
+
+        self.items = items
+        self.pages = pages
+        self.fetched_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.dirty = True
+
+        logging.info(f"リモートミラー更新: {len(items)}件（取得 {fetched}ページ, 未変更 {not_modified}ページ, "
+                     f"本文更新 {updated}件）")
+        return fetched, not_modified, updated
+
+    def get(self, item_id):
+        """記事IDのミラーエントリを返す"""
+        return self.items.get(item_id)
+
+def load_mirror_config(config_file):
+    """設定ファイルからミラーとAPIの設定を読み込む"""
+    config = {}
+    if os.path.exists(config_file):
+        import yaml
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+    return config
+
+def create_remote_mirror(config, client=None):
+    """設定からリモートミラーを作成して読み込む"""
+    cache_config = config.get('cache', {}) or {}
+    comparison = config.get('comparison', {}) or {}
+    remote_config = comparison.get('remote', {}) or {}
+    if client is None:
+        client = create_api_client((config.get('publish', {}) or {}).get('http', {}) or {})
+
+    mirror = RemoteMirror(
+        cache_config.get('remote_mirror_file', 'QiitaDocs/.smart_qiita_remote.json'),
+        client,
+        per_page=remote_config.get('per_page', 100),
+        ignore_whitespace=comparison.get('ignore_whitespace', True)
+    )
+    mirror.load()
+    return mirror
+
+def main():
+    """コマンドライン処理"""
+    parser = argparse.ArgumentParser(description='Qiita記事のリモート状態ミラー')
+    parser.add_argument('--config', default='qiita_update_config.yaml', help='設定ファイル')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('refresh', help='記事一覧を取得してミラーを更新')
+    subparsers.add_parser('list', help='ミラーの記事一覧を表示')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    mirror = create_remote_mirror(load_mirror_config(args.config))
+
+    try:
+        if args.command == 'refresh':
+            try:
+                mirror.refresh()
+            except QiitaApiError as e:
+                print(f"エラー: {e}")
+                sys.exit(1)
+            mirror.save()
+
+        elif args.command == 'list':
+            for item_id, entry in sorted(mirror.items.items(), key=lambda pair: pair[1].get('updated_at') or ''):
+                private = ' (限定共有)' if entry.get('private') else ''
+                print(f"{item_id}  {entry.get('updated_at')}  {entry['body_hash'][:12]}  {entry.get('title')}{private}")
+            print(f"合計: {len(mirror.items)}件（取得日時: {mirror.fetched_at or '-'}）")
+    finally:
+        mirror.client.close()
+
+if __name__ == "__main__":
+    main()
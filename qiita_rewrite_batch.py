@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Smart Qiita Update 書き換えのトランザクション
+
+変更されたQiitaファイルの新しい内容を一時ファイルにまとめて書き出し、
+ジャーナルを記録してから、1回の同期（syncfs）の後にrenameで一括して置き換えます。
+ファイルごとのfsyncは行わず、最後にディレクトリを1回fsyncします。
+ジャーナルには置き換え前のファイルのハードリンクを記録するため、
+途中で失敗・中断したバッチは元の内容に戻せます（次回の起動時にも自動で回復します）。
+ジャーナルに記録される前に中断した場合に残る一時ファイルは、回復時に削除します。
+"""
+
+import os
+import sys
+import glob
+import json
+import shutil
+import hashlib
+import tempfile
+import logging
+
+from qiita_sync_manifest import write_json_atomic
+
+def content_hash(data):
+    """ファイル内容（バイト列）のハッシュ値"""
+    return hashlib.md5(data).hexdigest()
+
+def file_hash(path):
+    """ファイルのハッシュ値（存在しない場合はNone）"""
+    try:
+        with open(path, 'rb') as f:
+            return content_hash(f.read())
+    except OSError:
+        return None
+
+def sync_filesystem(path, fallback_files=()):
+    """pathを含むファイルシステムの書き込みを1回でディスクに反映する
+
+    Linuxではsyncfs(2)、それ以外ではos.sync()を使い、どちらもない場合は
+    fallback_filesを個別にfsyncします。
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                if libc.syncfs(fd) == 0:
+                    return
+            finally:
+                os.close(fd)
+        except (ImportError, OSError, AttributeError):
+            pass
+
+    if hasattr(os, 'sync'):
+        os.sync()
+        return
+
+    for file_path in fallback_files:
+        with open(file_path, 'rb+') as f:
+            os.fsync(f.fileno())
+
+def fsync_directory(path):
+    """ディレクトリのエントリ（rename結果）をディスクに反映する"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class RewriteBatch:
+    """複数ファイルの書き換えをまとめて反映するトランザクション"""
+
+    VERSION = 1
+    # 対象ファイルと同じディレクトリに作成する一時ファイル（新しい内容・置き換え前のファイルのリンク）
+    TEMP_PATTERNS = ('.rewrite_*.tmp', '.orig_*.tmp')
+
+    def __init__(self, journal_file):
+        """初期化"""
+        self.journal_file = journal_file
+        self.entries = []
+
+    def stage(self, target, content):
+        """新しい内容を対象ファイルと同じディレクトリの一時ファイルに書き出す"""
+        target = os.fspath(target)
+        # テキストモードで書き込んだ場合と同じ改行コードにする
+        data = content.replace('\n', os.linesep).encode('utf-8')
+        fd, temp_path = tempfile.mkstemp(prefix='.rewrite_', suffix='.tmp',
+                                         dir=os.path.dirname(os.path.abspath(target)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # mkstempは0600で作成するため、元のファイルの権限を引き継ぐ
+            if os.path.exists(target):
+                shutil.copymode(target, temp_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+        self.entries.append({
+            'target': target,
+            'temp': temp_path,
+            'orig': None,
+            'hash': content_hash(data)
+        })
+        return len(data)
+
+    def keep_original(self, target):
+        """置き換え前のファイルをハードリンク（できない場合はコピー）で残す"""
+        if not os.path.exists(target):
+            return None
+        fd, orig_path = tempfile.mkstemp(prefix='.orig_', suffix='.tmp',
+                                         dir=os.path.dirname(os.path.abspath(target)))
+        os.close(fd)
+        os.remove(orig_path)
+        try:
+            os.link(target, orig_path)
+        except OSError:
+            shutil.copy2(target, orig_path)
+        return orig_path
+
+    def write_journal(self):
+        """ジャーナルを書き込む"""
+        write_json_atomic(self.journal_file, {'version': self.VERSION, 'entries': self.entries}, '.journal_')
+
+    def commit(self):
+        """一時ファイルをrenameで一括して反映（失敗した場合はすべて元に戻して例外を送出）"""
+        if not self.entries:
+            return
+
+        directories = sorted({os.path.dirname(os.path.abspath(entry['target'])) for entry in self.entries})
+        try:
+            for entry in self.entries:
+                entry['orig'] = self.keep_original(entry['target'])
+            self.write_journal()
+
+            # 一時ファイルとジャーナルをまとめてディスクに反映してからrenameする
+            for directory in directories:
+                sync_filesystem(directory, [entry['temp'] for entry in self.entries])
+
+            for entry in self.entries:
+                os.replace(entry['temp'], entry['target'])
+
+            for directory in directories:
+                fsync_directory(directory)
+        except Exception:
+            self.rollback()
+            raise
+
+        self.cleanup()
+
+    def rollback(self):
+        """反映済みのファイルを元の内容に戻し、一時ファイルを削除する"""
+        for entry in self.entries:
+            if entry.get('orig') and os.path.exists(entry['orig']):
+                if os.path.exists(entry['target']) and os.path.samefile(entry['orig'], entry['target']):
+                    # 置き換え前のまま（同じファイルへのrenameは何もしないため、リンクを削除する）
+                    os.remove(entry['orig'])
+                else:
+                    os.replace(entry['orig'], entry['target'])
+            elif not entry.get('orig') and file_hash(entry['target']) == entry['hash']:
+                # 新規作成したファイルは削除する
+                os.remove(entry['target'])
+            if os.path.exists(entry['temp']):
+                os.remove(entry['temp'])
+        self.entries = []
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+    def cleanup(self):
+        """反映が完了したバッチのジャーナルと元のファイルのリンクを削除する"""
+        for entry in self.entries:
+            for path in (entry.get('orig'), entry['temp']):
+                if path and os.path.exists(path):
+                    os.remove(path)
+        self.entries = []
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+def remove_orphaned_files(directory):
+    """ジャーナルに記録されていない一時ファイルを削除し、削除したパスのリストを返す
+
+    一時ファイルはcommitでジャーナルを書き込む前に作成されるため、
+    その間に中断するとジャーナルのない一時ファイルだけが残ります。
+    対象ファイルはまだ置き換えられていないので、削除するだけで元の状態に戻ります。
+    """
+    removed = []
+    for pattern in RewriteBatch.TEMP_PATTERNS:
+        for path in glob.glob(os.path.join(glob.escape(os.fspath(directory)), pattern)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed.append(path)
+    return sorted(removed)
+
+def recover_rewrites(journal_file, directories=()):
+    """中断したバッチを回復し、結果（None, 'committed', 'rolled_back'）を返す
+
+    すべての対象ファイルが新しい内容になっていれば反映済みとして後始末のみ行い、
+    そうでなければ記録した元のファイルに戻します。
+    その後、directoriesに残っているジャーナルに記録されていない一時ファイルを削除します。
+    """
+    result = None
+    if os.path.exists(journal_file):
+        result = recover_journal(journal_file)
+
+    for directory in directories:
+        for path in remove_orphaned_files(directory):
+            logging.warning(f"中断した書き換えの一時ファイルを削除しました: {path}")
+    return result
+
+def recover_journal(journal_file):
+    """ジャーナルに記録されたバッチを反映済みにするか元に戻す"""
+    with open(journal_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != RewriteBatch.VERSION:
+        raise ValueError(f"未対応のジャーナル形式です: {data.get('version')}")
+
+    batch = RewriteBatch(journal_file)
+    batch.entries = data.get('entries', [])
+    if all(file_hash(entry['target']) == entry['hash'] for entry in batch.entries):
+        batch.cleanup()
+        return 'committed'
+
+    for entry in batch.entries:
+        logging.warning(f"中断した書き換えを元に戻します: {entry['target']}")
+    batch.rollback()
+    return 'rolled_back'
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Smart Qiita Update 同期マニフェスト
+
+ファイルのstat情報（mtime、サイズ、inode）と、前回計算した正規化済み本文の
+ハッシュ値をディスク上に保存します。statが一致するファイルは読み込みを省略し、
+保存済みのハッシュ値を再利用します。前回同期したGitコミットなど、
+同期全体の状態もあわせて保存します。
+publish済みの内容のハッシュ値を記録するPublishCacheもこのモジュールにあります。
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+import logging
+
+def write_json_atomic(path, data, prefix, sort_keys=True):
+    """JSONを一時ファイルに書いてからrenameで置き換える（sort_keys: キーを並べ替える）"""
+    target_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(target_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=prefix, suffix='.tmp', dir=target_dir)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=sort_keys)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+class SyncManifest:
+    # マニフェストの形式が変わったら番号を上げる（古いマニフェストは破棄される）
+    VERSION = 1
+
+    # 直近に更新されたファイルはmtimeの分解能の問題で変更を見逃す可能性があるため
+    # キャッシュに登録しない（秒）
+    RACY_WINDOW = 2.0
+
+    def __init__(self, manifest_file, settings_key=""):
+        """初期化"""
+        self.manifest_file = manifest_file
+        self.settings_key = settings_key
+        self.entries = {}
+        self.state = {}
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        """マニフェストファイルを読み込む"""
+        if not os.path.exists(self.manifest_file):
+            return
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logging.warning(f"マニフェスト読み込みエラー（再作成します）: {e}")
+            return
+
+        # 形式や比較設定が異なる場合は全エントリを無効化
+        if data.get('version') != self.VERSION or data.get('settings') != self.settings_key:
+            logging.info("マニフェストの設定が変更されたため、キャッシュを破棄します")
+            self.dirty = True
+            return
+
+        self.entries = data.get('files', {})
+        self.state = data.get('state', {})
+
+    def lookup(self, file_path, stat_result):
+        """statが一致する場合は保存済みのハッシュ値を返す"""
+        entry = self.lookup_entry(file_path, stat_result)
+        return entry.get('hash') if entry is not None else None
+
+    def lookup_entry(self, file_path, stat_result, require=None):
+        """statが一致し、requireの項目（sectionsなど）を持つ場合はエントリを返す"""
+        key = os.fspath(file_path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if (entry is not None
+                    and entry.get('mtime_ns') == stat_result.st_mtime_ns
+                    and entry.get('size') == stat_result.st_size
+                    and entry.get('inode') == stat_result.st_ino
+                    and (require is None or require in entry)):
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            return None
+
+    def is_fresh(self, file_path):
+        """ファイルのstatが登録時から変わっていないか（統計には数えない）"""
+        key = os.fspath(file_path)
+        try:
+            stat_result = os.stat(file_path)
+        except OSError:
+            return False
+        with self.lock:
+            entry = self.entries.get(key)
+            return (entry is not None
+                    and entry.get('mtime_ns') == stat_result.st_mtime_ns
+                    and entry.get('size') == stat_result.st_size
+                    and entry.get('inode') == stat_result.st_ino)
+
+    def store(self, file_path, stat_result, content_hash, sections=None):
+        """ファイルのstat情報とハッシュ値（とセクションのハッシュ木）を登録"""
+        key = os.fspath(file_path)
+        with self.lock:
+            if time.time() - stat_result.st_mtime < self.RACY_WINDOW:
+                # 同一mtime内の再更新を検出できないため登録しない
+                self.entries.pop(key, None)
+                self.dirty = True
+                return
+
+            entry = {
+                'mtime_ns': stat_result.st_mtime_ns,
+                'size': stat_result.st_size,
+                'inode': stat_result.st_ino,
+                'hash': content_hash
+            }
+            previous = self.entries.get(key)
+            if sections is not None:
+                entry['sections'] = sections
+            elif (previous is not None and 'sections' in previous and previous.get('hash') == content_hash
+                    and all(previous.get(name) == entry[name] for name in ('mtime_ns', 'size', 'inode'))):
+                # 本文のハッシュ値だけを登録する場合も、同じ内容のセクションのハッシュ木は残す
+                entry['sections'] = previous['sections']
+            self.entries[key] = entry
+            self.dirty = True
+
+    def invalidate(self, file_path):
+        """指定ファイルのエントリを無効化"""
+        key = os.fspath(file_path)
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.dirty = True
+
+    def get_state(self, key, default=None):
+        """同期全体の状態を取得"""
+        with self.lock:
+            return self.state.get(key, default)
+
+    def set_state(self, key, value):
+        """同期全体の状態を設定"""
+        with self.lock:
+            if self.state.get(key) != value:
+                self.state[key] = value
+                self.dirty = True
+
+    def save(self):
+        """マニフェストをアトミックに書き込む（一時ファイル + rename）"""
+        if not self.dirty:
+            return True
+
+        data = {
+            'version': self.VERSION,
+            'settings': self.settings_key,
+            'state': self.state,
+            'files': self.entries
+        }
+
+        try:
+            write_json_atomic(self.manifest_file, data, '.manifest_')
+        except Exception as e:
+            logging.error(f"マニフェスト書き込みエラー: {e}")
+            return False
+
+        self.dirty = False
+        return True
+
+class PublishCache:
+    """記事ごとに最後にpublishに成功した内容のハッシュ値を記録する"""
+
+    VERSION = 1
+
+    def __init__(self, cache_file):
+        """初期化"""
+        self.cache_file = cache_file
+        self.articles = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        """記録ファイルを読み込む"""
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logging.warning(f"publish記録の読み込みエラー（再作成します）: {e}")
+            return
+
+        if data.get('version') != self.VERSION:
+            self.dirty = True
+            return
+
+        self.articles = data.get('articles', {})
+
+    def is_published(self, article, content_hash):
+        """同じ内容がpublish済みか"""
+        with self.lock:
+            entry = self.articles.get(article)
+            return entry is not None and entry.get('hash') == content_hash
+
+    def record(self, article, content_hash):
+        """publishに成功した内容を記録"""
+        with self.lock:
+            self.articles[article] = {
+                'hash': content_hash,
+                'published_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+            }
+            self.dirty = True
+
+    def forget(self, article):
+        """記録を削除（次回は内容が同じでもpublishする）"""
+        with self.lock:
+            if self.articles.pop(article, None) is not None:
+                self.dirty = True
+
+    def save(self):
+        """記録をアトミックに書き込む"""
+        if not self.dirty:
+            return True
+
+        try:
+            write_json_atomic(self.cache_file, {'version': self.VERSION, 'articles': self.articles}, '.published_')
+        except Exception as e:
+            logging.error(f"publish記録の書き込みエラー: {e}")
+            return False
+
+        self.dirty = False
+        return True
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Smart Qiita Update ファイル監視
+
+Gitファイルのディレクトリを監視し、対象パターンに一致するファイルの変更を通知します。
+Linuxではinotifyを使用し、使用できない環境ではstatによるポーリングに切り替えます。
+エディタの保存で連続して発生するイベントは、一定時間イベントが途切れるまでまとめます。
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import fnmatch
+import logging
+from pathlib import Path
+
+# inotifyのイベントマスク（linux/inotify.h）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+EVENT_HEADER = struct.Struct('iIII')
+
+def matches_patterns(name, patterns):
+    """ファイル名が対象パターンのいずれかに一致するか"""
+    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+class InotifyWatcher:
+    """inotifyによるディレクトリ監視"""
+
+    def __init__(self, directory, patterns):
+        """初期化（inotifyが使用できない場合はOSErrorを送出）"""
+        self.directory = Path(directory)
+        self.patterns = patterns
+        self.overflowed = False
+
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotifyは使用できません")
+
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1に失敗しました")
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(str(self.directory)), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watchに失敗しました: {self.directory}")
+
+    def read_events(self):
+        """読み込み可能なイベントをすべて読み、対象ファイル名の集合を返す"""
+        names = set()
+        while True:
+            try:
+                buffer = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not buffer:
+                break
+
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(buffer):
+                _, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+                offset += EVENT_HEADER.size
+                name = buffer[offset:offset + length].rstrip(b'\0').decode('utf-8', errors='replace')
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # イベントが溢れた場合は全ファイルを対象にする
+                    self.overflowed = True
+                elif name and matches_patterns(name, self.patterns):
+                    names.add(name)
+        return names
+
+    def wait(self, timeout):
+        """timeout秒まで（Noneで無期限）イベントを待ち、変更されたファイル名を返す"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                return set()
+            names = self.read_events()
+            # 対象外のファイルのイベントだけだった場合は残りの時間も待つ
+            if names or self.overflowed:
+                return names
+
+    def close(self):
+        """監視を終了"""
+        os.close(self.fd)
+
+class PollingWatcher:
+    """statの定期比較によるディレクトリ監視（inotifyが使えない環境用）"""
+
+    def __init__(self, directory, patterns, interval=2.0):
+        """初期化"""
+        self.directory = Path(directory)
+        self.patterns = patterns
+        self.interval = interval
+        self.overflowed = False
+        self.snapshot = self.scan()
+
+    def scan(self):
+        """対象ファイルの(mtime, サイズ, inode)を取得"""
+        snapshot = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and matches_patterns(entry.name, self.patterns):
+                    stat_result = entry.stat()
+                    snapshot[entry.name] = (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+        return snapshot
+
+    def wait(self, timeout):
+        """timeout秒まで（Noneで無期限）ポーリングし、変更されたファイル名を返す"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self.scan()
+            names = {
+                name for name in set(current) | set(self.snapshot)
+                if current.get(name) != self.snapshot.get(name)
+            }
+            self.snapshot = current
+            if names:
+                return names
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return set()
+                time.sleep(min(self.interval, remaining))
+            else:
+                time.sleep(self.interval)
+
+    def close(self):
+        """監視を終了"""
+
+def create_watcher(directory, patterns, backend='auto', poll_interval=2.0):
+    """設定に応じてinotifyまたはポーリングの監視を作成"""
+    if backend in ('auto', 'inotify'):
+        try:
+            watcher = InotifyWatcher(directory, patterns)
+            logging.info(f"inotifyでディレクトリを監視します: {directory}")
+            return watcher
+        except (OSError, AttributeError) as e:
+            if backend == 'inotify':
+                raise
+            logging.info(f"inotifyを使用できないためポーリングで監視します: {e}")
+
+    logging.info(f"ポーリング（{poll_interval}秒間隔）でディレクトリを監視します: {directory}")
+    return PollingWatcher(directory, patterns, poll_interval)
+
+def wait_for_changes(watcher, debounce=2.0, max_delay=30.0, timeout=None):
+    """変更を待ち、debounce秒イベントが途切れるまでまとめて返す
+
+    連続して書き込みが続く場合でも、最初のイベントからmax_delay秒で打ち切ります。
+    timeout秒以内に最初のイベントがなければ空の集合を返します（Noneで無期限）。
+    戻り値の2番目は、イベントの取りこぼしがあり全ファイルの確認が必要かどうか。
+    """
+    names = watcher.wait(timeout)
+    overflowed = watcher.overflowed
+    watcher.overflowed = False
+    if not names and not overflowed:
+        return names, False
+    started = time.monotonic()
+
+    while True:
+        remaining = max_delay - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        more = watcher.wait(min(debounce, remaining))
+        # 取りこぼしはイベントとして扱い、フラグは次の待機のために戻す
+        more_overflowed = watcher.overflowed
+        watcher.overflowed = False
+        if not more and not more_overflowed:
+            break
+        names |= more
+        overflowed = overflowed or more_overflowed
+
+    return names, overflowed
@@ -15,9 +15,6 @@ CONFIG_FILE="qiita_update_config.yaml"
 LOG_FILE="smart_qiita_update.log"
 BACKUP_DIR="QiitaDocs/backup"
 
-# バックアップファイル検出用の初期ファイル数を記録
-INITIAL_BACKUP_COUNT=$(find "$BACKUP_DIR" -name "*.md" 2>/dev/null | wc -l)
-
 # 色付き出力用の関数
 print_info() {
     echo -e "\033[32m[INFO]\033[0m $1"
@@ -112,12 +109,10 @@ if ! command -v python3 &> /dev/null; then
     exit 1
 fi
 
-# 必要なPythonパッケージの確認
-python3 -c "import yaml" 2>/dev/null || {
-    print_error "PyYAMLパッケージがインストールされていません"
-    print_info "インストール方法: pip3 install PyYAML"
-    exit 1
-}
+# 必要なPythonパッケージはsmart_update_qiita.pyが起動時に確認する
+
+# バックアップ検出用にセッション開始時刻を記録（バックアップストアのタイムスタンプと同じ形式）
+SESSION_START=$(date +"%Y%m%d_%H%M%S")
 
 # ログ開始
 print_info "Smart Qiita Update & Publish 開始"
@@ -134,53 +129,49 @@ fi
 # バックアップディレクトリの作成
 if [[ "$BACKUP_ONLY" == true ]]; then
     print_info "バックアップのみ実行モード"
-    mkdir -p "$BACKUP_DIR"
     
-    # Qiitaファイルのバックアップ
+    # Qiitaファイルのバックアップ（同じ内容はバックアップストアに1回だけ保存）
+    backup_targets=()
     for file in QiitaDocs/public/part*.md QiitaDocs/public/rule*.md; do
         if [[ -f "$file" ]]; then
-            filename=$(basename "$file")
-            timestamp=$(date +"%Y%m%d_%H%M%S")
-            backup_file="$BACKUP_DIR/${filename%.*}_${timestamp}.md"
-            cp "$file" "$backup_file"
-            print_info "バックアップ作成: $backup_file"
+            backup_targets+=("$file")
         fi
     done
     
+    if [[ ${#backup_targets[@]} -gt 0 ]]; then
+        python3 qiita_backup_store.py --config "$CONFIG_FILE" backup "${backup_targets[@]}" | while read -r line; do
+            print_info "$line"
+        done
+    fi
+    
     print_success "バックアップ完了"
     exit 0
 fi
 
-# 設定ファイルの一時的な修正（オプションに応じて）
-TEMP_CONFIG=$(mktemp)
-cp "$CONFIG_FILE" "$TEMP_CONFIG"
+# オプションに応じた設定の上書き（設定ファイルは書き換えずにコマンドラインで指定する）
+UPDATE_ARGS=()
 
 # dry-runモードの設定
 if [[ "$DRY_RUN" == true ]]; then
     print_info "DRY-RUNモード: 実際の更新は行いません"
-    # 設定ファイルを一時的に修正（dry-run用）
-    sed -i 's/backup_enabled: true/backup_enabled: false/' "$TEMP_CONFIG"
+    UPDATE_ARGS+=(--no-backup)
 fi
 
 # publish無効化の設定
 if [[ "$NO_PUBLISH" == true ]]; then
     print_info "Publish無効化モード: publishは実行しません"
-    sed -i 's/auto_publish: true/auto_publish: false/' "$TEMP_CONFIG"
+    UPDATE_ARGS+=(--no-publish)
 fi
 
 # Smart Qiita Updateスクリプトの実行
 print_info "Smart Qiita Updateスクリプトを実行中..."
-if python3 smart_update_qiita.py "$TEMP_CONFIG"; then
+if python3 smart_update_qiita.py "$CONFIG_FILE" "${UPDATE_ARGS[@]}"; then
     print_success "Smart Qiita Update完了"
 else
     print_error "Smart Qiita Updateでエラーが発生しました"
-    rm -f "$TEMP_CONFIG"
     exit 1
 fi
 
-# 一時設定ファイルの削除
-rm -f "$TEMP_CONFIG"
-
 # ログファイルの確認
 if [[ -f "$LOG_FILE" ]]; then
     print_info "ログファイル: $LOG_FILE"
@@ -190,36 +181,30 @@ if [[ -f "$LOG_FILE" ]]; then
     fi
 fi
 
-# バックアップファイルの確認
-if [[ -d "$BACKUP_DIR" ]] && [[ "$(ls -A "$BACKUP_DIR" 2>/dev/null)" ]]; then
+# バックアップの確認
+if [[ -f "$BACKUP_DIR/index.json" ]]; then
     print_info "バックアップディレクトリ: $BACKUP_DIR"
     
-    # より確実な方法：ファイル数比較でスクリプト実行中に作成されたファイルを検出
-    current_backup_count=$(find "$BACKUP_DIR" -name "*.md" 2>/dev/null | wc -l)
-    session_backup_count=$((current_backup_count - INITIAL_BACKUP_COUNT))
-    
-
+    # セッション開始以降に作成されたリビジョンをインデックスから数える
+    session_backup_count=$(python3 qiita_backup_store.py --config "$CONFIG_FILE" count --since "$SESSION_START" 2>/dev/null || echo 0)
     
     if [[ $session_backup_count -gt 0 ]]; then
-        print_info "今回のセッションで作成されたバックアップファイル数: $session_backup_count個"
+        print_info "今回のセッションで作成されたバックアップ: $session_backup_count個"
     else
-        # スクリプト実行中に作成されたファイルがない場合
-        # 最新のファイルの作成時刻を確認して、スクリプト実行中かどうかを判定
-        latest_backup=$(find "$BACKUP_DIR" -name "*.md" -printf '%T@ %p\n' 2>/dev/null | sort -n | tail -1 | cut -d' ' -f2)
-        if [[ -n "$latest_backup" ]]; then
-            latest_time=$(stat -c %Y "$latest_backup" 2>/dev/null)
-            current_time=$(date +%s)
-            time_diff=$((current_time - latest_time))
-            
-            # スクリプト実行時間を考慮（通常は数秒〜数分）
-            if [[ $time_diff -le 60 ]]; then  # 1分以内
-                print_info "最新のバックアップファイル: $(basename "$latest_backup") (${time_diff}秒前)"
-            else
-                print_info "今回のセッションで作成されたバックアップファイル: なし"
-            fi
-        else
-            print_info "今回のセッションで作成されたバックアップファイル: なし"
-        fi
+        print_info "今回のセッションで作成されたバックアップ: なし"
+    fi
+    print_info "バックアップの一覧: python3 qiita_backup_store.py list"
+fi
+
+# publish待ちのジョブの確認（publishが失敗したファイルは次回の実行時に再実行される）
+if [[ "$NO_PUBLISH" != true ]]; then
+    outbox_rc=0
+    outbox_status=$(python3 qiita_outbox.py --config "$CONFIG_FILE" status 2>/dev/null) || outbox_rc=$?
+    if [[ $outbox_rc -eq 2 ]]; then
+        print_warning "publishが繰り返し失敗しているファイルがあります:"
+        echo "$outbox_status" | sed 's/^/  /'
+    elif [[ -n "$outbox_status" && "$outbox_status" != 合計:\ 0件* ]]; then
+        print_info "publish待ち: $(echo "$outbox_status" | tail -1)"
     fi
 fi
 
@@ -9,23 +9,73 @@ QiitaDocs/publicのpart*.md、rule*.mdとカレントフォルダの同名のフ
 """
 
 import os
-import re
 import sys
-import yaml
+import copy
+import json
 import hashlib
-import subprocess
+import argparse
 from pathlib import Path
-from datetime import datetime
 import logging
 
+# 起動時間を短くするため、publish・監視・バックアップ・リモート比較・プロファイルなど
+# 使う場合にだけ必要なモジュール（asyncio、http.client、PyYAMLなど）は使う直前にimportする
+from qiita_sync_manifest import SyncManifest, PublishCache
+from qiita_article_parser import (KIND_QIITA, KIND_GIT, parse_article, hash_article_file,
+                                  rewrite_qiita_header, rewrite_front_matter_title, diff_section_trees,
+                                  summarize_section_changes)
+from qiita_metrics import SyncMetrics, Profiler
+from qiita_outbox import PublishOutbox
+from qiita_rewrite_batch import RewriteBatch, recover_rewrites
+from qiita_config import ConfigCache, config_digest, missing_dependencies
+from qiita_logging import setup_logging, create_publish_output_log, log_fields
+from qiita_destinations import (HEADER_QIITA, HEADER_FRONT_MATTER, HEADER_NONE, SourceCache,
+                                destination_configs, merge_config)
+
 class SmartQiitaUpdater:
-    def __init__(self, config_file="qiita_update_config.yaml"):
-        """初期化"""
-        self.config = self.load_config(config_file)
-        self.setup_logging()
+    def __init__(self, config_file="qiita_update_config.yaml", profile=False, config=None, sources=None,
+                 overrides=None):
+        """初期化
+        
+        config: 出力先ごとの設定（destinationsの各出力先の更新処理として作成する場合に指定）
+        sources: 出力先の間で共有するGitファイルの解析結果のキャッシュ
+        overrides: 設定ファイルの内容より優先する設定（コマンドラインオプションの指定）
+        """
+        self.profile = profile
+        self.metrics = SyncMetrics()
+        if config is None:
+            self.config = self.load_config(config_file)
+            if overrides:
+                merge_config(self.config, copy.deepcopy(overrides))
+            self.setup_logging()
+        else:
+            self.config = config
+            self.publish_output = create_publish_output_log(self.config.get('logging', {}))
+        self.name = self.config.get('name')
+        self.shared_sources = sources is not None
+        self.sources = sources if sources is not None else SourceCache()
         self.qiita_dir = Path(self.config.get('directories', {}).get('qiita_dir', 'QiitaDocs/public'))
         self.git_dir = Path(self.config.get('directories', {}).get('git_dir', '.'))
         
+        # destinationsがある場合は出力先ごとの更新処理に任せ、自身は状態ファイルを持たない
+        self.destinations = [
+            SmartQiitaUpdater(config_file, profile, config=dest_config, sources=self.sources)
+            for dest_config in (self.destination_configs(overrides) if config is None else [])
+        ]
+        if self.destinations:
+            self.manifest = self.publish_cache = self.outbox = None
+        else:
+            self.manifest = self.setup_manifest()
+            self.publish_cache = self.setup_publish_cache()
+            self.outbox = self.setup_outbox()
+        self.publish_errors = {}
+        self.git_changes = None
+        self.backup_store = None
+        self.remote_mirror = None
+        self.remote_compared = set()
+        self.section_trees = {}
+        self.change_summaries = {}
+        self.prefetched_hashes = {}
+        
     def load_config(self, config_file):
         """設定ファイルを読み込む"""
         default_config = {
@@ -37,66 +87,176 @@ class SmartQiitaUpdater:
             'comparison': {
                 'ignore_headers': True,
                 'ignore_whitespace': True,
-                'ignore_line_endings': True
+                'ignore_line_endings': True,
+                'detection_workers': 4,
+                'detection_executor': 'thread',
+                'use_git_changes': True,
+                'section_report': True,
+                'source': 'local',
+                'remote': {
+                    'per_page': 100
+                }
             },
             'update': {
                 'backup_enabled': True,
-                'backup_dir': 'QiitaDocs/backup'
+                'backup_dir': 'QiitaDocs/backup',
+                'backup_keep_last': 10,
+                'backup_max_total_mb': 0,
+                'backup_keyframe_interval': 10,
+                'transactional': True,
+                'header': 'qiita'
             },
             'publish': {
                 'auto_publish': True,
-                'publish_delay': 1
+                'skip_unchanged': True,
+                'outbox_enabled': True,
+                'outbox_backoff': 60.0,
+                'outbox_backoff_max': 3600.0,
+                'outbox_stuck_attempts': 3,
+                'backend': 'batch',
+                'publish_delay': 0,
+                'script_path': 'publish_to_qiita.sh',
+                'concurrency': 4,
+                'rate_limit': 1.0,
+                'rate_burst': 2,
+                'max_retries': 2,
+                'retry_backoff': 2.0,
+                'retry_backoff_max': 60.0,
+                'timeout': 300,
+                'batch_timeout': 900,
+                'http': {
+                    'base_url': 'https://qiita.com',
+                    'token_env': 'QIITA_TOKEN',
+                    'pool_size': 4,
+                    'timeout': 60,
+                    'max_retries': 2,
+                    'rate_limit_reserve': 0
+                }
+            },
+            'watch': {
+                'backend': 'auto',
+                'debounce': 2.0,
+                'max_delay': 30.0,
+                'poll_interval': 2.0
+            },
+            'metrics': {
+                'enabled': True,
+                'file': 'smart_qiita_metrics.json',
+                'profile_dir': 'smart_qiita_profile'
+            },
+            'cache': {
+                'manifest_enabled': True,
+                'manifest_file': 'QiitaDocs/.smart_qiita_manifest.json',
+                'publish_cache_file': 'QiitaDocs/.smart_qiita_published.json',
+                'outbox_file': 'QiitaDocs/.smart_qiita_outbox.json',
+                'remote_mirror_file': 'QiitaDocs/.smart_qiita_remote.json',
+                'rewrite_journal_file': 'QiitaDocs/.smart_qiita_rewrite.json'
             },
             'logging': {
                 'level': 'INFO',
                 'file': 'smart_qiita_update.log',
-                'console_output': True
+                'console_output': True,
+                'use_queue': True,
+                'format': 'text',
+                'max_bytes': 10485760,
+                'backup_count': 5,
+                'publish_output_dir': 'smart_qiita_publish_output',
+                'publish_output_keep': 100
             }
         }
         
         if os.path.exists(config_file):
+            # 設定ファイルとデフォルト設定が前回と同じならマージ済みの設定を使う
+            config_cache = ConfigCache(config_file)
+            defaults_key = config_digest(default_config)
+            cached_config = config_cache.lookup(defaults_key)
+            if cached_config is not None:
+                return cached_config
+            
             try:
+                import yaml
                 with open(config_file, 'r', encoding='utf-8') as f:
                     user_config = yaml.safe_load(f)
                     # デフォルト設定とユーザー設定をマージ
-                    self.merge_config(default_config, user_config)
+                    merge_config(default_config, user_config)
+                config_cache.store(defaults_key, default_config)
             except Exception as e:
                 print(f"設定ファイルの読み込みエラー: {e}")
                 print("デフォルト設定を使用します")
         
         return default_config
     
-    def merge_config(self, default, user):
-        """設定をマージする"""
-        for key, value in user.items():
-            if key in default and isinstance(default[key], dict) and isinstance(value, dict):
-                self.merge_config(default[key], value)
-            else:
-                default[key] = value
+    def destination_configs(self, overrides=None):
+        """各出力先の設定（コマンドラインオプションの指定は出力先の設定より優先する）"""
+        configs = destination_configs(self.config)
+        if overrides:
+            for dest_config in configs:
+                merge_config(dest_config, copy.deepcopy(overrides))
+        return configs
     
     def setup_logging(self):
-        """ログ設定"""
+        """ログ設定（use_queue有効時はQueueListenerのスレッドで書き込む）"""
         log_config = self.config.get('logging', {})
-        log_level = getattr(logging, log_config.get('level', 'INFO').upper())
+        self.log_listener = setup_logging(log_config)
+        self.publish_output = create_publish_output_log(log_config)
+    
+    def setup_manifest(self):
+        """同期マニフェストを準備"""
+        cache_config = self.config.get('cache', {})
+        if not cache_config.get('manifest_enabled', True):
+            return None
         
-        # ログフォーマット
-        formatter = logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(message)s'
+        # 本文ハッシュに影響する設定が変わったらマニフェストを無効化する
+        comparison = self.config.get('comparison', {})
+        settings_key = json.dumps({
+            'qiita_dir': str(self.qiita_dir),
+            'ignore_whitespace': comparison.get('ignore_whitespace', True)
+        }, sort_keys=True)
+        
+        manifest = SyncManifest(
+            cache_config.get('manifest_file', 'QiitaDocs/.smart_qiita_manifest.json'),
+            settings_key
         )
+        manifest.load()
+        return manifest
+    
+    def setup_publish_cache(self):
+        """publish済みの内容の記録を準備"""
+        if not self.config.get('publish', {}).get('skip_unchanged', True):
+            return None
         
-        # ファイルハンドラー
-        if log_config.get('file'):
-            file_handler = logging.FileHandler(log_config['file'], encoding='utf-8')
-            file_handler.setFormatter(formatter)
-            logging.getLogger().addHandler(file_handler)
+        cache = PublishCache(
+            self.config.get('cache', {}).get('publish_cache_file', 'QiitaDocs/.smart_qiita_published.json')
+        )
+        cache.load()
+        return cache
+    
+    def setup_outbox(self):
+        """publish待ちのアウトボックスを準備"""
+        publish_config = self.config.get('publish', {})
+        if not publish_config.get('auto_publish', True) or not publish_config.get('outbox_enabled', True):
+            return None
         
-        # コンソールハンドラー
-        if log_config.get('console_output', True):
-            console_handler = logging.StreamHandler()
-            console_handler.setFormatter(formatter)
-            logging.getLogger().addHandler(console_handler)
+        outbox = PublishOutbox(
+            self.config.get('cache', {}).get('outbox_file', 'QiitaDocs/.smart_qiita_outbox.json'),
+            backoff=publish_config.get('outbox_backoff', 60.0),
+            backoff_max=publish_config.get('outbox_backoff_max', 3600.0)
+        )
+        try:
+            outbox.load()
+        except Exception as e:
+            # 既存のジョブを上書きしないよう、アウトボックスを使わずに続行する
+            logging.error(f"アウトボックスを使用できません（publish失敗時の再実行は行われません）: {e}")
+            return None
+        return outbox
+    
+    def save_manifest(self):
+        """同期マニフェストを保存してキャッシュ統計を出力"""
+        if self.manifest is None:
+            return
         
-        logging.getLogger().setLevel(log_level)
+        self.manifest.save()
+        logging.info(f"マニフェストキャッシュ: ヒット {self.manifest.hits}件, ミス {self.manifest.misses}件")
     
     def find_target_files(self):
         """対象ファイルを検索"""
@@ -108,281 +268,694 @@ class SmartQiitaUpdater:
         
         return sorted(target_files)
     
-    def extract_body_content(self, file_path):
-        """ファイルからヘッダを除いた本文を抽出"""
+    def header_style(self):
+        """出力先のヘッダの形式（qiita, front_matter, none）"""
+        return self.config.get('update', {}).get('header', HEADER_QIITA)
+    
+    def is_source_file(self, file_path):
+        """Gitファイル（出力先のファイルではない）か"""
+        return Path(file_path).parent != self.qiita_dir
+    
+    def file_kind(self, file_path):
+        """ファイルの種類（QiitaファイルかGitファイルか）を判定"""
+        if self.is_source_file(file_path):
+            return KIND_GIT
+        # ヘッダのない出力先はGitファイルと同じ形式（最初の「# 」行がタイトル）
+        return KIND_GIT if self.header_style() == HEADER_NONE else KIND_QIITA
+    
+    def file_log_fields(self, file_path, stage, outcome):
+        """ステージのファイル別の所要時間を含む構造化ログのフィールド"""
+        return log_fields(file_path, stage, self.metrics.file_duration(stage, file_path), outcome)
+    
+    def section_report_enabled(self):
+        """セクション単位の変更レポートを作成するか"""
+        return self.config.get('comparison', {}).get('section_report', True)
+    
+    def calculate_body_hash(self, file_path):
+        """ファイルを1回読み込み、ヘッダを除いた本文の正規化ハッシュを計算"""
+        prefetched = self.prefetched_hashes.pop(os.fspath(file_path), None)
+        if prefetched is not None:
+            # プロセスプールで計算した後にファイルが変わっていなければその値を使う
+            try:
+                stat_result = os.stat(file_path)
+            except OSError:
+                stat_result = None
+            if stat_result is not None and prefetched[:3] == (stat_result.st_mtime_ns, stat_result.st_size,
+                                                              stat_result.st_ino):
+                self.metrics.count('bytes_read', stat_result.st_size)
+                return prefetched[3]
+        
+        ignore_whitespace = self.config.get('comparison', {}).get('ignore_whitespace', True)
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            article = parse_article(file_path, self.file_kind(file_path), ignore_whitespace)
+            self.metrics.count('bytes_read', os.path.getsize(file_path))
+        except Exception as e:
+            logging.error(f"ファイル読み込みエラー {file_path}: {e}")
+            return None
+        
+        return article.body_hash
+    
+    def get_body_hash(self, file_path):
+        """本文のハッシュ値を取得（Gitファイルは1回の実行で1回だけ計算し、出力先の間で共有）"""
+        if self.is_source_file(file_path):
+            ignore_whitespace = self.config.get('comparison', {}).get('ignore_whitespace', True)
+            return self.sources.get(('hash', ignore_whitespace), file_path,
+                                    lambda: self.lookup_body_hash(file_path))
+        return self.lookup_body_hash(file_path)
+    
+    def lookup_body_hash(self, file_path):
+        """本文のハッシュ値を取得（statが変わっていなければマニフェストの値を使用）"""
+        if self.manifest is None:
+            return self.calculate_body_hash(file_path)
+        
+        try:
+            stat_result = os.stat(file_path)
+        except OSError as e:
+            logging.error(f"ファイル読み込みエラー {file_path}: {e}")
+            self.manifest.invalidate(file_path)
+            return None
+        
+        cached_hash = self.manifest.lookup(file_path, stat_result)
+        if cached_hash is not None:
+            return cached_hash
+        
+        content_hash = self.calculate_body_hash(file_path)
+        if content_hash is None:
+            return None
+        
+        self.manifest.store(file_path, stat_result, content_hash)
+        return content_hash
+    
+    def get_section_tree(self, file_path):
+        """本文のセクションのハッシュ木を取得（Gitファイルは出力先の間で共有）"""
+        if self.is_source_file(file_path):
+            ignore_whitespace = self.config.get('comparison', {}).get('ignore_whitespace', True)
+            return self.sources.get(('sections', ignore_whitespace), file_path,
+                                    lambda: self.lookup_section_tree(file_path))
+        return self.lookup_section_tree(file_path)
+    
+    def lookup_section_tree(self, file_path):
+        """本文のセクションのハッシュ木を取得（変更のあったファイルのみ計算し、マニフェストに保存）"""
+        key = os.fspath(file_path)
+        if key in self.section_trees:
+            return self.section_trees[key]
+        
+        ignore_whitespace = self.config.get('comparison', {}).get('ignore_whitespace', True)
+        try:
+            stat_result = os.stat(file_path)
+            entry = None
+            if self.manifest is not None:
+                entry = self.manifest.lookup_entry(file_path, stat_result, require='sections')
             
-            # Qiitaヘッダを除去
-            if file_path.parent == self.qiita_dir:
-                # Qiitaファイルの場合
-                lines = content.split('\n')
-                body_start = -1
-                header_count = 0
-                
-                for i, line in enumerate(lines):
-                    if line.strip() == '---':
-                        header_count += 1
-                        if header_count == 2:
-                            body_start = i + 1
-                            break
-                
-                if body_start != -1:
-                    body = '\n'.join(lines[body_start:])
-                else:
-                    body = content
+            if entry is not None:
+                tree = entry['sections']
             else:
-                # Gitファイルの場合
-                lines = content.split('\n')
-                body_start = -1
-                
-                for i, line in enumerate(lines):
-                    if line.strip().startswith('# '):
-                        body_start = i + 1
-                        break
-                
-                if body_start != -1:
-                    body = '\n'.join(lines[body_start:])
-                else:
-                    body = content
-            
-            return body.strip()
-            
+                article = parse_article(file_path, self.file_kind(file_path), ignore_whitespace, sections=True)
+                self.metrics.count('bytes_read', stat_result.st_size)
+                tree = article.sections
+                if self.manifest is not None:
+                    self.manifest.store(file_path, stat_result, article.body_hash, tree)
         except Exception as e:
             logging.error(f"ファイル読み込みエラー {file_path}: {e}")
             return None
+        
+        self.section_trees[key] = tree
+        return tree
     
-    def normalize_content(self, content):
-        """コンテンツを正規化（空白、改行コードの統一）"""
-        if not content:
-            return ""
+    def summarize_changes(self, qiita_file, git_file):
+        """QiitaファイルとGitファイルのセクション木を比較して変更の要約を作成"""
+        qiita_tree = self.get_section_tree(qiita_file)
+        git_tree = self.get_section_tree(git_file)
+        if qiita_tree is None or git_tree is None:
+            return None
         
-        # 改行コードを統一
-        content = content.replace('\r\n', '\n').replace('\r', '\n')
+        changes = diff_section_trees(qiita_tree, git_tree)
+        summary = summarize_section_changes(changes)
+        self.change_summaries[qiita_file] = summary
+        self.metrics.record_changes(qiita_file, changes, summary)
+        return summary
+    
+    def remote_source_enabled(self):
+        """Qiitaに公開済みの内容（リモートミラー）と比較するか"""
+        return self.config.get('comparison', {}).get('source', 'local') == 'remote'
+    
+    def refresh_remote_mirror(self):
+        """リモートミラーを更新（取得できない場合はローカルのQiitaファイルと比較する）"""
+        from qiita_api import QiitaApiError
+        self.remote_mirror = None
+        self.remote_compared = set()
+        mirror = None
+        try:
+            with self.metrics.stage('remote'):
+                from qiita_remote_mirror import create_remote_mirror
+                mirror = create_remote_mirror(self.config)
+                fetched, not_modified, updated = mirror.refresh()
+            self.metrics.count('remote_pages_fetched', fetched)
+            self.metrics.count('remote_pages_not_modified', not_modified)
+            mirror.save()
+            self.remote_mirror = mirror
+        except QiitaApiError as e:
+            logging.error(f"Qiitaの記事一覧を取得できないため、ローカルのQiitaファイルと比較します: {e}")
+        finally:
+            if mirror is not None:
+                mirror.client.close()
+    
+    def remote_body_hash(self, qiita_file):
+        """Qiitaヘッダのidに対応する公開済み本文のハッシュ値（ミラーにない場合はNone）"""
+        try:
+            item_id = parse_article(qiita_file, KIND_QIITA, header_only=True).item_id
+        except Exception as e:
+            logging.error(f"ファイル読み込みエラー {qiita_file}: {e}")
+            return None
         
-        # 空白文字の正規化
-        if self.config.get('comparison', {}).get('ignore_whitespace', True):
-            # 行末の空白を削除
-            lines = [line.rstrip() for line in content.split('\n')]
-            content = '\n'.join(lines)
+        if item_id is None:
+            logging.debug(f"Qiitaヘッダにidがないため、ローカルのQiitaファイルと比較します: {qiita_file.name}")
+            return None
         
-        return content
-    
-    def calculate_content_hash(self, content):
-        """コンテンツのハッシュ値を計算"""
-        normalized = self.normalize_content(content)
-        return hashlib.md5(normalized.encode('utf-8')).hexdigest()
+        entry = self.remote_mirror.get(item_id)
+        if entry is None:
+            logging.info(f"記事 {item_id} が記事一覧にないため、ローカルのQiitaファイルと比較します: {qiita_file.name}")
+            return None
+        return entry['body_hash']
     
     def has_content_changed(self, qiita_file, git_file):
         """コンテンツに変更があるかを確認"""
-        qiita_body = self.extract_body_content(qiita_file)
-        git_body = self.extract_body_content(git_file)
+        qiita_hash = None
+        if self.remote_mirror is not None:
+            qiita_hash = self.remote_body_hash(qiita_file)
+        if qiita_hash is None:
+            qiita_hash = self.get_body_hash(qiita_file)
+        else:
+            self.remote_compared.add(qiita_file)
+        git_hash = self.get_body_hash(git_file)
         
-        if qiita_body is None or git_body is None:
+        if qiita_hash is None or git_hash is None:
             return False
         
-        qiita_hash = self.calculate_content_hash(qiita_body)
-        git_hash = self.calculate_content_hash(git_body)
-        
         return qiita_hash != git_hash
     
+    def check_file_pair(self, qiita_file):
+        """1ファイル分の変更検出（ワーカースレッドから呼ばれる）"""
+        git_file = self.git_dir / qiita_file.name
+        
+        with self.metrics.timer('detection', qiita_file):
+            if not git_file.exists():
+                return git_file, None
+            
+            return git_file, self.has_content_changed(qiita_file, git_file)
+    
+    def prefetch_body_hashes(self, target_files, workers):
+        """マニフェストのstatと異なるファイルの本文のハッシュ値を、プロセスプールで先に計算する"""
+        ignore_whitespace = self.config.get('comparison', {}).get('ignore_whitespace', True)
+        paths = []
+        for qiita_file in target_files:
+            git_file = self.git_dir / qiita_file.name
+            if not git_file.exists():
+                continue
+            for path in (qiita_file, git_file):
+                if self.manifest is not None and self.manifest.is_fresh(path):
+                    continue
+                if self.is_source_file(path) and self.sources.contains(('hash', ignore_whitespace), path):
+                    # 他の出力先で計算済み
+                    continue
+                paths.append(path)
+        
+        if len(paths) < 2:
+            return
+        
+        from itertools import repeat
+        from concurrent.futures import ProcessPoolExecutor
+        kinds = [self.file_kind(path) for path in paths]
+        chunksize = max(1, len(paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+            for path, result in zip(paths, executor.map(hash_article_file, paths, kinds, repeat(ignore_whitespace),
+                                                        chunksize=chunksize)):
+                # 読み込めなかったファイルは通常の処理でエラーを記録する
+                if result is not None:
+                    self.prefetched_hashes[os.fspath(path)] = result
+    
+    def detect_changed_files(self, target_files):
+        """変更されたファイルを検出（ワーカー数に応じて並列実行）
+        
+        detection_executor が thread の場合はファイルごとの比較をスレッドプールで実行し、
+        ファイル読み込みの待ち時間を重ねる。本文の正規化とハッシュ計算は1行ずつのPythonの処理で
+        GILを保持するため、スレッドではCPUのコア数に応じて速くならない。process の場合は
+        ハッシュ計算をプロセスプールで実行してから比較する。
+        """
+        comparison = self.config.get('comparison', {})
+        workers = comparison.get('detection_workers', 4)
+        executor_type = comparison.get('detection_executor', 'thread')
+        self.metrics.count('files_compared', len(target_files))
+        
+        with self.metrics.stage('detection'):
+            if workers and workers > 1 and len(target_files) > 1 and executor_type == 'process':
+                try:
+                    self.prefetch_body_hashes(target_files, workers)
+                except (OSError, RuntimeError) as e:
+                    logging.warning(f"プロセスプールを使用できないため、ハッシュ値を順に計算します: {e}")
+                # ハッシュ値は計算済みのため比較は順に行う
+                results = [self.check_file_pair(qiita_file) for qiita_file in target_files]
+                self.prefetched_hashes = {}
+            elif workers and workers > 1 and len(target_files) > 1:
+                if executor_type != 'thread':
+                    logging.warning(f"不明なdetection_executor: {executor_type}（threadを使用します）")
+                from concurrent.futures import ThreadPoolExecutor
+                # 結果はtarget_filesと同じ順序で返る
+                with ThreadPoolExecutor(max_workers=min(workers, len(target_files))) as executor:
+                    results = list(executor.map(self.check_file_pair, target_files))
+            else:
+                results = [self.check_file_pair(qiita_file) for qiita_file in target_files]
+        
+        changed_files = []
+        for qiita_file, (git_file, changed) in zip(target_files, results):
+            if changed is None:
+                logging.warning(f"ルートディレクトリに {git_file} が見つかりません")
+            elif changed:
+                changed_files.append((qiita_file, git_file))
+                if qiita_file in self.remote_compared:
+                    # Qiita上で編集された記事はローカルの内容が同じでもpublishし直す
+                    if self.publish_cache is not None:
+                        self.publish_cache.forget(qiita_file.name)
+                    logging.info(f"変更検出: {qiita_file.name} (Qiitaに公開済みの内容と差分あり)",
+                                 extra=self.file_log_fields(qiita_file, 'detection', 'changed'))
+                    continue
+                summary = self.summarize_changes(qiita_file, git_file) if self.section_report_enabled() else None
+                fields = self.file_log_fields(qiita_file, 'detection', 'changed')
+                if summary:
+                    logging.info(f"変更検出: {qiita_file.name} ({summary})", extra=fields)
+                else:
+                    logging.info(f"変更検出: {qiita_file.name}", extra=fields)
+            else:
+                logging.debug(f"変更なし: {qiita_file.name}", extra=self.file_log_fields(qiita_file, 'detection', 'unchanged'))
+        
+        return changed_files
+    
+    def head_commit(self):
+        """Gitの差分で候補を絞り込む場合は現在のHEADを返す"""
+        if self.manifest is None or not self.config.get('comparison', {}).get('use_git_changes', True):
+            return None
+        if self.git_changes is None:
+            from qiita_git_changes import GitChangeDetector
+            self.git_changes = GitChangeDetector(self.git_dir)
+        return self.git_changes.head_commit()
+    
+    def select_candidates(self, target_files, head_commit):
+        """前回同期したコミットからの差分とワーキングツリーの状態で比較対象を絞り込む"""
+        if head_commit is None:
+            return target_files
+        
+        if self.remote_mirror is not None:
+            # Qiita上での変更はGitの差分に現れないため絞り込まない
+            return target_files
+        
+        last_commit = self.manifest.get_state('git_commit')
+        if last_commit is None:
+            logging.info("前回同期したコミットが記録されていないため全ファイルを比較します")
+            return target_files
+        
+        changed_paths = self.git_changes.changed_paths(last_commit, [self.git_dir])
+        if changed_paths is None:
+            logging.info(f"コミット {last_commit[:12]} からの差分を取得できないため全ファイルを比較します")
+            return target_files
+        
+        git_dir = self.git_dir.resolve()
+        changed_names = {path.name for path in changed_paths if path.parent == git_dir}
+        
+        # Qiita側はGitで管理されていないため、マニフェストのstatと比較して変更を検出する
+        # Git側も、コミットされていない変更を同期した後に git checkout で戻した場合などは
+        # 差分に現れないため、前回の比較時からstatが変わったファイルは比較対象にする
+        candidates = [
+            qiita_file for qiita_file in target_files
+            if qiita_file.name in changed_names
+            or not self.manifest.is_fresh(qiita_file)
+            or not self.manifest.is_fresh(self.git_dir / qiita_file.name)
+        ]
+        logging.info(f"Git差分による比較対象: {len(candidates)}/{len(target_files)}個（{last_commit[:12]}..{head_commit[:12]}）")
+        return candidates
+    
+    def record_synced_commit(self, head_commit):
+        """すべての変更を反映できた場合に同期済みコミットを記録"""
+        if head_commit is not None:
+            self.manifest.set_state('git_commit', head_commit)
+    
     def backup_qiita_file(self, qiita_file):
-        """Qiitaファイルをバックアップ"""
+        """Qiitaファイルをバックアップ（同じ内容は1回だけ保存）"""
         if not self.config.get('update', {}).get('backup_enabled', True):
             return True
         
         try:
-            backup_dir = Path(self.config.get('update', {}).get('backup_dir', 'QiitaDocs/backup'))
-            backup_dir.mkdir(parents=True, exist_ok=True)
+            if self.backup_store is None:
+                from qiita_backup_store import create_backup_store
+                self.backup_store = create_backup_store(self.config.get('update', {}))
             
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_file = backup_dir / f"{qiita_file.stem}_{timestamp}{qiita_file.suffix}"
+            with self.metrics.stage('backup', qiita_file):
+                revision, created = self.backup_store.add(qiita_file)
             
-            import shutil
-            shutil.copy2(qiita_file, backup_file)
-            logging.info(f"バックアップ作成: {backup_file}")
+            self.metrics.count('bytes_read', revision['size'])
+            if created:
+                stored = self.backup_store.index['objects'].get(revision['hash'], {}).get('stored', 0)
+                self.metrics.count('bytes_written', stored)
+            status = "新規" if created else "既存の内容を参照"
+            logging.info(f"バックアップ作成: {qiita_file.name} ({revision['timestamp']}, {revision['hash'][:12]}, {status})",
+                         extra=self.file_log_fields(qiita_file, 'backup', 'created' if created else 'reused'))
             return True
             
         except Exception as e:
             logging.error(f"バックアップ作成エラー: {e}")
             return False
     
-    def update_qiita_file(self, qiita_file, git_file):
-        """Qiitaファイルを更新"""
-        try:
+    def render_qiita_file(self, qiita_file, git_file):
+        """出力先のファイルの新しい内容を作成（失敗時はNone）"""
+        # Gitファイルからタイトルと本文を抽出（出力先の間で1回だけ解析する）
+        git_article = self.sources.get('article', git_file, lambda: parse_article(git_file, KIND_GIT, keep_text=True))
+        if git_article.title is None:
+            logging.error(f"タイトルが見つかりません: {git_file}")
+            return None
+        self.metrics.count('bytes_read', os.path.getsize(git_file))
+        
+        header_style = self.header_style()
+        if header_style == HEADER_NONE:
+            # ヘッダのない出力先にはGitファイルをそのまま出力
+            return '\n'.join(git_article.lines)
+        
+        # 既存のヘッダを抽出（本文は読まない）
+        qiita_article = parse_article(qiita_file, KIND_QIITA, header_only=True)
+        if qiita_article.header is not None:
+            self.metrics.count('bytes_read', len(qiita_article.header.encode('utf-8')))
+        
+        if header_style == HEADER_FRONT_MATTER:
+            # フロントマターはtitleのみ更新し、ない場合は作成する
+            header_lines = qiita_article.header_lines if qiita_article.header is not None else ['---', '---']
+            updated_header = rewrite_front_matter_title(header_lines, git_article.title)
+        else:
+            if qiita_article.header is None:
+                logging.error(f"Qiitaヘッダが見つかりません: {qiita_file}")
+                return None
+            updated_header = rewrite_qiita_header(qiita_article.header_lines, git_article.title)
+        
+        # 新しい内容を作成（Gitファイルの本文からタイトルを削除）
+        return updated_header + '\n' + git_article.text_without_title()
+    
+    def update_qiita_files(self, changed_files):
+        """Qiitaファイルをまとめて更新し、更新できたファイルのリストを返す
+        
+        transactionalが有効な場合は新しい内容をすべて一時ファイルに書き出してから
+        一括してrenameで反映し、途中で失敗したときはすべて元に戻す。
+        """
+        transactional = self.config.get('update', {}).get('transactional', True)
+        batch = RewriteBatch(self.rewrite_journal_file()) if transactional else None
+        
+        staged_files = []
+        for qiita_file, git_file in changed_files:
             # バックアップ作成
             if not self.backup_qiita_file(qiita_file):
-                return False
-            
-            # 既存のQiitaヘッダを抽出
-            with open(qiita_file, 'r', encoding='utf-8') as f:
-                qiita_content = f.read()
-            
-            # ヘッダ部分を抽出
-            lines = qiita_content.split('\n')
-            header_lines = []
-            header_end = -1
-            header_count = 0
-            
-            for i, line in enumerate(lines):
-                if line.strip() == '---':
-                    header_count += 1
-                    header_lines.append(line)
-                    if header_count == 2:
-                        header_end = i
-                        break
-                elif header_count > 0:
-                    header_lines.append(line)
-            
-            if header_end == -1:
-                logging.error(f"Qiitaヘッダが見つかりません: {qiita_file}")
-                return False
-            
-            # Gitファイルからタイトルを抽出
-            with open(git_file, 'r', encoding='utf-8') as f:
-                git_content = f.read()
-            
-            title_match = re.search(r'^# (.+)$', git_content, re.MULTILINE)
-            if not title_match:
-                logging.error(f"タイトルが見つかりません: {git_file}")
-                return False
-            
-            title = title_match.group(1)
-            
-            # ヘッダを更新
-            header = '\n'.join(header_lines)
-            updated_header = self.update_qiita_header(header, title)
-            
-            # Gitファイルの本文からタイトルを削除
-            git_body = self.remove_title_from_body(git_content)
-            
-            # 新しい内容を作成
-            new_content = updated_header + '\n' + git_body
-            
-            # ファイルを更新
-            with open(qiita_file, 'w', encoding='utf-8') as f:
-                f.write(new_content)
+                continue
             
-            logging.info(f"更新完了: {qiita_file}")
-            return True
+            try:
+                with self.metrics.stage('rewrite', qiita_file):
+                    new_content = self.render_qiita_file(qiita_file, git_file)
+                    if new_content is None:
+                        continue
+                    if batch is not None:
+                        written = batch.stage(qiita_file, new_content)
+                    else:
+                        with open(qiita_file, 'w', encoding='utf-8') as f:
+                            f.write(new_content)
+                        written = len(new_content.encode('utf-8'))
+            except Exception as e:
+                logging.error(f"更新エラー {qiita_file}: {e}")
+                continue
             
+            self.metrics.count('bytes_written', written)
+            staged_files.append(qiita_file)
+        
+        if batch is not None and staged_files:
+            try:
+                with self.metrics.stage('commit'):
+                    batch.commit()
+            except Exception as e:
+                logging.error(f"書き換えの反映に失敗したため、{len(staged_files)}個のファイルを元に戻しました: {e}")
+                return []
+        
+        for qiita_file in staged_files:
+            if self.manifest is not None:
+                self.manifest.invalidate(qiita_file)
+            logging.info(f"更新完了: {qiita_file}", extra=self.file_log_fields(qiita_file, 'rewrite', 'updated'))
+        
+        return staged_files
+    
+    def rewrite_journal_file(self):
+        """書き換えのジャーナルファイルのパス"""
+        return self.config.get('cache', {}).get('rewrite_journal_file', 'QiitaDocs/.smart_qiita_rewrite.json')
+    
+    def recover_rewrites(self):
+        """前回中断した書き換えのバッチを回復"""
+        try:
+            result = recover_rewrites(self.rewrite_journal_file(), [self.qiita_dir])
         except Exception as e:
-            logging.error(f"更新エラー {qiita_file}: {e}")
-            return False
+            logging.error(f"書き換えのジャーナルを回復できません: {e}")
+            return
+        
+        if result == 'committed':
+            logging.info("前回の書き換えは反映済みのため、ジャーナルを削除しました")
+        elif result == 'rolled_back':
+            logging.warning("前回中断した書き換えを元に戻しました（変更は再度検出されます）")
     
-    def update_qiita_header(self, header, title):
-        """Qiitaヘッダを更新"""
-        lines = header.split('\n')
-        new_lines = []
-        title_updated = False
-        tags_updated = False
-        in_tags_section = False
-        
-        for line in lines:
-            if line.strip() == '---':
-                new_lines.append(line)
-            elif line.strip().startswith('title:'):
-                new_lines.append(f'title: {title}')
-                title_updated = True
-            elif line.strip().startswith('tags:'):
-                new_lines.append('tags:')
-                new_lines.append('  - Verilog')
-                new_lines.append('  - FPGA')
-                new_lines.append('  - AXI')
-                new_lines.append('  - テストベンチ')
-                new_lines.append('  - ハードウェア設計')
-                tags_updated = True
-                in_tags_section = True
-            elif in_tags_section and (line.strip().startswith('  - ') or line.strip().startswith('- ')):
+    def create_publish_stage(self):
+        """設定からpublishステージを作成"""
+        from qiita_publisher import AsyncPublishStage, BatchPublishStage, create_http_publish_stage
+        publish_config = self.config.get('publish', {})
+        
+        # スクリプトのディレクトリからの相対パスを使用
+        script_path = Path(publish_config.get('script_path', 'publish_to_qiita.sh'))
+        if not script_path.is_absolute():
+            script_path = Path(__file__).parent / script_path
+        
+        # 旧設定のpublish_delayはレート制限（1件/delay秒）として扱う
+        rate_limit = publish_config.get('rate_limit', 0)
+        rate_burst = publish_config.get('rate_burst', 1)
+        delay = publish_config.get('publish_delay', 0)
+        if not rate_limit and delay > 0:
+            rate_limit = 1.0 / delay
+            rate_burst = 1
+        
+        parallel_stage = AsyncPublishStage(
+            script_path,
+            cwd=Path(__file__).parent,
+            concurrency=publish_config.get('concurrency', 4),
+            rate_limit=rate_limit,
+            rate_burst=rate_burst,
+            max_retries=publish_config.get('max_retries', 2),
+            retry_backoff=publish_config.get('retry_backoff', 2.0),
+            retry_backoff_max=publish_config.get('retry_backoff_max', 60.0),
+            timeout=publish_config.get('timeout', 300),
+            output_log=self.publish_output
+        )
+        
+        backend = publish_config.get('backend', 'batch')
+        if backend == 'http':
+            return create_http_publish_stage(publish_config.get('http', {}))
+        if backend == 'script':
+            return parallel_stage
+        if backend != 'batch':
+            logging.warning(f"不明なpublishバックエンド: {backend}（batchを使用します）")
+        
+        # 1回のスクリプト呼び出しでまとめてpublishし、失敗分のみ個別にリトライ
+        fallback_stage = parallel_stage if publish_config.get('max_retries', 2) > 0 else None
+        return BatchPublishStage(
+            script_path,
+            cwd=Path(__file__).parent,
+            timeout=publish_config.get('batch_timeout', 900),
+            fallback_stage=fallback_stage,
+            output_log=self.publish_output
+        )
+    
+    def publish_content_hash(self, qiita_file):
+        """publishされる内容（id・updated_atを除くQiitaヘッダと本文）のハッシュ値"""
+        ignore_whitespace = self.config.get('comparison', {}).get('ignore_whitespace', True)
+        try:
+            article = parse_article(qiita_file, KIND_QIITA, ignore_whitespace)
+        except Exception as e:
+            logging.error(f"ファイル読み込みエラー {qiita_file}: {e}")
+            return None
+        
+        # publish時にQiita側で書き換えられる項目は比較しない
+        md5 = hashlib.md5()
+        for line in article.header_lines:
+            if not line.startswith(('id:', 'updated_at:')):
+                md5.update(line.rstrip().encode('utf-8') + b'\n')
+        md5.update(article.body_hash.encode('ascii'))
+        return md5.hexdigest()
+    
+    def publish_files(self, qiita_files):
+        """複数ファイルをQiitaにpublish（ファイルごとの成否を返す）"""
+        if not self.config.get('publish', {}).get('auto_publish', True):
+            return {qiita_file: True for qiita_file in qiita_files}
+        
+        # 最後にpublishした内容と同じファイルはスクリプトを呼ばずにスキップ
+        outcome = {}
+        content_hashes = {}
+        pending_files = []
+        for qiita_file in qiita_files:
+            content_hash = self.publish_content_hash(qiita_file) if self.publish_cache is not None else None
+            if content_hash is not None and self.publish_cache.is_published(Path(qiita_file).name, content_hash):
+                logging.info(f"publish済みの内容と同一のためスキップ: {qiita_file}",
+                             extra=log_fields(qiita_file, 'publish', outcome='skipped'))
+                self.metrics.count('publish_skipped')
+                outcome[qiita_file] = True
                 continue
-            elif in_tags_section and not (line.strip().startswith('  - ') or line.strip().startswith('- ')):
-                in_tags_section = False
-                new_lines.append(line)
+            content_hashes[qiita_file] = content_hash
+            pending_files.append(qiita_file)
+        
+        if pending_files:
+            try:
+                with self.metrics.stage('publish'):
+                    results = self.create_publish_stage().run(pending_files)
+            except Exception as e:
+                logging.error(f"Publish実行エラー: {e}")
+                self.metrics.count('publish_failed', len(pending_files))
+                results = []
+                outcome.update({qiita_file: False for qiita_file in pending_files})
+                self.publish_errors.update({qiita_file: str(e) for qiita_file in pending_files})
+            
+            for result in results:
+                self.metrics.record_file('publish', result.qiita_file, result.duration)
+                self.metrics.count('files_published' if result.success else 'publish_failed')
+                outcome[result.qiita_file] = result.success
+                if not result.success:
+                    self.publish_errors[result.qiita_file] = result.error
+                    continue
+                if result.qiita_file in self.change_summaries:
+                    logging.info(f"Publish内容: {Path(result.qiita_file).name} - {self.change_summaries[result.qiita_file]}")
+                if content_hashes.get(result.qiita_file) is not None:
+                    self.publish_cache.record(Path(result.qiita_file).name, content_hashes[result.qiita_file])
+        
+        if self.publish_cache is not None:
+            self.publish_cache.save()
+        
+        return {qiita_file: outcome[qiita_file] for qiita_file in qiita_files}
+    
+    def publish_queued(self, qiita_files):
+        """アウトボックスに登録済みのファイルをpublishし、結果をアウトボックスに反映"""
+        self.publish_errors = {}
+        results = self.publish_files(qiita_files)
+        
+        if self.outbox is not None:
+            for qiita_file, success in results.items():
+                if success:
+                    self.outbox.complete(Path(qiita_file).name)
+                else:
+                    self.outbox.fail(Path(qiita_file).name, self.publish_errors.get(qiita_file) or 'publish失敗')
+            self.outbox.save()
+        
+        return results
+    
+    def drain_outbox(self):
+        """前回までに失敗・中断したpublishのうち、実行時刻を過ぎたものを再実行"""
+        if self.destinations:
+            for destination in self.destinations:
+                destination.drain_outbox()
+            return
+        
+        if self.outbox is None or not self.outbox.jobs:
+            return
+        
+        qiita_files = []
+        for article, job in self.outbox.due_jobs():
+            if os.path.exists(job['path']):
+                qiita_files.append(Path(job['path']))
             else:
-                new_lines.append(line)
-        
-        # titleが更新されていない場合は追加
-        if not title_updated:
-            for i, line in enumerate(new_lines):
-                if line.strip() == '---':
-                    new_lines.insert(i + 1, f'title: {title}')
-                    break
-        
-        # tagsが更新されていない場合は追加
-        if not tags_updated:
-            for i, line in enumerate(new_lines):
-                if line.strip().startswith('title:'):
-                    new_lines.insert(i + 1, 'tags:')
-                    new_lines.insert(i + 2, '  - Verilog')
-                    new_lines.insert(i + 3, '  - FPGA')
-                    new_lines.insert(i + 4, '  - AXI')
-                    new_lines.insert(i + 5, '  - テストベンチ')
-                    new_lines.insert(i + 6, '  - ハードウェア設計')
-                    break
-        
-        return '\n'.join(new_lines)
-    
-    def remove_title_from_body(self, content):
-        """本文からタイトル行を削除"""
-        lines = content.split('\n')
-        new_lines = []
-        title_removed = False
-        
-        for line in lines:
-            if not title_removed and line.strip().startswith('# '):
-                title_removed = True
-                continue
-            new_lines.append(line)
+                logging.warning(f"publish待ちのファイルが見つからないためジョブを削除します: {job['path']}")
+                self.outbox.complete(article)
         
-        return '\n'.join(new_lines)
+        waiting = len(self.outbox.jobs) - len(qiita_files)
+        if waiting:
+            logging.info(f"バックオフ中のpublish待ち: {waiting}個（python3 qiita_outbox.py status で確認できます）")
+        
+        if not qiita_files:
+            self.outbox.save()
+            return
+        
+        logging.info(f"未完了のpublishを再実行します: {len(qiita_files)}個")
+        results = self.publish_queued(qiita_files)
+        published_count = sum(1 for success in results.values() if success)
+        logging.info(f"再実行完了: {published_count}/{len(qiita_files)}個のファイルをpublishしました")
     
     def publish_to_qiita(self, qiita_file):
         """Qiitaにpublish"""
-        if not self.config.get('publish', {}).get('auto_publish', True):
-            return True
+        return self.publish_files([qiita_file])[qiita_file]
+    
+    def run(self, target_files=None):
+        """メイン処理を実行（target_files指定時はそのファイルのみ処理）"""
+        if self.destinations:
+            self.run_destinations(target_files)
+            return
+        
+        logging.info(f"Smart Qiita Update開始（出力先: {self.name}）" if self.name else "Smart Qiita Update開始")
+        
+        if not self.shared_sources:
+            self.sources.clear()
+        self.metrics = SyncMetrics()
+        self.section_trees = {}
+        self.change_summaries = {}
+        profiler = None
+        if self.profile:
+            profiler = Profiler(self.config.get('metrics', {}).get('profile_dir', 'smart_qiita_profile'))
+            profiler.start()
         
         try:
-            # publish_to_qiita.shスクリプトを実行
-            # スクリプトのディレクトリからの相対パスを使用
-            script_path = Path(__file__).parent / 'publish_to_qiita.sh'
-            if script_path.exists():
-                # スクリプトのディレクトリに移動してから実行
-                script_dir = script_path.parent
-                result = subprocess.run(
-                    [str(script_path), str(qiita_file)],
-                    capture_output=True,
-                    text=True,
-                    timeout=300,
-                    cwd=str(script_dir)
-                )
-                
-                # 実行結果のログ出力
-                if result.stdout:
-                    logging.info(f"Publish実行出力: {result.stdout.strip()}")
-                if result.stderr:
-                    logging.warning(f"Publish実行警告: {result.stderr.strip()}")
-                
-                if result.returncode == 0:
-                    logging.info(f"Publish成功: {qiita_file}")
-                    return True
-                else:
-                    logging.error(f"Publish失敗: {qiita_file}, エラー: {result.stderr}")
-                    return False
-            else:
-                logging.warning(f"publish_to_qiita.shが見つかりません: {script_path}")
-                return False
-                
-        except Exception as e:
-            logging.error(f"Publish実行エラー {qiita_file}: {e}")
-            return False
+            self.sync(target_files)
+        finally:
+            self.save_manifest()
+            if profiler is not None:
+                self.metrics.profile = profiler.stop()
+                logging.info(f"プロファイル保存: {self.metrics.profile['profile_file']}"
+                             f"（ピークメモリ {self.metrics.profile['memory_peak_bytes'] / 1024 / 1024:.1f}MB）")
+            self.save_metrics()
+        
+        logging.info(f"Smart Qiita Update完了（出力先: {self.name}）" if self.name else "Smart Qiita Update完了")
+    
+    def run_destinations(self, target_files=None):
+        """すべての出力先を順に同期（Gitファイルの解析結果は出力先の間で共有）"""
+        logging.info(f"Smart Qiita Update開始（出力先: {', '.join(d.name for d in self.destinations)}）")
+        self.sources.clear()
+        
+        # target_files指定時は、各出力先の同名のファイルを対象にする
+        names = None if target_files is None else {Path(f).name for f in target_files}
+        for destination in self.destinations:
+            if names is None:
+                destination.run()
+                continue
+            destination_files = destination.targets_for_changes(names)
+            if destination_files:
+                destination.run(destination_files)
+        
+        logging.info(f"Gitファイルの解析結果の共有: 解析 {self.sources.misses}回, 再利用 {self.sources.hits}回")
+        logging.info("Smart Qiita Update完了")
+    
+    def save_metrics(self):
+        """計測結果をログとメトリクスファイルに出力"""
+        if self.metrics.stages:
+            logging.info(f"処理時間: {self.metrics.summary()}")
+        
+        metrics_config = self.config.get('metrics', {})
+        if metrics_config.get('enabled', True) and metrics_config.get('file'):
+            self.metrics.write(metrics_config['file'])
     
-    def run(self):
-        """メイン処理を実行"""
-        logging.info("Smart Qiita Update開始")
+    def sync(self, target_files=None):
+        """変更検出・更新・publishを実行"""
+        # 前回中断した書き換えを回復し、失敗したpublishを先に再実行
+        self.recover_rewrites()
+        self.drain_outbox()
         
-        # 対象ファイルを検索
-        target_files = self.find_target_files()
+        # 全ファイル対象の場合のみGitの差分で比較対象を絞り込む
+        head_commit = None
+        if target_files is None:
+            # 処理中のコミットを見逃さないよう、検索前にHEADを取得しておく
+            head_commit = self.head_commit()
+            with self.metrics.stage('discovery'):
+                target_files = self.find_target_files()
+        self.metrics.count('files_scanned', len(target_files))
         if not target_files:
             logging.warning("対象ファイルが見つかりません")
             return
@@ -391,55 +964,152 @@ class SmartQiitaUpdater:
         for file in target_files:
             logging.info(f"  - {file.name}")
         
+        # 公開済みの内容と比較する場合は記事一覧をまとめて取得
+        if self.remote_source_enabled():
+            self.refresh_remote_mirror()
+        
         # 変更されたファイルを特定
-        changed_files = []
-        for qiita_file in target_files:
-            git_file = self.git_dir / qiita_file.name
-            
-            if not git_file.exists():
-                logging.warning(f"ルートディレクトリに {git_file} が見つかりません")
-                continue
-            
-            if self.has_content_changed(qiita_file, git_file):
-                changed_files.append((qiita_file, git_file))
-                logging.info(f"変更検出: {qiita_file.name}")
-            else:
-                logging.debug(f"変更なし: {qiita_file.name}")
+        candidates = self.select_candidates(target_files, head_commit)
+        changed_files = self.detect_changed_files(candidates)
         
         if not changed_files:
             logging.info("変更されたファイルはありません")
+            self.record_synced_commit(head_commit)
             return
         
         logging.info(f"変更されたファイル: {len(changed_files)}個")
+        self.metrics.count('files_changed', len(changed_files))
         
-        # 変更されたファイルを更新
-        updated_count = 0
-        for qiita_file, git_file in changed_files:
-            if self.update_qiita_file(qiita_file, git_file):
-                updated_count += 1
+        # 書き換え前にpublish待ちとして記録（publishが失敗・中断しても次回再実行される）
+        if self.outbox is not None:
+            for qiita_file, _ in changed_files:
+                self.outbox.enqueue(qiita_file.name, qiita_file)
+            self.outbox.save()
+        
+        # 変更されたファイルをまとめて更新
+        updated_files = self.update_qiita_files(changed_files)
+        if self.outbox is not None:
+            for qiita_file, _ in changed_files:
+                if qiita_file not in updated_files:
+                    # 書き換えていないファイルは次回も変更として検出される
+                    self.outbox.complete(qiita_file.name)
+            self.outbox.save()
+        
+        logging.info(f"更新完了: {len(updated_files)}個のファイルを更新しました")
+        self.metrics.count('files_updated', len(updated_files))
+        
+        # 更新に失敗したファイルは次回も比較対象にする
+        if len(updated_files) == len(changed_files):
+            self.record_synced_commit(head_commit)
+        
+        # 更新したファイルをまとめてPublish実行
+        if updated_files and self.config.get('publish', {}).get('auto_publish', True):
+            results = self.publish_queued(updated_files)
+            published_count = sum(1 for success in results.values() if success)
+            logging.info(f"Publish完了: {published_count}/{len(updated_files)}個のファイルをpublishしました")
+    
+    def seconds_until_outbox_due(self):
+        """次のpublish待ちの実行時刻までの秒数（すべての出力先のうち最も早いもの、なければNone）"""
+        if self.destinations:
+            timeouts = [destination.seconds_until_outbox_due() for destination in self.destinations]
+            timeouts = [timeout for timeout in timeouts if timeout is not None]
+            return min(timeouts) if timeouts else None
+        return self.outbox.seconds_until_due() if self.outbox is not None else None
+    
+    def targets_for_changes(self, names):
+        """変更されたGitファイル名から対応するQiitaファイルを取得"""
+        if self.destinations:
+            # 出力先ごとのファイルはrun_destinationsで名前から求める
+            return [self.git_dir / name for name in sorted(names)]
+        
+        target_files = []
+        for name in sorted(names):
+            qiita_file = self.qiita_dir / name
+            if qiita_file.exists():
+                target_files.append(qiita_file)
+            else:
+                logging.debug(f"対応するQiitaファイルがありません: {name}")
+        return target_files
+    
+    def watch(self):
+        """Gitファイルの変更を監視し、変更のあったファイルだけを同期し続ける"""
+        from qiita_watch import create_watcher, wait_for_changes
+        watch_config = self.config.get('watch', {})
+        patterns = self.config.get('file_patterns', ['part*.md', 'rule*.md'])
+        watcher = create_watcher(
+            self.git_dir,
+            patterns,
+            backend=watch_config.get('backend', 'auto'),
+            poll_interval=watch_config.get('poll_interval', 2.0)
+        )
+        
+        try:
+            # 起動時に一度全体を同期してから監視を開始
+            self.run()
+            logging.info("変更の監視を開始します（Ctrl+Cで終了）")
+            
+            while True:
+                # publish待ちがあれば次の実行時刻までに変更がなくても起きる
+                timeout = self.seconds_until_outbox_due()
+                names, overflowed = wait_for_changes(
+                    watcher,
+                    debounce=watch_config.get('debounce', 2.0),
+                    max_delay=watch_config.get('max_delay', 30.0),
+                    timeout=timeout
+                )
                 
-                # Publish実行
-                if self.config.get('publish', {}).get('auto_publish', True):
-                    delay = self.config.get('publish', {}).get('publish_delay', 0)
-                    if delay > 0:
-                        logging.info(f"{delay}秒待機中...")
-                        import time
-                        time.sleep(delay)
-                    
-                    self.publish_to_qiita(qiita_file)
-        
-        logging.info(f"更新完了: {updated_count}個のファイルを更新しました")
-        logging.info("Smart Qiita Update完了")
+                if not names and not overflowed:
+                    self.drain_outbox()
+                    continue
+                
+                if overflowed:
+                    logging.warning("監視イベントを取りこぼしたため全ファイルを確認します")
+                    self.run()
+                    continue
+                
+                target_files = self.targets_for_changes(names)
+                if target_files:
+                    logging.info(f"変更を検知: {', '.join(f.name for f in target_files)}")
+                    self.run(target_files)
+        except KeyboardInterrupt:
+            logging.info("監視を終了します")
+        finally:
+            watcher.close()
 
 def main():
     """メイン処理"""
-    config_file = "qiita_update_config.yaml"
+    parser = argparse.ArgumentParser(description='変更のあったQiita記事のみを更新してpublishします')
+    parser.add_argument('config_file', nargs='?', default='qiita_update_config.yaml',
+                        help='設定ファイル（デフォルト: qiita_update_config.yaml）')
+    parser.add_argument('--watch', action='store_true',
+                        help='Gitファイルの変更を監視し、変更のたびに同期する')
+    parser.add_argument('--profile', action='store_true',
+                        help='cProfileとtracemallocでプロファイルを取得する')
+    parser.add_argument('--no-publish', action='store_true',
+                        help='publishを行わない（設定ファイルのauto_publishより優先）')
+    parser.add_argument('--no-backup', action='store_true',
+                        help='バックアップを作成しない（設定ファイルのbackup_enabledより優先）')
+    args = parser.parse_args()
+    
+    # 必要なパッケージの確認（importせずに探すだけ）
+    missing = missing_dependencies()
+    if missing:
+        for package in missing:
+            print(f"エラー: {package}パッケージがインストールされていません")
+        print(f"インストール方法: pip3 install {' '.join(missing)}")
+        sys.exit(1)
     
-    if len(sys.argv) > 1:
-        config_file = sys.argv[1]
+    overrides = {}
+    if args.no_publish:
+        overrides['publish'] = {'auto_publish': False}
+    if args.no_backup:
+        overrides['update'] = {'backup_enabled': False}
     
-    updater = SmartQiitaUpdater(config_file)
-    updater.run()
+    updater = SmartQiitaUpdater(args.config_file, profile=args.profile, overrides=overrides)
+    if args.watch:
+        updater.watch()
+    else:
+        updater.run()
 
 if __name__ == "__main__":
     main()
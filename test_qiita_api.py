@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+qiita_api.py のテスト
+Qiita APIの代わりに、用意したレスポンスを順に返すローカルのHTTPサーバを使います。
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from qiita_api import QiitaApiClient, QiitaApiError
+
+class StubHandler(BaseHTTPRequestHandler):
+    """受け取ったリクエストを記録し、サーバのレスポンスを先頭から1つずつ返す"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def handle_request(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        self.server.requests.append((self.command, self.path, body))
+        self.server.times.append(time.time())
+        status, headers, payload = self.server.responses.pop(0) if self.server.responses else (200, {}, {})
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PATCH = handle_request
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    """ローカルのAPIサーバ（responses に (status, headers, payload) を積む）"""
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    httpd.requests = []
+    httpd.times = []
+    httpd.responses = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def make_client(server, **options):
+    options.setdefault('retry_backoff', 0)
+    return QiitaApiClient(f"http://127.0.0.1:{server.server_address[1]}/api/v2", token='token', **options)
+
+def test_get_is_retried_on_server_error(server):
+    server.responses = [(503, {}, {'message': 'busy'}), (200, {}, {'id': 'a'})]
+    client = make_client(server)
+    status, _, data = client.request('GET', '/items/a')
+    assert (status, data) == (200, {'id': 'a'})
+    assert [method for method, _, _ in server.requests] == ['GET', 'GET']
+
+def test_post_is_not_retried_on_server_error(server):
+    # 500の時点で記事が作成されている可能性があるため、アウトボックスに任せる
+    server.responses = [(500, {}, {'message': 'error'}), (201, {}, {'id': 'dup'})]
+    client = make_client(server)
+    with pytest.raises(QiitaApiError) as error:
+        client.request('POST', '/items', {'title': 't'})
+    assert error.value.status == 500
+    assert len(server.requests) == 1
+
+def test_post_is_retried_on_rate_limit(server):
+    server.responses = [(429, {'Retry-After': '0'}, {'message': 'rate limit'}), (201, {}, {'id': 'new'})]
+    client = make_client(server)
+    status, _, data = client.request('POST', '/items', {'title': 't'})
+    assert (status, data) == (201, {'id': 'new'})
+    assert len(server.requests) == 2
+    assert server.requests[1][2] == json.dumps({'title': 't'}).encode('utf-8')
+
+def test_retries_are_limited(server):
+    server.responses = [(502, {}, {})] * 5
+    client = make_client(server, max_retries=2)
+    with pytest.raises(QiitaApiError) as error:
+        client.request('GET', '/items/a')
+    assert error.value.status == 502
+    assert len(server.requests) == 3
+
+def test_post_is_retried_when_connection_fails():
+    # 接続できなかったリクエストはサーバに届いていないためPOSTでもリトライする
+    client = QiitaApiClient("http://127.0.0.1:9", max_retries=1, retry_backoff=0, timeout=2)
+    attempts = []
+    original = client.new_connection
+
+    def counting_connection():
+        attempts.append(1)
+        return original()
+
+    client.new_connection = counting_connection
+    with pytest.raises(QiitaApiError, match='接続エラー'):
+        client.request('POST', '/items', {'title': 't'})
+    assert len(attempts) == 2
+
+def test_waits_until_rate_limit_reset(server):
+    reset = int(time.time()) + 1
+    server.responses = [(200, {'Rate-Remaining': '0', 'Rate-Reset': str(reset)}, {}), (200, {}, {})]
+    client = make_client(server)
+    client.request('GET', '/items/a')
+    client.request('GET', '/items/b')
+    assert time.time() >= reset
+    assert len(server.requests) == 2
+
+def test_rate_limit_wait_holds_every_thread(server):
+    reset = int(time.time()) + 2
+    server.responses = [(200, {'Rate-Remaining': '0', 'Rate-Reset': str(reset)}, {})]
+    server.responses += [(200, {'Rate-Remaining': '100', 'Rate-Reset': str(reset + 3600)}, {})] * 4
+    client = make_client(server)
+    client.request('GET', '/items/a')
+
+    # 待機中に他のスレッドがリクエストしても、リセット時刻まで送信しない
+    threads = [threading.Thread(target=client.request, args=('GET', f'/items/{i}'), daemon=True)
+               for i in range(4)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.1)
+    for thread in threads:
+        thread.join(10)
+
+    assert len(server.requests) == 5
+    assert all(sent >= reset for sent in server.times[1:])
+
+def test_gives_up_when_rate_limit_reset_is_too_far(server):
+    server.responses = [(200, {'Rate-Remaining': '0', 'Rate-Reset': str(int(time.time()) + 3600)}, {})]
+    client = make_client(server, max_rate_wait=10)
+    client.request('GET', '/items/a')
+    with pytest.raises(QiitaApiError) as error:
+        client.request('GET', '/items/b')
+    assert error.value.status == 429
+    assert len(server.requests) == 1
+
+def test_client_can_be_used_after_close(server):
+    client = make_client(server, pool_size=2)
+    client.request('GET', '/items/a')
+    client.close()
+    client.close()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(client.request('GET', '/items/b')[0]), daemon=True)
+    thread.start()
+    thread.join(5)
+    assert result == [200]
+    assert client.pool.qsize() == 2
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+qiita_publisher.py のバッチpublishのテスト
+publish_to_qiita.sh をそのまま使い、qiita-cliの代わりにスタブのnpxをPATHに置きます。
+スタブは呼び出しを記録し、STUB_FAILに指定した記事を失敗させます
+（STUB_FAIL_BATCHに指定した記事は、複数の記事をまとめてpublishした場合だけ失敗させます）。
+"""
+
+import os
+import sys
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from qiita_publisher import AsyncPublishStage, BatchPublishStage
+
+REPO_DIR = Path(__file__).resolve().parent
+
+STUB_NPX = """
+import os, sys, json
+names = sys.argv[3:]
+with open(os.environ['STUB_LOG'], 'a') as f:
+    f.write(json.dumps(names) + '\\n')
+failing = set(os.environ.get('STUB_FAIL', '').split())
+if len(names) > 1:
+    failing |= set(os.environ.get('STUB_FAIL_BATCH', '').split())
+for name in names:
+    if name in failing:
+        print(f'Error: failed to publish {name}')
+    else:
+        print(f'Updated: public/{name}.md')
+sys.exit(1 if failing & set(names) else 0)
+"""
+
+ARTICLES = ['part01_pipeline_principles.md', 'part02_pipeline_insert.md', 'rule01_sequence_chart_rules.md']
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """publishスクリプト、QiitaDocs/public、スタブのnpxを用意したディレクトリ"""
+    script = tmp_path / 'publish_to_qiita.sh'
+    shutil.copy(REPO_DIR / 'publish_to_qiita.sh', script)
+    script.chmod(0o755)
+    public = tmp_path / 'QiitaDocs' / 'public'
+    public.mkdir(parents=True)
+    for name in ARTICLES:
+        (public / name).write_text(f'---\ntitle: {name}\n---\n本文\n', encoding='utf-8')
+
+    tools = tmp_path / 'tools'
+    tools.mkdir()
+    npx = tools / 'npx'
+    npx.write_text(f'#!{sys.executable}\n{STUB_NPX}')
+    npx.chmod(0o755)
+
+    log = tmp_path / 'npx.log'
+    monkeypatch.setenv('PATH', f"{tools}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv('STUB_LOG', str(log))
+    monkeypatch.delenv('STUB_FAIL', raising=False)
+    monkeypatch.delenv('STUB_FAIL_BATCH', raising=False)
+    return tmp_path, log
+
+def npx_calls(log):
+    """スタブのnpxに渡された記事名（呼び出しごと）"""
+    return [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+
+def batch_stage(workspace, fallback=True):
+    directory, _ = workspace
+    script = directory / 'publish_to_qiita.sh'
+    fallback_stage = AsyncPublishStage(script, max_retries=0, retry_backoff=0) if fallback else None
+    return BatchPublishStage(script, fallback_stage=fallback_stage)
+
+def public_files(workspace, names=ARTICLES):
+    directory, _ = workspace
+    return [str(directory / 'QiitaDocs' / 'public' / name) for name in names]
+
+def test_parse_results_ignores_other_output():
+    stage = BatchPublishStage('publish_to_qiita.sh')
+    stdout = ('[INFO] Batch publishing 2 files to Qiita...\n'
+              'Updated: public/a.md\n'
+              'PUBLISH_RESULT\tOK\ta.md\r\n'
+              'PUBLISH_RESULT\tFAIL\tb.md\n'
+              'PUBLISH_RESULT\tOK\n'
+              'PUBLISH_RESULT OK c.md\n')
+    assert stage.parse_results(stdout) == {'a.md': True, 'b.md': False}
+
+def test_batch_publishes_all_files_in_one_call(workspace):
+    _, log = workspace
+    files = public_files(workspace)
+    results = batch_stage(workspace).run(files)
+
+    assert npx_calls(log) == [[name[:-3] for name in ARTICLES]]
+    assert [result.qiita_file for result in results] == files
+    assert all(result.success and result.attempts == 1 for result in results)
+
+def test_failed_files_fall_back_to_single_publish(workspace, monkeypatch):
+    _, log = workspace
+    monkeypatch.setenv('STUB_FAIL_BATCH', 'part02_pipeline_insert')
+    files = public_files(workspace)
+    results = batch_stage(workspace).run(files)
+
+    # バッチで成功した記事は再publishせず、失敗した記事だけ個別にpublishする
+    assert npx_calls(log) == [[name[:-3] for name in ARTICLES], ['part02_pipeline_insert']]
+    assert [result.qiita_file for result in results] == files
+    assert all(result.success for result in results)
+    assert [result.attempts for result in results] == [1, 2, 1]
+
+def test_failure_is_reported_when_fallback_also_fails(workspace, monkeypatch):
+    _, log = workspace
+    monkeypatch.setenv('STUB_FAIL', 'rule01_sequence_chart_rules')
+    results = batch_stage(workspace).run(public_files(workspace))
+
+    assert npx_calls(log)[-1] == ['rule01_sequence_chart_rules']
+    assert [result.success for result in results] == [True, True, False]
+    assert results[2].attempts == 2
+    assert results[2].error == '終了コード 1'
+
+def test_failed_files_without_fallback(workspace, monkeypatch):
+    _, log = workspace
+    monkeypatch.setenv('STUB_FAIL', 'part01_pipeline_principles')
+    results = batch_stage(workspace, fallback=False).run(public_files(workspace))
+
+    assert len(npx_calls(log)) == 1
+    assert [result.success for result in results] == [False, True, True]
+    assert results[0].error == '終了コード 1'
+
+def test_file_missing_from_public_is_reported_as_failed(workspace):
+    _, log = workspace
+    files = public_files(workspace, ARTICLES[:1] + ['part99_missing.md'])
+    results = batch_stage(workspace, fallback=False).run(files)
+
+    assert npx_calls(log) == [['part01_pipeline_principles']]
+    assert [result.success for result in results] == [True, False]
+
+def test_unreported_files_fall_back_to_single_publish(workspace):
+    directory, log = workspace
+    # 結果行を出力しない古いpublishスクリプト
+    script = directory / 'publish_to_qiita.sh'
+    script.write_text('#!/bin/bash\nexit 0\n')
+    files = public_files(workspace)
+    results = BatchPublishStage(script, fallback_stage=AsyncPublishStage(script, max_retries=0)).run(files)
+
+    assert all(result.success and result.attempts == 2 for result in results)
+    assert npx_calls(log) == []
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+qiita_remote_mirror.py のテスト
+記事一覧APIの代わりに、ページごとにETagを付けて返し、If-None-Matchが一致すれば304を返す
+ローカルのHTTPサーバを使います。
+"""
+
+import json
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+from qiita_api import QiitaApiClient
+from qiita_article_parser import hash_body_text
+from qiita_remote_mirror import RemoteMirror
+
+class ItemsHandler(BaseHTTPRequestHandler):
+    """GET /api/v2/authenticated_user/items をserver.articlesから返す"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        page = int(query['page'][0])
+        per_page = int(query['per_page'][0])
+        articles = self.server.articles[(page - 1) * per_page:page * per_page]
+        data = json.dumps(articles).encode('utf-8')
+        etag = '"' + hashlib.md5(data).hexdigest() + '"'
+        self.server.requests.append((page, self.headers.get('If-None-Match')))
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.send_header('Total-Count', str(len(self.server.articles)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    """ローカルの記事一覧API（articles を書き換えるとリモートの記事が変わる）"""
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), ItemsHandler)
+    httpd.requests = []
+    httpd.articles = [article(i) for i in range(5)]
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def article(number, body=None, updated_at='2025-01-01T00:00:00+09:00'):
+    return {
+        'id': f'item{number}',
+        'title': f'記事{number}',
+        'body': body if body is not None else f'本文{number}\n',
+        'updated_at': updated_at,
+        'private': False,
+        'tags': [{'name': 'SystemVerilog'}]
+    }
+
+def make_mirror(server, mirror_file, **options):
+    client = QiitaApiClient(f"http://127.0.0.1:{server.server_address[1]}", retry_backoff=0)
+    mirror = RemoteMirror(str(mirror_file), client, per_page=2, **options)
+    mirror.load()
+    return mirror
+
+def refresh_and_save(server, mirror_file, **options):
+    """ミラーを読み込んで更新・保存し、(refreshの戻り値, ミラー, 送信したリクエスト) を返す"""
+    server.requests = []
+    mirror = make_mirror(server, mirror_file, **options)
+    try:
+        result = mirror.refresh()
+    finally:
+        mirror.client.close()
+    assert mirror.save()
+    return result, mirror, server.requests
+
+def test_first_refresh_fetches_all_pages(server, tmp_path):
+    (fetched, not_modified, updated), mirror, requests = refresh_and_save(server, tmp_path / 'mirror.json')
+    assert (fetched, not_modified, updated) == (3, 0, 5)
+    assert all(etag is None for _, etag in requests)
+    assert sorted(mirror.items) == [f'item{i}' for i in range(5)]
+    assert mirror.get('item3')['body_hash'] == hash_body_text('本文3\n', True)
+    assert mirror.get('item3')['tags'] == ['SystemVerilog']
+
+def test_unchanged_pages_reuse_mirror_with_etag(server, tmp_path):
+    mirror_file = tmp_path / 'mirror.json'
+    _, first, _ = refresh_and_save(server, mirror_file)
+
+    (fetched, not_modified, updated), mirror, requests = refresh_and_save(server, mirror_file)
+    assert (fetched, not_modified, updated) == (0, 3, 0)
+    assert all(etag is not None for _, etag in requests)
+    assert mirror.items == first.items
+
+def test_changed_page_is_fetched_and_rehashed(server, tmp_path):
+    mirror_file = tmp_path / 'mirror.json'
+    refresh_and_save(server, mirror_file)
+    server.articles[2] = article(2, body='新しい本文\n', updated_at='2025-02-01T00:00:00+09:00')
+
+    (fetched, not_modified, updated), mirror, _ = refresh_and_save(server, mirror_file)
+    # 2ページ目だけ取得し、updated_atが変わった記事だけ本文のハッシュ値を計算し直す
+    assert (fetched, not_modified, updated) == (1, 2, 1)
+    assert mirror.get('item2')['body_hash'] == hash_body_text('新しい本文\n', True)
+    assert mirror.get('item2')['updated_at'] == '2025-02-01T00:00:00+09:00'
+
+def test_deleted_articles_are_removed(server, tmp_path):
+    mirror_file = tmp_path / 'mirror.json'
+    refresh_and_save(server, mirror_file)
+    del server.articles[4]
+
+    (fetched, not_modified, updated), mirror, _ = refresh_and_save(server, mirror_file)
+    assert (fetched, not_modified, updated) == (1, 2, 0)
+    assert 'item4' not in mirror.items
+    assert len(mirror.items) == 4
+
+def test_settings_change_invalidates_mirror(server, tmp_path):
+    mirror_file = tmp_path / 'mirror.json'
+    refresh_and_save(server, mirror_file)
+
+    # 本文のハッシュ値の計算方法が変わるため、ETagを使わずにすべて取得し直す
+    (fetched, not_modified, updated), mirror, requests = refresh_and_save(
+        server, mirror_file, ignore_whitespace=False)
+    assert (fetched, not_modified, updated) == (3, 0, 5)
+    assert all(etag is None for _, etag in requests)
+    assert mirror.get('item0')['body_hash'] == hash_body_text('本文0\n', False)
+
+def test_version_change_invalidates_mirror(server, tmp_path):
+    mirror_file = tmp_path / 'mirror.json'
+    refresh_and_save(server, mirror_file)
+    data = json.loads(mirror_file.read_text(encoding='utf-8'))
+    data['version'] = RemoteMirror.VERSION + 1
+    mirror_file.write_text(json.dumps(data), encoding='utf-8')
+
+    mirror = make_mirror(server, mirror_file)
+    mirror.client.close()
+    assert mirror.items == {} and mirror.pages == {}
+    assert mirror.dirty
+
+def test_broken_mirror_file_is_refetched(server, tmp_path):
+    mirror_file = tmp_path / 'mirror.json'
+    mirror_file.write_text('{broken', encoding='utf-8')
+
+    (fetched, not_modified, updated), mirror, _ = refresh_and_save(server, mirror_file)
+    assert (fetched, not_modified, updated) == (3, 0, 5)
+    assert json.loads(mirror_file.read_text(encoding='utf-8'))['items'] == mirror.items
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+qiita_rewrite_batch.py のテスト
+commitの途中で中断した状態を作り、次回の起動時の回復を確認します。
+"""
+
+import os
+
+import pytest
+
+import qiita_rewrite_batch
+from qiita_rewrite_batch import RewriteBatch, recover_rewrites
+
+@pytest.fixture
+def articles(tmp_path):
+    """書き換え対象の2つのファイルとジャーナルのパス"""
+    public = tmp_path / 'public'
+    public.mkdir()
+    targets = [public / 'part01.md', public / 'part02.md']
+    for target in targets:
+        target.write_text(f'元の内容 {target.name}\n', encoding='utf-8')
+    return public, targets, tmp_path / '.rewrite.json'
+
+def temp_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.tmp'))
+
+def stage_all(journal_file, targets):
+    batch = RewriteBatch(str(journal_file))
+    for target in targets:
+        batch.stage(target, f'新しい内容 {target.name}\n')
+    return batch
+
+def test_commit_replaces_all_files(articles):
+    public, targets, journal_file = articles
+    stage_all(journal_file, targets).commit()
+
+    assert [target.read_text(encoding='utf-8') for target in targets] == \
+        [f'新しい内容 {target.name}\n' for target in targets]
+    assert temp_files(public) == []
+    assert not journal_file.exists()
+
+def test_failed_commit_rolls_back(articles, monkeypatch):
+    public, targets, journal_file = articles
+    batch = stage_all(journal_file, targets)
+    replace = os.replace
+
+    def failing_replace(src, dst):
+        # 2つ目のファイルのrenameで失敗させる
+        if dst == str(targets[1]):
+            raise OSError('rename failed')
+        replace(src, dst)
+
+    monkeypatch.setattr(qiita_rewrite_batch.os, 'replace', failing_replace)
+    with pytest.raises(OSError):
+        batch.commit()
+    monkeypatch.setattr(qiita_rewrite_batch.os, 'replace', replace)
+
+    assert [target.read_text(encoding='utf-8') for target in targets] == \
+        [f'元の内容 {target.name}\n' for target in targets]
+    assert temp_files(public) == []
+    assert not journal_file.exists()
+
+def test_interrupted_batch_is_rolled_back_from_journal(articles, monkeypatch):
+    public, targets, journal_file = articles
+    batch = stage_all(journal_file, targets)
+
+    replace = os.replace
+
+    def interrupted_replace(src, dst):
+        # 1つ目のファイルを置き換えた直後にプロセスが終了した状態にする
+        if dst == str(targets[1]):
+            raise SystemExit(1)
+        replace(src, dst)
+
+    # プロセスの終了ではrollbackは実行されないため、ジャーナルと一時ファイルが残る
+    monkeypatch.setattr(batch, 'rollback', lambda: None)
+    monkeypatch.setattr(qiita_rewrite_batch.os, 'replace', interrupted_replace)
+    with pytest.raises(SystemExit):
+        batch.commit()
+    monkeypatch.undo()
+    assert targets[0].read_text(encoding='utf-8') == f'新しい内容 {targets[0].name}\n'
+    assert journal_file.exists()
+
+    assert recover_rewrites(str(journal_file), [public]) == 'rolled_back'
+    assert [target.read_text(encoding='utf-8') for target in targets] == \
+        [f'元の内容 {target.name}\n' for target in targets]
+    assert temp_files(public) == []
+    assert not journal_file.exists()
+
+def test_temp_files_staged_before_journal_are_removed(articles):
+    public, targets, journal_file = articles
+    # ステージした後、commitでジャーナルを書き込む前に中断
+    stage_all(journal_file, targets)
+    RewriteBatch(str(journal_file)).keep_original(targets[0])
+    assert len(temp_files(public)) == 3
+    assert not journal_file.exists()
+
+    assert recover_rewrites(str(journal_file), [public]) is None
+    assert temp_files(public) == []
+    assert [target.read_text(encoding='utf-8') for target in targets] == \
+        [f'元の内容 {target.name}\n' for target in targets]
+
+def test_recover_without_journal_or_temp_files(articles):
+    public, targets, journal_file = articles
+    assert recover_rewrites(str(journal_file), [public]) is None
+    assert sorted(os.listdir(public)) == [target.name for target in targets]
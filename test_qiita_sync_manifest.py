@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+qiita_sync_manifest.py のテスト
+"""
+
+import os
+import time
+
+from qiita_sync_manifest import SyncManifest
+
+SECTIONS = {'title': '', 'level': 0, 'hash': 'abc', 'children': []}
+
+def old_file(tmp_path, name='part01.md', text='本文\n'):
+    """mtimeを過去にずらしたファイル（作成直後のファイルはマニフェストに登録されない）"""
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    past = time.time() - 3600
+    os.utime(path, (past, past))
+    return path
+
+def test_body_hash_store_keeps_section_tree(tmp_path):
+    path = old_file(tmp_path)
+    manifest = SyncManifest(str(tmp_path / 'manifest.json'))
+    stat_result = os.stat(path)
+    manifest.store(path, stat_result, 'hash1', SECTIONS)
+
+    manifest.store(path, stat_result, 'hash1')
+    assert manifest.lookup_entry(path, stat_result, require='sections')['sections'] == SECTIONS
+
+def test_section_tree_is_dropped_when_file_changes(tmp_path):
+    path = old_file(tmp_path)
+    manifest = SyncManifest(str(tmp_path / 'manifest.json'))
+    manifest.store(path, os.stat(path), 'hash1', SECTIONS)
+
+    path = old_file(tmp_path, text='新しい本文\n')
+    stat_result = os.stat(path)
+    manifest.store(path, stat_result, 'hash2')
+    assert manifest.lookup(path, stat_result) == 'hash2'
+    assert manifest.lookup_entry(path, stat_result, require='sections') is None
+
+def test_entries_survive_save_and_load(tmp_path):
+    path = old_file(tmp_path)
+    manifest = SyncManifest(str(tmp_path / 'manifest.json'), 'settings')
+    manifest.store(path, os.stat(path), 'hash1', SECTIONS)
+    manifest.set_state('git_commit', 'abc123')
+    assert manifest.save()
+
+    loaded = SyncManifest(str(tmp_path / 'manifest.json'), 'settings')
+    loaded.load()
+    assert loaded.lookup_entry(path, os.stat(path), require='sections')['sections'] == SECTIONS
+    assert loaded.get_state('git_commit') == 'abc123'
+
+    # 比較設定が変わった場合は破棄する
+    other = SyncManifest(str(tmp_path / 'manifest.json'), 'other settings')
+    other.load()
+    assert other.lookup(path, os.stat(path)) is None
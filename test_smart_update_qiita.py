@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+smart_update_qiita.py のテスト
+一時ディレクトリにGitファイルとQiitaDocs/publicのファイルを作り、publishを無効にした設定で同期します。
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+
+import pytest
+import yaml
+
+from smart_update_qiita import SmartQiitaUpdater
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 同期した後に、使う場合にだけimportするモジュールのうち読み込まれたものを出力する
+SYNC_AND_LIST_MODULES = """
+import sys, json
+from smart_update_qiita import SmartQiitaUpdater
+SmartQiitaUpdater(sys.argv[1]).run()
+lazy = ['yaml', 'asyncio', 'http.client', 'qiita_api', 'qiita_remote_mirror', 'qiita_publisher',
+        'qiita_backup_store', 'qiita_watch', 'cProfile']
+print(json.dumps(sorted(name for name in lazy if name in sys.modules)))
+"""
+
+def article_text(number, changed=False):
+    """Gitファイルの本文（見出しで区切った3セクション）"""
+    extra = "変更した段落\n" if changed else ""
+    return (f"# 記事{number}\n\n導入{number}\n\n## 概要\n\n概要{number}\n{extra}\n"
+            f"## 詳細\n\n詳細{number}\n\n### 補足\n\n補足{number}\n")
+
+def qiita_text(number):
+    """Qiitaファイル（ヘッダ + Gitファイルの変更前の本文）"""
+    body = article_text(number).split('\n', 1)[1]
+    return f"---\ntitle: 記事{number}\ntags: Verilog\nid: item{number}\n---\n{body}"
+
+@pytest.fixture
+def workspace(tmp_path):
+    """変更のある記事とない記事を含むGitファイル・Qiitaファイルと設定ファイル"""
+    git_dir = tmp_path / 'git'
+    qiita_dir = tmp_path / 'QiitaDocs' / 'public'
+    git_dir.mkdir()
+    qiita_dir.mkdir(parents=True)
+
+    # 作成直後のファイルはマニフェストに登録されないため、mtimeを過去にずらす
+    past = time.time() - 3600
+    for number in range(1, 7):
+        name = f'part{number:02d}_article.md'
+        (git_dir / name).write_text(article_text(number, changed=number in (2, 5)), encoding='utf-8')
+        (qiita_dir / name).write_text(qiita_text(number), encoding='utf-8')
+        for path in (git_dir / name, qiita_dir / name):
+            os.utime(path, (past, past))
+
+    config = {
+        'directories': {'qiita_dir': str(qiita_dir), 'git_dir': str(git_dir)},
+        'comparison': {'use_git_changes': False},
+        'update': {'backup_enabled': False},
+        'publish': {'auto_publish': False},
+        'metrics': {'enabled': False},
+        'cache': {
+            'manifest_file': str(tmp_path / 'QiitaDocs' / '.manifest.json'),
+            'publish_cache_file': str(tmp_path / 'QiitaDocs' / '.published.json'),
+            'outbox_file': str(tmp_path / 'QiitaDocs' / '.outbox.json'),
+            'rewrite_journal_file': str(tmp_path / 'QiitaDocs' / '.rewrite.json')
+        },
+        'logging': {'level': 'ERROR', 'file': None, 'console_output': False, 'use_queue': False,
+                    'publish_output_dir': str(tmp_path / 'publish_output')}
+    }
+    config_file = tmp_path / 'config.yaml'
+    config_file.write_text(yaml.safe_dump(config, allow_unicode=True), encoding='utf-8')
+    return config_file, git_dir, qiita_dir
+
+def detect(config_file, monkeypatch=None, **comparison):
+    """マニフェストなしで変更検出だけを行う（戻り値: 変更されたファイル名, 先に計算したハッシュ値の数）"""
+    updater = SmartQiitaUpdater(str(config_file), overrides={'comparison': comparison,
+                                                             'cache': {'manifest_enabled': False}})
+    prefetched = []
+    if monkeypatch is not None:
+        prefetch = updater.prefetch_body_hashes
+
+        def counting_prefetch(files, workers):
+            prefetch(files, workers)
+            prefetched.append(len(updater.prefetched_hashes))
+
+        monkeypatch.setattr(updater, 'prefetch_body_hashes', counting_prefetch)
+    target_files = updater.find_target_files()
+    changed = [qiita_file.name for qiita_file, _ in updater.detect_changed_files(target_files)]
+    return changed, sum(prefetched)
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_parallel_detection_matches_sequential(workspace, executor, monkeypatch):
+    config_file, _, _ = workspace
+    expected, _ = detect(config_file, detection_workers=1)
+    assert expected == ['part02_article.md', 'part05_article.md']
+
+    changed, prefetched = detect(config_file, monkeypatch, detection_workers=3, detection_executor=executor)
+    assert changed == expected
+    # processではGitファイルとQiitaファイルの12個のハッシュ値をプロセスプールで計算する
+    assert prefetched == (12 if executor == 'process' else 0)
+
+def test_process_detection_ignores_files_changed_after_hashing(workspace, monkeypatch):
+    config_file, git_dir, _ = workspace
+    updater = SmartQiitaUpdater(str(config_file), overrides={'comparison': {'detection_executor': 'process',
+                                                                            'detection_workers': 2}})
+    target_files = updater.find_target_files()
+    prefetch = updater.prefetch_body_hashes
+
+    def prefetch_then_edit(files, workers):
+        prefetch(files, workers)
+        # ハッシュ計算の後にGitファイルが変わった場合は計算し直す
+        (git_dir / 'part03_article.md').write_text(article_text(3, changed=True), encoding='utf-8')
+
+    monkeypatch.setattr(updater, 'prefetch_body_hashes', prefetch_then_edit)
+    changed = [qiita_file.name for qiita_file, _ in updater.detect_changed_files(target_files)]
+    assert changed == ['part02_article.md', 'part03_article.md', 'part05_article.md']
+
+def test_section_hashes_are_reused_between_syncs(workspace, monkeypatch):
+    config_file, git_dir, qiita_dir = workspace
+    import smart_update_qiita
+    parsed = []
+    original = smart_update_qiita.parse_article
+
+    def recording_parse(file_path, kind, *args, **kwargs):
+        if kwargs.get('sections'):
+            parsed.append(os.fspath(file_path))
+        return original(file_path, kind, *args, **kwargs)
+
+    monkeypatch.setattr(smart_update_qiita, 'parse_article', recording_parse)
+
+    # 1回目: 変更のあった記事のセクション木を計算してマニフェストに保存する
+    SmartQiitaUpdater(str(config_file)).run()
+    assert sorted(parsed) == sorted(str(directory / name) for directory in (git_dir, qiita_dir)
+                                    for name in ('part02_article.md', 'part05_article.md'))
+
+    # 2回目: Qiitaファイルの1セクションを編集すると、変わっていないGitファイルの木はマニフェストから再利用する
+    edited = qiita_dir / 'part02_article.md'
+    edited.write_text(edited.read_text(encoding='utf-8').replace('詳細2', '詳細2（編集）'), encoding='utf-8')
+    past = time.time() - 60
+    os.utime(edited, (past, past))
+    parsed.clear()
+
+    updater = SmartQiitaUpdater(str(config_file))
+    updater.run()
+    assert parsed == [str(edited)]
+    assert updater.change_summaries[edited]
+
+    manifest = smart_update_qiita.SyncManifest(updater.config['cache']['manifest_file'],
+                                               updater.manifest.settings_key)
+    manifest.load()
+    git_file = git_dir / 'part02_article.md'
+    assert manifest.lookup_entry(git_file, os.stat(git_file), require='sections') is not None
+
+def loaded_modules(config_file):
+    """別プロセスで同期し、読み込まれた遅延importのモジュールを返す"""
+    completed = subprocess.run([sys.executable, '-c', SYNC_AND_LIST_MODULES, str(config_file)],
+                               cwd=os.path.dirname(config_file), env=dict(os.environ, PYTHONPATH=REPO_DIR),
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=60)
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.splitlines()[-1])
+
+def test_startup_skips_unused_modules(workspace):
+    config_file, _, _ = workspace
+    past = time.time() - 3600
+    os.utime(config_file, (past, past))
+
+    # 1回目はマージした設定をキャッシュするためPyYAMLを読み込む
+    assert loaded_modules(config_file) == ['yaml']
+    # 2回目（変更なし）は設定のキャッシュを使い、publish・リモート比較などのモジュールも読み込まない
+    assert loaded_modules(config_file) == []
+
+def test_remote_comparison_loads_mirror_and_falls_back(workspace):
+    config_file, _, qiita_dir = workspace
+    config = yaml.safe_load(config_file.read_text(encoding='utf-8'))
+    config['comparison']['source'] = 'remote'
+    # 接続できないAPIサーバ（記事一覧を取得できない場合はローカルのQiitaファイルと比較する）
+    config['publish']['http'] = {'base_url': 'http://127.0.0.1:9', 'max_retries': 0, 'timeout': 2}
+    config['cache']['remote_mirror_file'] = str(qiita_dir.parent / '.remote.json')
+    config_file.write_text(yaml.safe_dump(config, allow_unicode=True), encoding='utf-8')
+
+    modules = loaded_modules(config_file)
+    assert {'qiita_remote_mirror', 'qiita_api', 'http.client'} <= set(modules)
+    assert 'qiita_publisher' not in modules
+
+    # ローカルの比較で変更を検出して書き換えている
+    assert '変更した段落' in (qiita_dir / 'part02_article.md').read_text(encoding='utf-8')